@@ -0,0 +1,317 @@
+import os
+import sys
+import json
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Set
+from config import DATA_DIR, IMAGE_ANALYSIS_DIR, LOG_DIR, PROJECT_ROOT, ensure_directories, logger
+
+# 分析スクリプトを入力・出力を宣言したタスクとして、makeのように必要なものだけ実行する
+# - あるタスクの入力が別のタスクの出力であれば、そのタスクの後に実行する（依存関係は宣言から自動で決まる）
+# - 前回成功したときの入力（スクリプト自体と使っているモジュールを含む）の更新時刻・サイズを PIPELINE_STATE_PATH に記録し、
+#   入力が変わったタスクと出力が欠けているタスクだけを実行する
+# - 依存関係のないタスクは別々のプロセスで並列に実行する。失敗したタスクの下流は実行しない
+# 各タスクのパスはスクリプト側の定義と一致させること
+
+PIPELINE_STATE_PATH = os.path.join(DATA_DIR, "pipeline_state.json")
+PIPELINE_LOG_DIR = os.path.join(LOG_DIR, "pipeline")
+
+CONTRAIL_TIMELINE_PATH = os.path.join(IMAGE_ANALYSIS_DIR, "suma", "contrail_timeline_by_qwen.csv")
+CONTRAIL_HOURLY_COUNTS_PATH = os.path.join(IMAGE_ANALYSIS_DIR, "suma", "contrail_hourly_counts.csv")
+AQI_DATA_PATH = os.path.join(DATA_DIR, "kobe_aqi_data.csv")
+
+
+class PipelineTask(NamedTuple):
+    """パイプラインの1つのタスク（スクリプトを1回実行する）"""
+    name: str
+    script: str
+    inputs: List[str]
+    outputs: List[str]
+    modules: List[str] = []
+
+
+PIPELINE = [
+    PipelineTask(
+        "contrail_hourly_counts", "contrail_hourly_counts_analysis.py",
+        inputs=[CONTRAIL_TIMELINE_PATH],
+        outputs=[CONTRAIL_HOURLY_COUNTS_PATH, os.path.join(DATA_DIR, "contrail_hourly_counts.png")],
+    ),
+    PipelineTask(
+        "contrail_pm25_correlation", "contrail_pm2.5_correlation_analysis.py",
+        inputs=[CONTRAIL_HOURLY_COUNTS_PATH, AQI_DATA_PATH],
+        outputs=[
+            os.path.join(IMAGE_ANALYSIS_DIR, "suma", "contrail_pm25_hourly_contrail_counts.csv"),
+            os.path.join(IMAGE_ANALYSIS_DIR, "suma", "contrail_pm25_correlation.png"),
+            os.path.join(IMAGE_ANALYSIS_DIR, "suma", "contrail_pm25_hourly_patterns.png"),
+        ],
+        modules=["_timeline_alignment.py", "_report_renderer.py", "_render_cache.py"],
+    ),
+    PipelineTask(
+        "o3_basic", "o3_basic_analysis.py",
+        inputs=[AQI_DATA_PATH],
+        outputs=[os.path.join(DATA_DIR, "o3_basic_analysis", name) for name in [
+            "o3_basic_月ごとの超過日数.csv", "o3_basic_連続超過エピソード.csv"]],
+        modules=["_exceedance_episodes.py"],
+    ),
+    PipelineTask(
+        "o3_relation", "o3_relation_analysis.py",
+        inputs=[AQI_DATA_PATH],
+        outputs=[os.path.join(DATA_DIR, "o3_relation_analysis", name) for name in [
+            "o3_月別相関係数.png", "o3_PM2.5とO3の濃度レベル相関.png",
+            "o3_PM2.5とO3の24時間移動相関.png", "o3_時差相関分析.png"]],
+        modules=["_report_renderer.py", "_render_cache.py"],
+    ),
+    PipelineTask(
+        "o3_visualize", "o3_visualize_analysis.py",
+        inputs=[AQI_DATA_PATH],
+        outputs=[os.path.join(DATA_DIR, "o3_visualize_analysis", name) for name in [
+            "o3_v_日最高O3濃度の時系列推移.png", "o3_v_日最高O3濃度の分布.png",
+            "o3_v_O3濃度レベル別の日数分布.png", "o3_v_月ごとのO3濃度分布.png", "o3_v_時間帯別のO3濃度の分布.png"]],
+        modules=["_report_renderer.py", "_render_cache.py", "_quantile_sketch.py"],
+    ),
+]
+
+
+def _signature(path: str) -> Optional[List[int]]:
+    """ファイルの更新時刻（ns）とサイズ（存在しない場合はNone）"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def task_sources(task: PipelineTask) -> List[str]:
+    """タスクの入力に、スクリプト自体と使っているモジュールを加えたもの"""
+    return task.inputs + [os.path.join(PROJECT_ROOT, path) for path in [task.script] + task.modules]
+
+
+def build_graph(tasks: List[PipelineTask]) -> Dict[str, Set[str]]:
+    """
+    入力と出力の宣言から依存関係を作る
+
+    Args:
+        tasks: タスク
+
+    Returns:
+        Dict[str, Set[str]]: タスク名 → 先に実行するタスク名
+
+    Raises:
+        ValueError: 同じファイルを出力するタスクが複数ある場合、または依存関係が循環している場合
+    """
+    producers = {}
+    for task in tasks:
+        for output in task.outputs:
+            if output in producers:
+                raise ValueError(f"{output} を出力するタスクが複数あります: {producers[output]}, {task.name}")
+            producers[output] = task.name
+    graph = {task.name: {producers[i] for i in task.inputs if i in producers and producers[i] != task.name}
+             for task in tasks}
+
+    # 循環の確認（トポロジカルソートで全てのタスクを並べられること）
+    remaining = {name: set(deps) for name, deps in graph.items()}
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            raise ValueError(f"タスクの依存関係が循環しています: {sorted(remaining)}")
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return graph
+
+
+def select_tasks(tasks: List[PipelineTask], graph: Dict[str, Set[str]], targets: Optional[List[str]]) -> List[PipelineTask]:
+    """指定したタスクと、その上流のタスク（targetsがNoneの場合は全て）"""
+    if not targets:
+        return list(tasks)
+    names = {task.name for task in tasks}
+    unknown = [t for t in targets if t not in names]
+    if unknown:
+        raise ValueError(f"不明なタスクです: {', '.join(unknown)}（{', '.join(sorted(names))}）")
+    selected = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in selected:
+            selected.add(name)
+            stack.extend(graph[name])
+    return [task for task in tasks if task.name in selected]
+
+
+class Pipeline:
+    """入力が変わったタスクだけを依存順に実行する"""
+
+    def __init__(self, tasks: List[PipelineTask] = PIPELINE, state_path: str = PIPELINE_STATE_PATH,
+                 log_dir: str = PIPELINE_LOG_DIR, max_workers: Optional[int] = None):
+        """
+        初期化
+
+        Args:
+            tasks: タスク
+            state_path: 前回成功したときの入力を記録するJSONファイル
+            log_dir: タスクごとの標準出力・標準エラーの保存先
+            max_workers: 同時に実行するタスク数（Noneの場合はCPUコア数）
+        """
+        self.tasks = {task.name: task for task in tasks}
+        self.graph = build_graph(tasks)
+        self.state_path = state_path
+        self.log_dir = log_dir
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict[str, dict]:
+        """実行記録を読み込む（壊れている場合は空として扱う）"""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self) -> None:
+        """実行記録を保存"""
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def stale_reason(self, task: PipelineTask) -> Optional[str]:
+        """
+        タスクを実行する必要がある理由（最新の場合はNone）
+
+        Args:
+            task: タスク
+
+        Returns:
+            Optional[str]: 理由
+        """
+        missing = [path for path in task.outputs if not os.path.exists(path)]
+        if missing:
+            return f"出力がありません: {os.path.basename(missing[0])}"
+        recorded = self.state.get(task.name, {}).get("sources")
+        if recorded is None:
+            return "実行記録がありません"
+        for path in task_sources(task):
+            if recorded.get(path) != _signature(path):
+                return f"入力が更新されました: {os.path.basename(path)}"
+        return None
+
+    def _run_task(self, task: PipelineTask, env: Dict[str, str]):
+        """
+        スクリプトを別プロセスで実行する
+
+        Returns:
+            tuple: (成功したか, 所要時間（秒）, ログファイルのパス)
+        """
+        os.makedirs(self.log_dir, exist_ok=True)
+        log_path = os.path.join(self.log_dir, f"{task.name}.log")
+        start = time.perf_counter()
+        with open(log_path, "w", encoding="utf-8") as log:
+            proc = subprocess.run([sys.executable, task.script], cwd=PROJECT_ROOT, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+        return proc.returncode == 0, time.perf_counter() - start, log_path
+
+    def run(self, targets: Optional[List[str]] = None, force: bool = False, dry_run: bool = False) -> Dict[str, str]:
+        """
+        最新でないタスクを依存順に実行する
+
+        Args:
+            targets: 実行するタスク名（上流のタスクも含める。Noneの場合は全て）
+            force: 最新のタスクも実行する
+            dry_run: 実行せずに、実行するタスクを返す
+
+        Returns:
+            Dict[str, str]: タスク名 → 結果（"up_to_date" / "built" / "failed" / "skipped" / "would_build"）
+        """
+        selected = select_tasks(list(self.tasks.values()), self.graph, targets)
+        pending = {task.name: set(self.graph[task.name]) & {t.name for t in selected} for task in selected}
+        results = {}
+
+        # 図の並列描画（_report_renderer）と合わせてCPUコア数を超えないようにする
+        env = dict(os.environ, MPLBACKEND="Agg")
+        env.setdefault("REPORT_WORKERS", str(max(1, (os.cpu_count() or 1) // self.max_workers)))
+
+        running = {}
+
+        def ready_tasks():
+            started = set(running.values())
+            return [name for name, deps in pending.items() if not deps and name not in started]
+
+        def finish(name, result):
+            results[name] = result
+            pending.pop(name, None)
+            for deps in pending.values():
+                deps.discard(name)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in ready_tasks():
+                    task = self.tasks[name]
+                    upstream = [d for d in self.graph[name] if results.get(d) in ("failed", "skipped")]
+                    if upstream:
+                        logger.error(f"タスク {name} は上流のタスク {', '.join(upstream)} が失敗したため実行しません")
+                        finish(name, "skipped")
+                        continue
+                    reason = "強制実行" if force else self.stale_reason(task)
+                    if dry_run and not reason and not any(results.get(d) == "would_build" for d in self.graph[name]):
+                        finish(name, "up_to_date")
+                        continue
+                    if dry_run:
+                        logger.info(f"タスク {name} を実行します（{reason or '上流のタスクを実行するため'}）")
+                        finish(name, "would_build")
+                        continue
+                    if not reason:
+                        logger.info(f"タスク {name} は最新です")
+                        finish(name, "up_to_date")
+                        continue
+                    logger.info(f"タスク {name} を実行します（{reason}）")
+                    running[executor.submit(self._run_task, task, env)] = name
+
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    task = self.tasks[name]
+                    try:
+                        ok, elapsed, log_path = future.result()
+                    except Exception as e:
+                        ok, elapsed, log_path = False, 0.0, None
+                        logger.error(f"タスク {name} を起動できませんでした: {e}")
+                    missing = [p for p in task.outputs if not os.path.exists(p)]
+                    if ok and not missing:
+                        self.state[name] = {"sources": {p: _signature(p) for p in task_sources(task)},
+                                            "finished": datetime.now().isoformat()}
+                        self._save_state()
+                        logger.info(f"タスク {name} が完了しました（{elapsed:.1f} 秒）")
+                        finish(name, "built")
+                    else:
+                        detail = f"出力がありません: {', '.join(os.path.basename(p) for p in missing)}" if ok else "終了コードが0ではありません"
+                        logger.error(f"タスク {name} が失敗しました（{detail}）。ログ: {log_path}")
+                        finish(name, "failed")
+        return results
+
+
+def main():
+    """
+    python _analysis_pipeline.py [--dry-run] [--force] [--workers N] [タスク名 ...]
+    """
+    args = sys.argv[1:]
+    workers = None
+    if "--workers" in args:
+        workers = int(args[args.index("--workers") + 1])
+        del args[args.index("--workers"):args.index("--workers") + 2]
+    targets = [a for a in args if not a.startswith("--")]
+
+    ensure_directories()
+    pipeline = Pipeline(max_workers=workers)
+    results = pipeline.run(targets or None, force="--force" in args, dry_run="--dry-run" in args)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    sys.exit(1 if any(r in ("failed", "skipped") for r in results.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
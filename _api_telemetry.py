@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import math
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from config import LOG_DIR, QWEN_PRICING, logger
+
+# Qwen / Claude の画像分析APIの呼び出しごとに、レイテンシ・トークン数・リトライ回数・コストを記録する
+# 記録は日ごとのJSONLファイルに追記し、モデル別・カメラ別の集計レポートを作成する
+
+TELEMETRY_DIR = os.path.join(LOG_DIR, "api_telemetry")
+
+
+def calculate_qwen_cost(model: str, input_tokens: int, output_tokens: int, cached_tokens: int = 0) -> float:
+    """
+    Qwenモデルのトークン数からコスト（USD）を計算
+
+    Args:
+        model: モデル名（例: qwen2.5-vl-7b-instruct）
+        input_tokens: 入力トークン数（キャッシュヒット分を含む）
+        output_tokens: 出力トークン数
+        cached_tokens: キャッシュヒットした入力トークン数
+
+    Returns:
+        float: コスト（USD）。料金表にないモデルの場合は0.0
+    """
+    pricing = QWEN_PRICING.get(model.lower())
+    if not pricing:
+        return 0.0
+
+    uncached_tokens = max(input_tokens - cached_tokens, 0)
+    input_cost = (uncached_tokens / 1000000) * pricing["input"]
+    cached_cost = (cached_tokens / 1000000) * pricing["input"] * pricing.get("cached_input_ratio", 1.0)
+    output_cost = (output_tokens / 1000000) * pricing["output"]
+    return input_cost + cached_cost + output_cost
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    ソート済みでない数値リストのパーセンタイルを線形補間で計算
+
+    Args:
+        values: 数値のリスト
+        pct: パーセンタイル（0〜100）
+
+    Returns:
+        float: パーセンタイル値。空の場合は0.0
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return ordered[int(rank)]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class APITelemetry:
+    """API呼び出しのテレメトリを記録・集計するクラス（スレッドセーフ）"""
+
+    def __init__(self, telemetry_dir: str = TELEMETRY_DIR):
+        """
+        初期化
+
+        Args:
+            telemetry_dir: 日ごとのJSONLファイルを保存するディレクトリ
+        """
+        self.telemetry_dir = telemetry_dir
+        self._lock = threading.Lock()
+        os.makedirs(self.telemetry_dir, exist_ok=True)
+
+    def _file_path(self, date: datetime) -> str:
+        """指定日のテレメトリファイルのパスを返す"""
+        return os.path.join(self.telemetry_dir, f"api_telemetry_{date.strftime('%Y%m%d')}.jsonl")
+
+    def record(self, provider: str, model: str, latency: float,
+               input_tokens: int = 0, output_tokens: int = 0, cached_tokens: int = 0,
+               retries: int = 0, cost: Optional[float] = None, success: bool = True,
+               camera: Optional[str] = None, image_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        API呼び出し1回分を記録
+
+        Args:
+            provider: プロバイダ名（qwen, claude など）
+            model: モデル名
+            latency: リトライを含む壁時計時間（秒）
+            input_tokens: 入力トークン数
+            output_tokens: 出力トークン数
+            cached_tokens: キャッシュヒットした入力トークン数
+            retries: リトライ回数
+            cost: コスト（USD）。Noneの場合はQwenの料金表から計算
+            success: 呼び出しが成功したかどうか
+            camera: カメラ名（モデルの比較をカメラ単位で行うため）
+            image_path: 分析した画像のパス
+
+        Returns:
+            Dict[str, Any]: 記録した内容
+        """
+        if cost is None:
+            cost = calculate_qwen_cost(model, input_tokens, output_tokens, cached_tokens) if provider == "qwen" else 0.0
+
+        now = datetime.now()
+        entry = {
+            "timestamp": now.isoformat(),
+            "provider": provider,
+            "model": model,
+            "camera": camera,
+            "image_path": image_path,
+            "latency": latency,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
+            "retries": retries,
+            "cost": cost,
+            "success": success,
+        }
+
+        try:
+            with self._lock:
+                with open(self._file_path(now), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.error(f"テレメトリの書き込み中にエラーが発生しました: {e}")
+
+        return entry
+
+    def load_records(self, start_date: datetime, end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        指定期間の記録を読み込む
+
+        Args:
+            start_date: 開始日
+            end_date: 終了日（含む）。Noneの場合は開始日のみ
+
+        Returns:
+            List[Dict[str, Any]]: 記録のリスト
+        """
+        end_date = end_date or start_date
+        records = []
+        current = start_date
+        while current.date() <= end_date.date():
+            file_path = self._file_path(current)
+            if os.path.exists(file_path):
+                with open(file_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if line:
+                            records.append(json.loads(line))
+            current += timedelta(days=1)
+        return records
+
+    @staticmethod
+    def summarize(records: List[Dict[str, Any]], group_by: tuple = ("provider", "model")) -> List[Dict[str, Any]]:
+        """
+        記録をグループごとに集計
+
+        Args:
+            records: 記録のリスト
+            group_by: 集計キー（例: ("camera", "model")）
+
+        Returns:
+            List[Dict[str, Any]]: グループごとの集計結果（平均コストの安い順）
+        """
+        groups = {}
+        for record in records:
+            key = tuple(record.get(k) for k in group_by)
+            groups.setdefault(key, []).append(record)
+
+        summaries = []
+        for key, items in groups.items():
+            latencies = [r["latency"] for r in items if r.get("success")]
+            successes = len(latencies)
+            total_cost = sum(r.get("cost", 0.0) for r in items)
+            summary = dict(zip(group_by, key))
+            summary.update({
+                "calls": len(items),
+                "errors": len(items) - successes,
+                "retries": sum(r.get("retries", 0) for r in items),
+                "latency_p50": percentile(latencies, 50),
+                "latency_p90": percentile(latencies, 90),
+                "latency_p99": percentile(latencies, 99),
+                "input_tokens": sum(r.get("input_tokens", 0) for r in items),
+                "output_tokens": sum(r.get("output_tokens", 0) for r in items),
+                "cached_tokens": sum(r.get("cached_tokens", 0) for r in items),
+                "total_cost": total_cost,
+                "cost_per_call": total_cost / len(items),
+            })
+            summaries.append(summary)
+
+        return sorted(summaries, key=lambda s: (s["cost_per_call"], s["latency_p50"]))
+
+    def generate_report(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                        output_path: Optional[str] = None) -> str:
+        """
+        指定期間のモデル別・カメラ別レポートを作成して保存
+
+        Args:
+            start_date: 開始日（Noneの場合は今日）
+            end_date: 終了日（Noneの場合は開始日）
+            output_path: レポートの保存先（Noneの場合はtelemetry_dirに保存）
+
+        Returns:
+            str: 保存したレポートのパス
+        """
+        start_date = start_date or datetime.now()
+        end_date = end_date or start_date
+        records = self.load_records(start_date, end_date)
+
+        period = f"{start_date.strftime('%Y-%m-%d')} 〜 {end_date.strftime('%Y-%m-%d')}"
+        lines = [
+            "=== API テレメトリレポート ===",
+            f"期間: {period}",
+            f"総呼び出し数: {len(records)}",
+            "",
+            "--- モデル別 ---",
+        ]
+        lines.extend(self._format_rows(self.summarize(records, ("provider", "model"))))
+        lines.extend(["", "--- カメラ別・モデル別 ---"])
+        lines.extend(self._format_rows(self.summarize(records, ("camera", "model"))))
+
+        if not output_path:
+            output_path = os.path.join(
+                self.telemetry_dir,
+                f"api_telemetry_report_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.txt"
+            )
+
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        logger.info(f"テレメトリレポートを {output_path} に保存しました")
+        return output_path
+
+    @staticmethod
+    def _format_rows(summaries: List[Dict[str, Any]]) -> List[str]:
+        """集計結果をレポート用の行に整形"""
+        if not summaries:
+            return ["  記録がありません"]
+
+        rows = []
+        for s in summaries:
+            label = " / ".join(str(v) for k, v in s.items() if k in ("provider", "model", "camera"))
+            rows.append(
+                f"  {label}: 呼び出し {s['calls']}回 (エラー {s['errors']}回, リトライ {s['retries']}回), "
+                f"レイテンシ p50={s['latency_p50']:.2f}s p90={s['latency_p90']:.2f}s p99={s['latency_p99']:.2f}s, "
+                f"トークン 入力={s['input_tokens']:,} (キャッシュ {s['cached_tokens']:,}) 出力={s['output_tokens']:,}, "
+                f"コスト 合計=${s['total_cost']:.6f} 1回あたり=${s['cost_per_call']:.6f}"
+            )
+        return rows
+
+
+if __name__ == "__main__":
+    # 引数で日付（YYYYMMDD）を指定。指定がなければ今日のレポートを作成
+    if len(sys.argv) > 1:
+        report_date = datetime.strptime(sys.argv[1], "%Y%m%d")
+    else:
+        report_date = datetime.now()
+
+    report_path = APITelemetry().generate_report(report_date)
+    with open(report_path, "r", encoding="utf-8") as f:
+        print(f.read())
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, NamedTuple, Optional
+from config import DATA_DIR, logger
+from _online_stats import OnlineStats
+from _stage_metrics import StageRecord, metrics
+
+# 測定値を取り込むたびに、移動統計（_online_stats）の現在の値に対して閾値・変化率のルールを評価し、通知する
+# - ルールは OnlineStats.value() で1つの値を読むだけなので、1件あたりO(1)で評価できる
+# - ヒステリシス: 値が on 以上になったときに発報し、off 以下に下がるまで同じルールは再び発報しない（解除時にも通知する）
+# - 通知先（シンク）は send(event) を持つオブジェクト。ファイル（JSONL）・ログ・Webhookを用意している
+# - 取得の開始から通知までの時間を計測し、段階 "alert_latency" としてメトリクスに記録する
+
+ALERT_DIR = os.path.join(DATA_DIR, "alerts")
+ALERT_LOG_PATH = os.path.join(ALERT_DIR, "aqi_alerts.jsonl")
+
+# Webhookの送信先（未設定の場合は送信せずにログに出すだけ）
+ALERT_WEBHOOK_URL = os.environ.get("AQI_ALERT_WEBHOOK_URL", "")
+WEBHOOK_TIMEOUT = 5  # 秒
+
+
+class AlertRule(NamedTuple):
+    """
+    アラートのルール
+
+    name: ルール名（状態の保存・通知に使う）
+    column: 列名
+    metric: OnlineStats.value() の metric（"last", "8h", "8h:slope", "ewma_1h" など）
+    on: この値以上になったら発報
+    off: この値以下に下がったら解除（on より小さくする）
+    message: 通知の文面
+    """
+    name: str
+    column: str
+    metric: str
+    on: float
+    off: float
+    message: str
+
+
+# 閾値は _exceedance_episodes.THRESHOLDS（O3: 30 / 50、PM2.5: 35 / 50）に合わせる
+# 変化率（slope）は直近1時間の変化では測定が1〜2件しかないため、8時間窓の最古と最新の測定値から求める
+# 窓の測定値が少ない間（4件・3時間未満、_online_stats.SLOPE_MIN_SAMPLES / SLOPE_MIN_SPAN）は値がなく、評価しない
+DEFAULT_RULES = [
+    AlertRule("o3_high", "O3", "last", 50, 45, "O3が高くなっています"),
+    AlertRule("o3_8h_high", "O3", "8h", 30, 27, "O3の8時間平均が高くなっています"),
+    AlertRule("o3_rising", "O3", "8h:slope", 5, 2, "O3が急上昇しています"),
+    AlertRule("pm25_high", "PM2.5", "last", 50, 45, "PM2.5が高くなっています"),
+    AlertRule("pm25_24h_high", "PM2.5", "24h", 35, 32, "PM2.5の24時間平均が高くなっています"),
+    AlertRule("pm25_rising", "PM2.5", "8h:slope", 5, 2, "PM2.5が急上昇しています"),
+]
+
+
+class FileSink:
+    """通知を1行1件のJSONとして追記する"""
+
+    def __init__(self, path: str = ALERT_LOG_PATH):
+        self.path = path
+
+    def send(self, event: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+class LogSink:
+    """通知をログに出す"""
+
+    def send(self, event: Dict[str, Any]) -> None:
+        status = "発報" if event["status"] == "raised" else "解除"
+        logger.warning(f"[アラート{status}] {event['message']}: {event['column']} {event['metric']} = "
+                       f"{event['value']:.2f}（閾値 {event['threshold']}）")
+
+
+class WebhookSink:
+    """通知をJSONでPOSTする（URLが未設定の場合は送信しない）"""
+
+    def __init__(self, url: str = ALERT_WEBHOOK_URL, timeout: float = WEBHOOK_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, event: Dict[str, Any]) -> None:
+        if not self.url:
+            logger.info(f"Webhookの送信先が未設定のため送信しません: {event['rule']}")
+            return
+        import requests
+
+        response = requests.post(self.url, json=event, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def default_sinks() -> List[Any]:
+    """ファイル・ログ・Webhook（AQI_ALERT_WEBHOOK_URL が設定されている場合のみ）"""
+    sinks = [FileSink(), LogSink()]
+    if ALERT_WEBHOOK_URL:
+        sinks.append(WebhookSink())
+    return sinks
+
+
+class AlertEngine:
+    """移動統計に対してルールを評価し、状態が変わったときに通知する（スレッドセーフ）"""
+
+    def __init__(self, stats: OnlineStats, rules: Optional[List[AlertRule]] = None, sinks: Optional[List[Any]] = None,
+                 name: str = "aqi", alert_dir: str = ALERT_DIR):
+        """
+        初期化
+
+        Args:
+            stats: 評価に使う移動統計（測定値の取り込みは呼び出し側で行う）
+            rules: ルール（省略時は DEFAULT_RULES）
+            sinks: 通知先（省略時は default_sinks()）
+            name: 状態ファイル名の接頭辞
+            alert_dir: 状態の保存先ディレクトリ
+        """
+        self.stats = stats
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self.sinks = default_sinks() if sinks is None else list(sinks)
+        self.name = name
+        self.alert_dir = alert_dir
+        self.active = None
+        self.last_evaluated = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.alert_dir, f"{self.name}_alert_state.json")
+
+    def _disk_version(self):
+        """保存済みファイルの版（inodeと更新時刻）。別のプロセスが書き換えた場合に変わる（ファイルがない場合はNone）"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        発報中のルールを読み込む（読み込み済みで、別のプロセスがファイルを書き換えていない場合は何もしない）
+
+        Returns:
+            Dict[str, Dict[str, Any]]: ルール名 → 発報時の値・時刻
+        """
+        version = self._disk_version()
+        if self.active is not None and version == self._version:
+            return self.active
+        self._version = version
+        self.active = {}
+        self.last_evaluated = None
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.active = data.get("active", {})
+            self.last_evaluated = data.get("last_evaluated")
+        return self.active
+
+    def evaluate(self, source: str = "waqi", started: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        移動統計の現在の値でルールを評価し、発報・解除を通知する
+        前回の評価から移動統計に新しい測定値が取り込まれていない場合は何もしない
+
+        Args:
+            source: 測定値の取得元（通知に含める）
+            started: 取得を開始した時刻（time.time()）。指定した場合は通知までの時間を計測する
+
+        Returns:
+            List[Dict[str, Any]]: 発報・解除のイベント
+        """
+        reading_time = self.stats.last_ingested
+        with self._lock:
+            self.load()
+            if reading_time is None or reading_time == self.last_evaluated:
+                return []
+            events = []
+            for rule in self.rules:
+                value = self.stats.value(rule.column, rule.metric)
+                if value is None:
+                    continue
+                if rule.name not in self.active and value >= rule.on:
+                    self.active[rule.name] = {"since": reading_time, "value": value}
+                    events.append(self._event(rule, "raised", value, rule.on, reading_time, source))
+                elif rule.name in self.active and value <= rule.off:
+                    since = self.active.pop(rule.name)["since"]
+                    events.append(dict(self._event(rule, "cleared", value, rule.off, reading_time, source), since=since))
+            self.last_evaluated = reading_time
+            self._save()
+
+        for event in events:
+            if started is not None:
+                event["latency_ms"] = round((time.time() - started) * 1000, 1)
+            for sink in self.sinks:
+                try:
+                    sink.send(event)
+                except Exception as e:
+                    logger.error(f"アラートの通知中にエラーが発生しました（{type(sink).__name__}）: {e}")
+        if started is not None:
+            # 取得の開始から評価・通知の完了までの時間（発報がない場合も記録する）
+            record = StageRecord("alert_latency", {"source": source})
+            record.add(items=len(events))
+            record.duration = time.time() - started
+            metrics.observe(record)
+        return events
+
+    @staticmethod
+    def _event(rule: AlertRule, status: str, value: float, threshold: float, reading_time: str,
+               source: str) -> Dict[str, Any]:
+        return {"rule": rule.name, "status": status, "column": rule.column, "metric": rule.metric,
+                "value": value, "threshold": threshold, "message": rule.message, "time": reading_time,
+                "source": source, "notified_at": datetime.now().isoformat()}
+
+    def _save(self) -> None:
+        """発報中のルールを書き出す（ロック取得済みで呼ぶ）"""
+        os.makedirs(self.alert_dir, exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"active": self.active, "last_evaluated": self.last_evaluated}, f, ensure_ascii=False, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+        self._version = self._disk_version()
+
+
+if __name__ == "__main__":
+    # python _aqi_alerts.py   保存済みの移動統計に対するルールの現在の値と、発報中のルールを表示
+    engine = AlertEngine(OnlineStats("aqi"), sinks=[])
+    active = engine.load()
+    for rule in engine.rules:
+        value = engine.stats.value(rule.column, rule.metric)
+        mark = "発報中" if rule.name in active else ""
+        shown = "-" if value is None else f"{value:.2f}"
+        print(f"{rule.name:16s} {rule.column:6s} {rule.metric:10s} {shown:>8s}  on={rule.on} off={rule.off} {mark}")
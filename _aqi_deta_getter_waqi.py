@@ -1,13 +1,23 @@
 import os
 import json
 import time
+import fcntl
 import requests
+from contextlib import contextmanager
 from datetime import datetime
 from config import *
+from _raw_response_archive import RawResponseArchive
+from _stage_metrics import stage, timed_stage
+from _time_pyramid import TimePyramid
+from _exceedance_episodes import ExceedanceTracker
+from _quantile_sketch import SketchStore
+from _online_stats import OnlineStats
+from _aqi_alerts import AlertEngine
 
-import pandas as pd
 import re
 
+# pandasはCSVの保存・前処理でのみ使うため、起動を軽くするために関数内でインポートする
+
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -17,8 +27,39 @@ API_BASE_URL = "https://api.waqi.info"
 API_TOKEN = os.getenv('AQI_API_TOKEN')  # api_token.pyからインポート
 location = SUMA_LAT_LON
 
+# 常駐スケジューラから繰り返し呼ばれる場合に接続を再利用するためのセッション
+session = requests.Session()
+REQUEST_TIMEOUT = 30  # 秒
+
+# 生レスポンスは日ごとの圧縮JSONLに追記する（再解析・リプレイ用）
+raw_archive = RawResponseArchive("waqi")
+
+# 取得した行を1分・1時間・1日・1週間の集計に追加する（長期間のグラフや問い合わせ用）
+aqi_pyramid = TimePyramid("aqi")
+
+# O3・PM2.5が閾値を連続して超えた期間を取得のたびに更新する
+aqi_episodes = ExceedanceTracker("aqi")
+
+# 汚染物質の分布（全期間・時間帯・月ごとの分位点）を取得のたびに更新する
+aqi_sketches = SketchStore("aqi")
+
+# 直近1・8・24時間の統計とEWMAを取得のたびに更新する（「現在の8時間平均O3」などをすぐに返すため）
+aqi_online_stats = OnlineStats("aqi")
+
+# 取得した行を追加する集計（ステージ名, 表示名, ストア）。いずれも ensure_built / ingest を持つ
+derived_stores = [
+    ("pyramid", "時間ピラミッド", aqi_pyramid),
+    ("episodes", "超過エピソード", aqi_episodes),
+    ("sketches", "分位点スケッチ", aqi_sketches),
+    ("online_stats", "移動統計", aqi_online_stats),
+]
+
+# 移動統計を更新するたびに閾値・変化率のルールを評価して通知する
+aqi_alerts = AlertEngine(aqi_online_stats)
+
 def fetch_aqi_data():
     """神戸市須磨区の大気質データをAPIから取得する関数"""
+    started = time.time()
     try:
         # トークンが設定されているか確認
         if not API_TOKEN:
@@ -36,7 +77,9 @@ def fetch_aqi_data():
         logger.info(f"APIリクエストを送信: {url.replace(API_TOKEN, '***')}")
         
         # APIリクエストを送信
-        response = requests.get(url)
+        with stage("fetch", source="waqi") as s:
+            response = session.get(url, timeout=REQUEST_TIMEOUT)
+            s.add(items=1, bytes=len(response.content))
         
         # レスポンスをチェック
         if response.status_code != 200:
@@ -46,13 +89,8 @@ def fetch_aqi_data():
         # JSONデータを解析
         data = response.json()
         
-        # レスポンスの詳細をデバッグ用に保存
-        debug_dir = os.path.join(DATA_DIR, "debug")
-        os.makedirs(debug_dir, exist_ok=True)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        with open(os.path.join(debug_dir, f"api_response_{timestamp}.json"), "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # レスポンスの詳細をアーカイブに保存
+        raw_archive.append(data, meta={"status_code": response.status_code, "location": location})
         
         # データの有効性をチェック
         if data["status"] != "ok" or "data" not in data:
@@ -63,7 +101,8 @@ def fetch_aqi_data():
             return None
             
         # 結果を整形
-        result = parse_api_response(data)
+        with stage("parse", source="waqi"):
+            result = parse_api_response(data)
         if not result:
             logger.error("APIレスポンスの解析に失敗しました")
             return None
@@ -74,6 +113,9 @@ def fetch_aqi_data():
             logger.error("データの保存に失敗しました")
             return None
 
+        update_derived_stores(result)
+        check_alerts(started)
+
         return result
         
     except Exception as e:
@@ -155,6 +197,53 @@ def get_aqi_status(aqi_value):
     
 #------------------------- data handler-------------------------
     
+@contextmanager
+def csv_lock(filename=CSV_FILE_PATH):
+    """
+    CSVの読み込みから書き込みまでを他のプロセス・スレッドと排他する（取得と欠測の補完が同時に書き込まないため）
+
+    Args:
+        filename: 対象のCSV（ロックファイルは filename + ".lock"）
+    """
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+def update_derived_stores(data):
+    """
+    取得したデータを時間ピラミッド・超過エピソード・分位点スケッチ・移動統計に追加する（初回はCSV全体から構築）
+    失敗してもデータ取得自体は成功として扱う
+    別のプロセスで実行した欠測の補完が作り直している途中に書き込まないよう、CSVのロックを取ってから更新する
+    （各ストアは取り込みの前に、別のプロセスが書き換えたファイルを読み直す）
+
+    Args:
+        data: parse_api_responseの戻り値
+    """
+    with csv_lock(CSV_FILE_PATH):
+        for stage_name, label, store in derived_stores:
+            try:
+                with stage(stage_name, source="waqi"):
+                    if not store.ensure_built(CSV_FILE_PATH):
+                        store.ingest([data])
+            except Exception as e:
+                logger.error(f"{label}の更新中にエラーが発生しました: {e}")
+
+def check_alerts(started=None):
+    """
+    更新した移動統計に対してアラートのルールを評価する
+    失敗してもデータ取得自体は成功として扱う
+
+    Args:
+        started: 取得を開始した時刻（time.time()）。取得から通知までの時間の計測に使う
+    """
+    try:
+        with stage("alerts", source="waqi"):
+            aqi_alerts.evaluate(source="waqi", started=started)
+    except Exception as e:
+        logger.error(f"アラートの評価中にエラーが発生しました: {e}")
+
+@timed_stage("store")
 def save_to_csv(data, filename=CSV_FILE_PATH):
     """
     スクレイピングしたデータをCSVファイルに保存する関数
@@ -170,16 +259,18 @@ def save_to_csv(data, filename=CSV_FILE_PATH):
         logger.warning("データがないため保存しません")
         return False
     
+    import pandas as pd
     try:
         # 保存するデータの順序とカラムを定義
         columns = [
             "地点", "取得時間", "AQI値", "大気質ステータス", "主要汚染物質",
             "PM2.5", "PM10", "O3", "NO2",
-            "温度", "湿度", "気圧", "風速", "降水量"
+            "温度", "湿度", "気圧", "風速", "降水量", "取得元"
         ]
         
-        # データをDataFrameに変換
+        # データをDataFrameに変換（欠測の補完で追加した行と区別するため取得元を記録）
         df_new = pd.DataFrame([data])
+        df_new["取得元"] = "waqi"
         
         # 地点名を統一（Miyukichodのケースを「神戸市 須磨区」に変更）
         if "地点" in df_new.columns:
@@ -202,31 +293,31 @@ def save_to_csv(data, filename=CSV_FILE_PATH):
         # カラムの順序を整える
         df_new = df_new[columns]
         
-        # ファイルの存在確認
-        file_exists = os.path.isfile(filename)
+        # 欠測の補完が読み込んでから書き戻すまでの間に保存しないよう、読み込みから書き込みまでロックする
+        with csv_lock(filename):
+            # ファイルの存在確認
+            file_exists = os.path.isfile(filename)
         
-        if file_exists:
-            # 既存のCSVファイルを読み込み
-            df_existing = pd.read_csv(filename, encoding='utf-8-sig')
+            if file_exists:
+                # 既存のCSVファイルを読み込み
+                df_existing = pd.read_csv(filename, encoding='utf-8-sig')
             
-            # 既存のデータに新しいデータを追加
-            df_combined = pd.concat([df_existing, df_new], ignore_index=True)
+                # 既存のデータに新しいデータを追加
+                df_combined = pd.concat([df_existing, df_new], ignore_index=True)
             
-            # 重複する行を取得時間に基づいて削除（最新のものを保持）
-            df_combined = df_combined.drop_duplicates(subset=['取得時間'], keep='last')
+                # 重複する行を取得時間に基づいて削除（最新のものを保持）
+                df_combined = df_combined.drop_duplicates(subset=['取得時間'], keep='last')
             
-            # 欠損値を適切な値で埋める
-            for col in numeric_columns:
-                df_combined[col] = df_combined[col].fillna(0.0)
+                # 欠損値の補完は新しい行（df_new）だけに行う（欠測の補完で追加した行の気象データは空欄のまま残す）
             
-            # 結合したデータを保存
-            df_combined.to_csv(filename, index=False, encoding='utf-8-sig')
-        else:
-            # ディレクトリが存在するか確認し、なければ作成
-            os.makedirs(os.path.dirname(filename), exist_ok=True)
+                # 結合したデータを保存
+                df_combined.to_csv(filename, index=False, encoding='utf-8-sig')
+            else:
+                # ディレクトリが存在するか確認し、なければ作成
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
             
-            # 新規ファイルとして保存
-            df_new.to_csv(filename, index=False, encoding='utf-8-sig')
+                # 新規ファイルとして保存
+                df_new.to_csv(filename, index=False, encoding='utf-8-sig')
         
         logger.info(f"データを {filename} に保存しました")
         
@@ -242,6 +333,7 @@ def save_to_csv(data, filename=CSV_FILE_PATH):
         logger.error(traceback.format_exc())
         return False
 
+@timed_stage("preprocess")
 def preprocess_aqi_data(df):
     """
     AQIデータを前処理する関数
@@ -256,6 +348,7 @@ def preprocess_aqi_data(df):
         logger.error("前処理するデータがありません")
         return None, []
         
+    import pandas as pd
     try:
         # 必要な列が存在するか確認
         required_columns = ["取得時間", "AQI値"]
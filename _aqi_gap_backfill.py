@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import requests
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+from config import *
+from _stage_metrics import stage
+from _aqi_deta_getter_waqi import csv_lock, derived_stores, aqi_alerts
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# 保存済みのAQIデータから欠けている1時間のバケットを検出し、その部分だけをGoogle Air Quality APIの履歴で補完する
+# 隣接する欠測はまとめて1つの期間にし、ページングしながら取得するため、リクエスト数は期間の長さではなく欠測の数に比例する
+# 補完した行は「取得元」列に google_backfill と記録する（WAQIから取得した行は waqi）
+
+API_KEY = os.getenv('GOOGLE_AQI_API_KEY')
+HISTORY_URL = "https://airquality.googleapis.com/v1/history:lookup"
+
+LATITUDE, LONGITUDE = SUMA_LAT_LON
+LOCATION_NAME = "神戸市 須磨区"
+
+# 保存データの時刻は日本時間、APIの時刻はUTC
+JST = timezone(timedelta(hours=9))
+
+# 履歴APIで取得できる期間（日）と1ページの最大時間数
+HISTORY_LIMIT_DAYS = 30
+HISTORY_PAGE_SIZE = 168
+# この時間数以下のデータがある区間を挟んだ欠測は、1つのリクエストにまとめる
+MERGE_WITHIN_HOURS = 3
+REQUEST_TIMEOUT = 30  # 秒
+
+SOURCE_COLUMN = "取得元"
+SOURCE_WAQI = "waqi"
+SOURCE_BACKFILL = "google_backfill"
+
+CSV_HEADERS = [
+    "地点", "取得時間", "AQI値", "大気質ステータス", "主要汚染物質",
+    "PM2.5", "PM10", "O3", "NO2", "温度", "湿度", "気圧", "風速", "降水量", SOURCE_COLUMN
+]
+
+session = requests.Session()
+
+
+def detect_gaps(times, start=None, end=None) -> List[Tuple[datetime, datetime]]:
+    """
+    時刻の列から、データが1件もない1時間のバケットの連続区間を検出する（ソートと差分だけのベクトル処理）
+
+    Args:
+        times: 取得時刻（文字列またはdatetimeの配列）
+        start: 確認する期間の開始（Noneの場合はデータの最初）
+        end: 確認する期間の終了（Noneの場合はデータの最後）
+
+    Returns:
+        List[Tuple[datetime, datetime]]: 欠測区間（最初と最後の欠測バケットの開始時刻、両端を含む）
+    """
+    import numpy as np
+    import pandas as pd
+
+    hours = pd.to_datetime(pd.Series(times), errors="coerce").dropna().dt.floor("h")
+    if start is not None:
+        hours = hours[hours >= pd.Timestamp(start).floor("h")]
+    if end is not None:
+        hours = hours[hours <= pd.Timestamp(end).floor("h")]
+    buckets = np.unique(hours.values.astype("datetime64[h]").astype(np.int64))
+
+    # 期間の両端に番兵を置き、先頭・末尾の欠測も同じ差分で検出する
+    first = pd.Timestamp(start).floor("h") if start is not None else None
+    last = pd.Timestamp(end).floor("h") if end is not None else None
+    if first is not None:
+        buckets = np.concatenate([[np.datetime64(first, "h").astype(np.int64) - 1], buckets])
+    if last is not None:
+        buckets = np.concatenate([buckets, [np.datetime64(last, "h").astype(np.int64) + 1]])
+    if len(buckets) < 2:
+        return []
+
+    diffs = np.diff(buckets)
+    holes = np.nonzero(diffs > 1)[0]
+    return [
+        (pd.Timestamp(np.datetime64(int(buckets[i]) + 1, "h")).to_pydatetime(),
+         pd.Timestamp(np.datetime64(int(buckets[i + 1]) - 1, "h")).to_pydatetime())
+        for i in holes
+    ]
+
+
+def coalesce_gaps(gaps: List[Tuple[datetime, datetime]], merge_within_hours: int = MERGE_WITHIN_HOURS,
+                  max_hours: int = HISTORY_LIMIT_DAYS * 24) -> List[Tuple[datetime, datetime]]:
+    """
+    近い欠測区間を1つのリクエスト期間にまとめる（間に挟まる既存データの取り直しは、リクエストを増やすより安い）
+
+    Args:
+        gaps: detect_gapsの戻り値
+        merge_within_hours: この時間数以下の間隔で隣り合う欠測はまとめる
+        max_hours: 1つの期間の最大時間数
+
+    Returns:
+        List[Tuple[datetime, datetime]]: リクエストする期間（両端の時間を含む）
+    """
+    windows = []
+    for gap_start, gap_end in sorted(gaps):
+        if windows:
+            window_start, window_end = windows[-1]
+            hours_between = (gap_start - window_end).total_seconds() / 3600 - 1
+            merged_hours = (gap_end - window_start).total_seconds() / 3600 + 1
+            if hours_between <= merge_within_hours and merged_hours <= max_hours:
+                windows[-1] = (window_start, gap_end)
+                continue
+        windows.append((gap_start, gap_end))
+    return windows
+
+
+def parse_history_hour(hour_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    履歴APIの1時間分のデータを aqi_data.csv の1行に変換（気象データは含まれないため空欄）
+
+    Args:
+        hour_info: レスポンスの hoursInfo の要素
+
+    Returns:
+        Dict[str, Any]: CSVの1行。日時が読めない場合はNone
+    """
+    try:
+        utc_time = datetime.fromisoformat(hour_info["dateTime"].replace("Z", "+00:00"))
+    except (KeyError, ValueError):
+        return None
+    local_time = utc_time.astimezone(JST).replace(tzinfo=None)
+
+    row = {column: "" for column in CSV_HEADERS}
+    row.update({"地点": LOCATION_NAME, "取得時間": local_time.strftime("%Y-%m-%d %H:%M:%S"), SOURCE_COLUMN: SOURCE_BACKFILL})
+    for index in hour_info.get("indexes", []):
+        if index.get("code", "").lower() == "uaqi":
+            row["AQI値"] = index.get("aqi", "")
+            row["大気質ステータス"] = index.get("category", "")
+            row["主要汚染物質"] = index.get("dominantPollutant", "")
+    columns = {"pm25": "PM2.5", "pm10": "PM10", "o3": "O3", "no2": "NO2"}
+    for pollutant in hour_info.get("pollutants", []):
+        column = columns.get(pollutant.get("code", "").lower())
+        if column:
+            row[column] = pollutant.get("concentration", {}).get("value", "")
+    return row
+
+
+def fetch_history_window(window_start: datetime, window_end: datetime) -> List[Dict[str, Any]]:
+    """
+    1つの期間の履歴をページングしながら取得する
+
+    Args:
+        window_start: 最初の時間（日本時間）
+        window_end: 最後の時間（日本時間、この時間を含む）
+
+    Returns:
+        List[Dict[str, Any]]: hoursInfo の要素のリスト
+    """
+    period = {
+        "startTime": window_start.replace(tzinfo=JST).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "endTime": (window_end + timedelta(hours=1)).replace(tzinfo=JST).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    payload = {
+        "location": {"latitude": LATITUDE, "longitude": LONGITUDE},
+        "period": period,
+        "universalAqi": True,
+        "extraComputations": ["DOMINANT_POLLUTANT_CONCENTRATION", "POLLUTANT_CONCENTRATION"],
+        "languageCode": "ja",
+        "pageSize": HISTORY_PAGE_SIZE,
+    }
+
+    hours = []
+    while True:
+        with stage("fetch", source="google_history") as s:
+            response = session.post(HISTORY_URL, params={"key": API_KEY}, json=payload, timeout=REQUEST_TIMEOUT)
+            s.add(items=1, bytes=len(response.content))
+        if response.status_code != 200:
+            logger.error(f"履歴APIエラー: ステータスコード {response.status_code}, {response.text[:200]}")
+            break
+        data = response.json()
+        hours.extend(data.get("hoursInfo", []))
+        token = data.get("nextPageToken")
+        if not token:
+            break
+        payload["pageToken"] = token
+    return hours
+
+
+def load_series(csv_path: str):
+    """保存済みのCSVを読み込む（取得元の列がない場合は既存の行をWAQIとして扱う）"""
+    import pandas as pd
+
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    if SOURCE_COLUMN not in df.columns:
+        df[SOURCE_COLUMN] = SOURCE_WAQI
+    df[SOURCE_COLUMN] = df[SOURCE_COLUMN].fillna(SOURCE_WAQI)
+    return df
+
+
+def backfill_gaps(csv_path: str = CSV_FILE_PATH, days: int = HISTORY_LIMIT_DAYS, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    保存済みのCSVの欠測時間を検出し、履歴APIで取得できる範囲だけを補完する
+
+    Args:
+        csv_path: 対象のCSV
+        days: 確認する日数（履歴APIの制限により最大30日）
+        dry_run: Trueの場合は検出結果だけを返し、APIへのリクエストと保存を行わない
+
+    Returns:
+        Dict[str, Any]: gaps（欠測区間の数）, missing_hours, windows（リクエスト期間）, filled（補完した時間数）
+    """
+    import pandas as pd
+
+    result = {"gaps": 0, "missing_hours": 0, "windows": [], "filled": 0}
+    if not os.path.exists(csv_path):
+        logger.error(f"CSVファイルが見つかりません: {csv_path}")
+        return result
+
+    df = load_series(csv_path)
+    # 現在の時間はまだ取得前の可能性があるため、1時間前までを確認する
+    end = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+    start = end - timedelta(days=min(days, HISTORY_LIMIT_DAYS)) + timedelta(hours=1)
+    gaps = detect_gaps(df["取得時間"], start, end)
+    windows = coalesce_gaps(gaps)
+    result.update({
+        "gaps": len(gaps),
+        "missing_hours": int(sum((b - a).total_seconds() // 3600 + 1 for a, b in gaps)),
+        "windows": [(a.isoformat(), b.isoformat()) for a, b in windows],
+    })
+    logger.info(f"欠測区間 {result['gaps']} 件（{result['missing_hours']} 時間）、リクエスト {len(windows)} 件")
+    if dry_run or not windows:
+        return result
+    if not API_KEY:
+        logger.error("GOOGLE_AQI_API_KEY が設定されていないため補完できません")
+        return result
+
+    missing = set()
+    for gap_start, gap_end in gaps:
+        missing.update(pd.date_range(gap_start, gap_end, freq="h"))
+
+    rows = []
+    for window_start, window_end in windows:
+        for hour_info in fetch_history_window(window_start, window_end):
+            row = parse_history_hour(hour_info)
+            # まとめた期間に含まれる既存データの時間は追加しない
+            if row and pd.Timestamp(row["取得時間"]).floor("h") in missing:
+                missing.discard(pd.Timestamp(row["取得時間"]).floor("h"))
+                rows.append(row)
+
+    if not rows:
+        return result
+
+    # 履歴の取得中にWAQIの取得が行を保存している場合があるため、ロックを取ってから読み直して結合する
+    with csv_lock(csv_path):
+        df = load_series(csv_path)
+        existing = set(pd.to_datetime(df["取得時間"], errors="coerce").dropna().dt.floor("h"))
+        rows = [row for row in rows if pd.Timestamp(row["取得時間"]).floor("h") not in existing]
+        if not rows:
+            return result
+        combined = pd.concat([df, pd.DataFrame(rows)], ignore_index=True)
+        combined = combined.sort_values("取得時間", key=lambda s: pd.to_datetime(s, errors="coerce"), kind="stable")
+        tmp_path = csv_path + ".tmp"
+        combined.to_csv(tmp_path, index=False, encoding="utf-8-sig")
+        os.replace(tmp_path, csv_path)
+        logger.info(f"{len(rows)} 時間分のデータを補完しました: {csv_path}")
+        result["filled"] = len(rows)
+
+        # 時間ピラミッド・超過エピソード・分位点スケッチ・移動統計は最新時刻より前の行を取り込まないため、補完した場合は作り直す
+        # （作り直す間に取得した行が失われないよう、ロックを保持したまま行う）
+        # 常駐スケジューラでは取得側のインスタンスがメモリ上の状態を保持しているため、新しいインスタンスではなく
+        # 取得側と同じインスタンスを作り直す（別のインスタンスでは次の取得時に古い状態で上書きされる）
+        if os.path.abspath(csv_path) == os.path.abspath(CSV_FILE_PATH):
+            for stage_name, label, store in derived_stores:
+                try:
+                    with stage(stage_name, source=SOURCE_BACKFILL):
+                        store.rebuild(combined)
+                except Exception as e:
+                    logger.error(f"{label}の作り直し中にエラーが発生しました: {e}")
+            # 補完した行が最新の測定値になった場合（WAQIの取得が止まっていた場合など）はアラートも評価する
+            aqi_alerts.evaluate(source=SOURCE_BACKFILL)
+
+    return result
+
+
+def main():
+    """
+    python _aqi_gap_backfill.py [--dry-run] [--days N] [CSVのパス]
+    """
+    args = sys.argv[1:]
+    dry_run = "--dry-run" in args
+    days = HISTORY_LIMIT_DAYS
+    if "--days" in args:
+        days = int(args[args.index("--days") + 1])
+        del args[args.index("--days"):args.index("--days") + 2]
+    paths = [a for a in args if not a.startswith("--")]
+    result = backfill_gaps(paths[0] if paths else CSV_FILE_PATH, days, dry_run)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import matplotlib.colors as mcolors
 import matplotlib.font_manager as fm
 import os
 from config import *
+from _stage_metrics import timed_stage
 
 def setup_japanese_font():
     # 明示的にIPAexゴシックを指定
@@ -34,17 +35,45 @@ def load_and_preprocess_data(file_path):
     df.loc[:, '日付'] = df['取得時間'].dt.date
     return df
 
-def create_aqi_visualization(file_path, output_path='aqi_visualization.png', days=None):    
+def load_from_pyramid(pyramid, days=None, max_points=2000):
+    """
+    時間ピラミッドから表示期間の平均値を読み込む（期間の長さに関係なく最大max_points点）
+    
+    Args:
+        pyramid (TimePyramid): 集計済みの時間ピラミッド
+        days (int, optional): 表示する日数。Noneの場合は全期間
+        max_points (int): 最大の点数
+    
+    Returns:
+        pd.DataFrame: load_and_preprocess_dataと同じ列構成（取得時間と各列の平均値）
+    """
+    first, last = pyramid.time_range()
+    if last is None:
+        return pd.DataFrame(columns=['取得時間', '日付'])
+    start = last - pd.Timedelta(days=days-1) if days is not None else first
+    frame = pyramid.query(start, last, max_points=max_points)
+    means = frame[[c for c in frame.columns if c.endswith('_mean')]]
+    df = means.rename(columns=lambda c: c[:-len('_mean')]).rename_axis('取得時間').reset_index()
+    df.loc[:, '日付'] = df['取得時間'].dt.date
+    return df
+
+@timed_stage("render")
+def create_aqi_visualization(file_path, output_path='aqi_visualization.png', days=None, pyramid=None, max_points=2000):    
     """
     AQIデータを可視化し、画像として保存する関数
     daysパラメータが指定された場合は最新N日間のみ表示、指定がない場合は全期間表示
     
     Args:
-        df (pd.DataFrame): 前処理されたデータフレーム
+        file_path (str): AQIデータのCSVのパス（pyramidを指定した場合は使用しない）
         output_path (str): 出力画像のパス
         days (int, optional): 表示する日数。Noneの場合は全期間を表示
+        pyramid (TimePyramid, optional): 指定した場合はCSVの全行ではなく、時間ピラミッドの集計から描画する
+        max_points (int): pyramidを使用する場合の最大の点数
     """
-    df = load_and_preprocess_data(file_path)
+    if pyramid is not None:
+        df = load_from_pyramid(pyramid, days, max_points)
+    else:
+        df = load_and_preprocess_data(file_path)
     # 日本語フォントの設定
     japanese_font = setup_japanese_font()
     
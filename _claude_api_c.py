@@ -2,8 +2,10 @@
 
 import os
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import anthropic
 import logging
 from dotenv import load_dotenv
 from config import *
@@ -43,13 +45,18 @@ CLAUDE_PRICING = {
     }
 }
 
+# プロンプトキャッシュの料金倍率（入力トークン単価に対する倍率）
+CACHE_WRITE_PRICE_MULTIPLIER = 1.25  # キャッシュ書き込みは通常入力の1.25倍
+CACHE_READ_PRICE_MULTIPLIER = 0.1    # キャッシュ読み込み（ヒット）は通常入力の0.1倍
+
 class ClaudeAPI_C:
     """
     Anthropic Claude APIの使用コストを計算するクラス
     """
     
     def __init__(self, api_key=None, model="claude-3-haiku-20240307", log_to_file=True, 
-                 log_dir="logs", yen_rate=142.0):
+                 log_dir="logs", yen_rate=142.0, base_url=None, prompt_cache=False,
+                 max_retries=2, telemetry=None, camera=None):
         """
         初期化関数
         
@@ -59,6 +66,11 @@ class ClaudeAPI_C:
             log_to_file (bool, optional): ログをファイルに保存するかどうか
             log_dir (str, optional): ログを保存するディレクトリ
             yen_rate (float, optional): USDからJPYへの変換レート
+            base_url (str, optional): APIのベースURL（ローカルのスタブサーバーで試験する場合に指定）
+            prompt_cache (bool, optional): システムプロンプトと固定の指示文をキャッシュ対象として送信するかどうか
+            max_retries (int, optional): 一時的なエラー（接続・レート制限・サーバーエラー）時のリトライ回数
+            telemetry (APITelemetry, optional): API呼び出しを記録するテレメトリ（Noneの場合は記録しない）
+            camera (str, optional): テレメトリに記録するカメラ名
         """
         self.api_key = api_key
         if not self.api_key:
@@ -68,20 +80,36 @@ class ClaudeAPI_C:
         self.log_to_file = log_to_file
         self.log_dir = log_dir
         self.yen_rate = yen_rate
+        self.prompt_cache = prompt_cache
+        self.max_retries = max_retries
+        self.telemetry = telemetry
+        self.camera = camera
         
         # ログディレクトリがない場合は作成
         if self.log_to_file and not os.path.exists(self.log_dir):
             os.makedirs(self.log_dir)
         
-        # クライアントの初期化
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        # クライアントの初期化（anthropicはインスタンス生成時に初めて読み込む）
+        # リトライ回数をテレメトリに記録するため、クライアント側の自動リトライは無効にする
+        import anthropic
+        self.base_url = base_url
+        if self.base_url:
+            self.client = anthropic.Anthropic(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        else:
+            self.client = anthropic.Anthropic(api_key=self.api_key, max_retries=0)
         
         # 結果を格納するリスト
         self.results = []
         
+        # リクエスト数（バッチモードではresultsに保持しないため別途カウント）
+        self.request_count = 0
+        
+        # 並列実行時に合計値と結果リストを保護するロック
+        self._lock = threading.Lock()
+        
         # 合計トークン数とコスト
-        self.total_tokens = {"input": 0, "output": 0, "total": 0}
-        self.total_cost = {"input": 0.0, "output": 0.0, "total": 0.0}
+        self.total_tokens = {"input": 0, "output": 0, "cache_creation": 0, "cache_read": 0, "total": 0}
+        self.total_cost = {"input": 0.0, "output": 0.0, "cache_creation": 0.0, "cache_read": 0.0, "total": 0.0}
     
     def send_request(self, prompt, system_prompt=None, max_tokens=2000, temperature=0):
         """
@@ -93,6 +121,48 @@ class ClaudeAPI_C:
             max_tokens (int, optional): 最大出力トークン数
             temperature (float, optional): モデルの温度パラメータ
             
+        Returns:
+            dict: レスポンスとコスト情報を含む辞書
+        """
+        result = self._execute_text_request(prompt, system_prompt, max_tokens, temperature)
+
+        # ログをファイルに保存（log_to_fileがTrueの場合）
+        if self.log_to_file and "error" not in result:
+            self.save_results()
+        
+        return result
+    
+    def send_multimodal_request(self, text_content, image_data=None, image_path=None, 
+                               system_prompt=None, max_tokens=2000, temperature=0):
+        """
+        マルチモーダルリクエスト（テキスト＋画像）を送信してコストを計算
+        
+        Args:
+            text_content (str): テキストコンテンツ
+            image_data (bytes, optional): 画像のバイナリデータ
+            image_path (str, optional): 画像ファイルのパス
+            system_prompt (str, optional): システムプロンプト
+            max_tokens (int, optional): 最大出力トークン数
+            temperature (float, optional): モデルの温度パラメータ
+            
+        Returns:
+            dict: レスポンスとコスト情報を含む辞書
+        """
+        return self._execute_multimodal_request(text_content, image_data, image_path,
+                                                system_prompt, max_tokens, temperature)
+    
+    def _execute_text_request(self, prompt, system_prompt=None, max_tokens=2000, temperature=0,
+                              keep_result=True):
+        """
+        テキストリクエストを実行して結果を記録（内部メソッド）
+        
+        Args:
+            prompt (str): ユーザーからのプロンプト
+            system_prompt (str, optional): システムプロンプト
+            max_tokens (int, optional): 最大出力トークン数
+            temperature (float, optional): モデルの温度パラメータ
+            keep_result (bool, optional): 結果をself.resultsに保持するかどうか
+            
         Returns:
             dict: レスポンスとコスト情報を含む辞書
         """
@@ -112,13 +182,14 @@ class ClaudeAPI_C:
             
             # システムプロンプトが指定されている場合は追加
             if system_prompt:
-                request_params["system"] = system_prompt
+                request_params["system"] = self._build_system_prompt(system_prompt)
             
             # APIリクエストの送信
-            message = self.client.messages.create(**request_params)
+            message, latency, retries = self._create_message(request_params)
             
             # コストの計算
             cost_info = self._calculate_cost(message)
+            self._report_telemetry(latency, retries, cost_info)
             
             # 結果の整形
             result = {
@@ -127,18 +198,13 @@ class ClaudeAPI_C:
                 "response": message.content[0].text,
                 "timestamp": datetime.now().isoformat(),
                 "tokens": cost_info["tokens"],
-                "cost": cost_info["cost"]
+                "cost": cost_info["cost"],
+                "latency": latency,
+                "retries": retries
             }
             
-            # 結果をリストに追加
-            self.results.append(result)
-
-            # ログをファイルに保存（log_to_fileがTrueの場合）
-            if self.log_to_file:
-                self.save_results()
-            
-            # 合計を更新
-            self._update_totals(cost_info)
+            # 結果と合計を更新
+            self._record_result(result, cost_info, keep_result)
             
             return result
         
@@ -149,14 +215,15 @@ class ClaudeAPI_C:
                 "error": str(e),
                 "timestamp": datetime.now().isoformat()
             }
-            self.results.append(error_result)
+            self._record_result(error_result, keep_result=keep_result)
             logger.error(f"APIリクエスト中にエラーが発生しました: {e}")
             return error_result
     
-    def send_multimodal_request(self, text_content, image_data=None, image_path=None, 
-                               system_prompt=None, max_tokens=2000, temperature=0):
+    def _execute_multimodal_request(self, text_content, image_data=None, image_path=None,
+                                    system_prompt=None, max_tokens=2000, temperature=0,
+                                    keep_result=True):
         """
-        マルチモーダルリクエスト（テキスト＋画像）を送信してコストを計算
+        マルチモーダルリクエストを実行して結果を記録（内部メソッド）
         
         Args:
             text_content (str): テキストコンテンツ
@@ -165,6 +232,7 @@ class ClaudeAPI_C:
             system_prompt (str, optional): システムプロンプト
             max_tokens (int, optional): 最大出力トークン数
             temperature (float, optional): モデルの温度パラメータ
+            keep_result (bool, optional): 結果をself.resultsに保持するかどうか
             
         Returns:
             dict: レスポンスとコスト情報を含む辞書
@@ -192,20 +260,25 @@ class ClaudeAPI_C:
                     img_extension = ext
             
             # メッセージの作成
-            content = [
-                {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": f"image/{img_extension}",
-                        "data": base64_image
-                    }
-                },
-                {
-                    "type": "text",
-                    "text": text_content
+            image_block = {
+                "type": "image",
+                "source": {
+                    "type": "base64",
+                    "media_type": f"image/{img_extension}",
+                    "data": base64_image
                 }
-            ]
+            }
+            text_block = {
+                "type": "text",
+                "text": text_content
+            }
+            
+            if self.prompt_cache:
+                # 固定の指示文を画像より前に置き、そこまでをキャッシュ対象にする
+                text_block["cache_control"] = {"type": "ephemeral"}
+                content = [text_block, image_block]
+            else:
+                content = [image_block, text_block]
             
             # リクエストパラメータの準備
             request_params = {
@@ -222,13 +295,14 @@ class ClaudeAPI_C:
             
             # システムプロンプトが指定されている場合は追加
             if system_prompt:
-                request_params["system"] = system_prompt
+                request_params["system"] = self._build_system_prompt(system_prompt)
             
             # APIリクエストの送信
-            message = self.client.messages.create(**request_params)
+            message, latency, retries = self._create_message(request_params, image_path)
             
             # コストの計算
             cost_info = self._calculate_cost(message)
+            self._report_telemetry(latency, retries, cost_info, image_path)
             
             # 結果の整形
             result = {
@@ -238,14 +312,13 @@ class ClaudeAPI_C:
                 "response": message.content[0].text,
                 "timestamp": datetime.now().isoformat(),
                 "tokens": cost_info["tokens"],
-                "cost": cost_info["cost"]
+                "cost": cost_info["cost"],
+                "latency": latency,
+                "retries": retries
             }
             
-            # 結果をリストに追加
-            self.results.append(result)
-            
-            # 合計を更新
-            self._update_totals(cost_info)
+            # 結果と合計を更新
+            self._record_result(result, cost_info, keep_result)
             
             return result
         
@@ -257,10 +330,193 @@ class ClaudeAPI_C:
                 "error": str(e),
                 "timestamp": datetime.now().isoformat()
             }
-            self.results.append(error_result)
+            self._record_result(error_result, keep_result=keep_result)
             logger.error(f"マルチモーダルリクエスト中にエラーが発生しました: {e}")
             return error_result
     
+    def submit_batch(self, items, sink_path=None, max_workers=4, system_prompt=None,
+                     max_tokens=2000, temperature=0):
+        """
+        複数のリクエストをワーカープールで並列送信し、完了した順にJSONLへ書き出す
+        
+        結果はself.resultsに保持せずシンクへストリーミングするため、大量の
+        プロンプトや画像を投げてもメモリ使用量は増えない。トークン数とコストの
+        合計はロック下で更新されるので、get_summary()の値は逐次実行時と一致する。
+        
+        Args:
+            items (list): リクエストのリスト。各要素は辞書で、
+                テキストの場合は {"prompt": ...}、
+                画像の場合は {"text_content": ..., "image_path": ...} または "image_data" を指定。
+                任意で "id"（結果に custom_id として付与）、"system_prompt"、
+                "max_tokens"、"temperature" を個別に指定できる
+            sink_path (str, optional): 出力するJSONLファイルのパス。指定がなければlog_dirに作成
+            max_workers (int, optional): 同時に送信するリクエスト数
+            system_prompt (str, optional): 全リクエスト共通のシステムプロンプト
+            max_tokens (int, optional): 最大出力トークン数
+            temperature (float, optional): モデルの温度パラメータ
+            
+        Returns:
+            dict: シンクのパス、成功数、失敗数、使用状況の要約を含む辞書
+        """
+        if not sink_path:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            os.makedirs(self.log_dir, exist_ok=True)
+            sink_path = os.path.join(self.log_dir, f"claude_api_batch_{timestamp}.jsonl")
+        
+        succeeded = 0
+        failed = 0
+        
+        logger.info(f"{len(items)}件のリクエストを{max_workers}並列で送信します")
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                open(sink_path, "a", encoding="utf-8") as sink:
+            futures = {
+                executor.submit(self._execute_batch_item, item, system_prompt,
+                                max_tokens, temperature): index
+                for index, item in enumerate(items)
+            }
+            
+            # 完了した順にシンクへ書き出す（書き込みはこのスレッドのみ）
+            for future in as_completed(futures):
+                result = future.result()
+                result.setdefault("custom_id", futures[future])
+                sink.write(json.dumps(result, ensure_ascii=False) + "\n")
+                sink.flush()
+                
+                if "error" in result:
+                    failed += 1
+                else:
+                    succeeded += 1
+        
+        logger.info(f"バッチ処理が完了しました（成功: {succeeded}件, 失敗: {failed}件）: {sink_path}")
+        
+        return {
+            "sink_path": sink_path,
+            "succeeded": succeeded,
+            "failed": failed,
+            "summary": self.get_summary()
+        }
+    
+    def _execute_batch_item(self, item, system_prompt, max_tokens, temperature):
+        """
+        バッチの1件分を実行（内部メソッド）
+        
+        Args:
+            item (dict): submit_batchに渡されたリクエスト1件
+            system_prompt (str): 共通のシステムプロンプト
+            max_tokens (int): 最大出力トークン数
+            temperature (float): モデルの温度パラメータ
+            
+        Returns:
+            dict: レスポンスとコスト情報を含む辞書
+        """
+        item_system_prompt = item.get("system_prompt", system_prompt)
+        item_max_tokens = item.get("max_tokens", max_tokens)
+        item_temperature = item.get("temperature", temperature)
+        
+        if "image_path" in item or "image_data" in item:
+            result = self._execute_multimodal_request(
+                item.get("text_content", item.get("prompt", "")),
+                image_data=item.get("image_data"),
+                image_path=item.get("image_path"),
+                system_prompt=item_system_prompt,
+                max_tokens=item_max_tokens,
+                temperature=item_temperature,
+                keep_result=False
+            )
+        else:
+            result = self._execute_text_request(
+                item.get("prompt", ""),
+                system_prompt=item_system_prompt,
+                max_tokens=item_max_tokens,
+                temperature=item_temperature,
+                keep_result=False
+            )
+        
+        if "id" in item:
+            result["custom_id"] = item["id"]
+        return result
+    
+    def _create_message(self, request_params, image_path=None):
+        """
+        一時的なエラー時は指数バックオフでリトライしながらAPIリクエストを送信（内部メソッド）
+        
+        Args:
+            request_params (dict): リクエストパラメータ
+            image_path (str, optional): テレメトリに記録する画像のパス
+            
+        Returns:
+            tuple: (レスポンス, リトライを含む壁時計時間（秒）, リトライ回数)
+        """
+        import anthropic
+
+        start_time = time.perf_counter()
+        retries = 0
+        while True:
+            try:
+                message = self.client.messages.create(**request_params)
+                return message, time.perf_counter() - start_time, retries
+            except (anthropic.APIConnectionError, anthropic.RateLimitError, anthropic.InternalServerError):
+                if retries < self.max_retries:
+                    retries += 1
+                    time.sleep(min(2 ** (retries - 1), 8))
+                    continue
+                self._report_telemetry(time.perf_counter() - start_time, retries, image_path=image_path, success=False)
+                raise
+            except Exception:
+                self._report_telemetry(time.perf_counter() - start_time, retries, image_path=image_path, success=False)
+                raise
+    
+    def _report_telemetry(self, latency, retries, cost_info=None, image_path=None, success=True):
+        """
+        API呼び出し1回分をテレメトリに記録（内部メソッド）
+        
+        Args:
+            latency (float): リトライを含む壁時計時間（秒）
+            retries (int): リトライ回数
+            cost_info (dict, optional): 計算されたコスト情報
+            image_path (str, optional): 分析した画像のパス
+            success (bool, optional): 呼び出しが成功したかどうか
+        """
+        if self.telemetry is None:
+            return
+        
+        tokens = cost_info["tokens"] if cost_info else {}
+        self.telemetry.record(
+            provider="claude",
+            model=self.model,
+            latency=latency,
+            input_tokens=tokens.get("input", 0) + tokens.get("cache_creation", 0) + tokens.get("cache_read", 0),
+            output_tokens=tokens.get("output", 0),
+            cached_tokens=tokens.get("cache_read", 0),
+            retries=retries,
+            cost=cost_info["cost"]["total"] if cost_info else 0.0,
+            success=success,
+            camera=self.camera,
+            image_path=image_path
+        )
+    
+    def _build_system_prompt(self, system_prompt):
+        """
+        システムプロンプトをリクエスト用の形式に変換（内部メソッド）
+        
+        Args:
+            system_prompt (str): システムプロンプト
+            
+        Returns:
+            str or list: prompt_cacheが有効な場合はキャッシュ指定付きのテキストブロック
+        """
+        if not self.prompt_cache:
+            return system_prompt
+        
+        return [
+            {
+                "type": "text",
+                "text": system_prompt,
+                "cache_control": {"type": "ephemeral"}
+            }
+        ]
+    
     def _calculate_cost(self, message):
         """
         APIレスポンスからトークン使用量とコストを計算
@@ -275,6 +531,10 @@ class ClaudeAPI_C:
         input_tokens = message.usage.input_tokens
         output_tokens = message.usage.output_tokens
         
+        # キャッシュの書き込み・読み込みトークン（キャッシュ未使用時はNoneまたは属性なし）
+        cache_creation_tokens = getattr(message.usage, "cache_creation_input_tokens", None) or 0
+        cache_read_tokens = getattr(message.usage, "cache_read_input_tokens", None) or 0
+        
         # モデルの料金設定を取得
         pricing = CLAUDE_PRICING.get(self.model, {
             "input": 1.0,  # デフォルト値
@@ -284,22 +544,44 @@ class ClaudeAPI_C:
         # コスト計算（ドル単位）
         input_cost = (input_tokens / 1000000) * pricing["input"]
         output_cost = (output_tokens / 1000000) * pricing["output"]
-        total_cost = input_cost + output_cost
+        cache_creation_cost = (cache_creation_tokens / 1000000) * pricing["input"] * CACHE_WRITE_PRICE_MULTIPLIER
+        cache_read_cost = (cache_read_tokens / 1000000) * pricing["input"] * CACHE_READ_PRICE_MULTIPLIER
+        total_cost = input_cost + output_cost + cache_creation_cost + cache_read_cost
         
         return {
             "tokens": {
                 "input": input_tokens,
                 "output": output_tokens,
-                "total": input_tokens + output_tokens
+                "cache_creation": cache_creation_tokens,
+                "cache_read": cache_read_tokens,
+                "total": input_tokens + output_tokens + cache_creation_tokens + cache_read_tokens
             },
             "cost": {
                 "input": input_cost,
                 "output": output_cost,
+                "cache_creation": cache_creation_cost,
+                "cache_read": cache_read_cost,
                 "total": total_cost,
                 "currency": "USD"
             }
         }
     
+    def _record_result(self, result, cost_info=None, keep_result=True):
+        """
+        結果を記録し合計を更新（内部メソッド、スレッドセーフ）
+        
+        Args:
+            result (dict): 整形済みの結果
+            cost_info (dict, optional): 計算されたコスト情報（エラー時はNone）
+            keep_result (bool, optional): 結果をself.resultsに保持するかどうか
+        """
+        with self._lock:
+            self.request_count += 1
+            if keep_result:
+                self.results.append(result)
+            if cost_info:
+                self._update_totals(cost_info)
+    
     def _update_totals(self, cost_info):
         """
         合計トークン数とコストを更新
@@ -307,13 +589,11 @@ class ClaudeAPI_C:
         Args:
             cost_info (dict): 計算されたコスト情報
         """
-        self.total_tokens["input"] += cost_info["tokens"]["input"]
-        self.total_tokens["output"] += cost_info["tokens"]["output"]
-        self.total_tokens["total"] += cost_info["tokens"]["total"]
+        for key in self.total_tokens:
+            self.total_tokens[key] += cost_info["tokens"].get(key, 0)
         
-        self.total_cost["input"] += cost_info["cost"]["input"]
-        self.total_cost["output"] += cost_info["cost"]["output"]
-        self.total_cost["total"] += cost_info["cost"]["total"]
+        for key in self.total_cost:
+            self.total_cost[key] += cost_info["cost"].get(key, 0.0)
     
     def get_summary(self):
         """
@@ -322,11 +602,21 @@ class ClaudeAPI_C:
         Returns:
             dict: 要約情報
         """
+        with self._lock:
+            total_tokens = dict(self.total_tokens)
+            total_cost = dict(self.total_cost)
+            total_requests = self.request_count
+        
+        # 入力側（通常入力＋キャッシュ書き込み＋キャッシュ読み込み）に占めるキャッシュヒットの割合
+        prompt_tokens = total_tokens["input"] + total_tokens["cache_creation"] + total_tokens["cache_read"]
+        cache_hit_rate = total_tokens["cache_read"] / prompt_tokens if prompt_tokens else 0.0
+        
         return {
-            "total_requests": len(self.results),
-            "total_tokens": self.total_tokens,
-            "total_cost": self.total_cost,
-            "total_cost_jpy": self.total_cost["total"] * self.yen_rate,
+            "total_requests": total_requests,
+            "total_tokens": total_tokens,
+            "total_cost": total_cost,
+            "total_cost_jpy": total_cost["total"] * self.yen_rate,
+            "cache_hit_rate": cache_hit_rate,
             "currency": {
                 "usd": "USD",
                 "jpy": "JPY"
@@ -353,10 +643,13 @@ class ClaudeAPI_C:
         # 要約の作成
         summary = self.get_summary()
         
+        with self._lock:
+            results = list(self.results)
+        
         # 結果の保存
         with open(file_path, "w", encoding="utf-8") as f:
             json.dump({
-                "results": self.results,
+                "results": results,
                 "summary": summary
             }, f, ensure_ascii=False, indent=2)
         
@@ -374,6 +667,9 @@ class ClaudeAPI_C:
         print(f"API使用トークン合計: {summary['total_tokens']['total']:,} トークン")
         print(f"入力トークン: {summary['total_tokens']['input']:,} トークン (${summary['total_cost']['input']:.6f} USD)")
         print(f"出力トークン: {summary['total_tokens']['output']:,} トークン (${summary['total_cost']['output']:.6f} USD)")
+        print(f"キャッシュ書き込み: {summary['total_tokens']['cache_creation']:,} トークン (${summary['total_cost']['cache_creation']:.6f} USD)")
+        print(f"キャッシュ読み込み: {summary['total_tokens']['cache_read']:,} トークン (${summary['total_cost']['cache_read']:.6f} USD)")
+        print(f"キャッシュヒット率: {summary['cache_hit_rate'] * 100:.1f}%")
         print(f"合計コスト: ${summary['total_cost']['total']:.6f} USD")
         print(f"合計コスト: ¥{summary['total_cost_jpy']:.2f} JPY")
         print("=" * 50)
@@ -382,9 +678,11 @@ class ClaudeAPI_C:
         """
         カウンターをリセット
         """
-        self.results = []
-        self.total_tokens = {"input": 0, "output": 0, "total": 0}
-        self.total_cost = {"input": 0.0, "output": 0.0, "total": 0.0}
+        with self._lock:
+            self.results = []
+            self.request_count = 0
+            self.total_tokens = {"input": 0, "output": 0, "cache_creation": 0, "cache_read": 0, "total": 0}
+            self.total_cost = {"input": 0.0, "output": 0.0, "cache_creation": 0.0, "cache_read": 0.0, "total": 0.0}
         logger.info("カウンターをリセットしました。")
 
 # 使用例
@@ -414,8 +712,8 @@ if __name__ == "__main__":
 '''
 ClaudeAPI_Cクラスのメソッド一覧
 
-__init__(self, api_key=None, model="claude-3-haiku-20240307", log_to_file=True, log_dir="logs", yen_rate=142.0)
-クラスの初期化メソッド。
+__init__(self, api_key=None, model="claude-3-haiku-20240307", log_to_file=True, log_dir="logs", yen_rate=142.0, base_url=None, prompt_cache=False)
+クラスの初期化メソッド。prompt_cache=Trueでシステムプロンプトと固定の指示文をキャッシュ対象として送信する。
 
 send_request(self, prompt, system_prompt=None, max_tokens=2000, temperature=0)
 テキストリクエストを送信し、コストを計算する。
@@ -428,6 +726,9 @@ send_request(self, prompt, system_prompt=None, max_tokens=2000, temperature=0)
 send_multimodal_request(self, text_content, image_data=None, image_path=None, system_prompt=None, max_tokens=2000, temperature=0)
 合計トークン数とコストを更新する（内部メソッド）。
 
+submit_batch(self, items, sink_path=None, max_workers=4, system_prompt=None, max_tokens=2000, temperature=0)
+複数のリクエストを並列送信し、完了順にJSONLへ書き出す。結果はメモリに保持しない。
+
 get_summary(self)
 使用状況の要約を取得する。
 
@@ -1,25 +1,65 @@
 import os
+import time
 import base64
 from PIL import Image
 from io import BytesIO
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Tuple, Optional, BinaryIO
-from openai import OpenAI
 from datetime import datetime
+from _stage_metrics import stage
 
 # Qwen APIを使って、画像中の飛行機雲を探すクラス
 
 class ImageAnalyzer(ABC):
     """画像分析の基底クラス"""
     
-    def __init__(self, resize_dimensions: Tuple[int, int] = (320, 180)):
+    def __init__(self, resize_dimensions: Tuple[int, int] = (320, 180),
+                 telemetry=None, camera: Optional[str] = None, sky_mask=None):
         """
         初期化
         
         Args:
             resize_dimensions: リサイズする画像のサイズ（幅, 高さ）
+            telemetry: API呼び出しを記録するAPITelemetry（Noneの場合は記録しない）
+            camera: テレメトリに記録するカメラ名
+            sky_mask: リサイズの前に空の範囲で切り抜くSkyMask（Noneの場合は画像全体を使う）
         """
         self.resize_dimensions = resize_dimensions
+        self.telemetry = telemetry
+        self.camera = camera
+        self.sky_mask = sky_mask
+    
+    def report_telemetry(self, provider: str, model: str, latency: float,
+                         usage: Optional[Dict[str, int]] = None, retries: int = 0,
+                         success: bool = True, image_path: Optional[str] = None) -> None:
+        """
+        分析1回分のレイテンシ・トークン数・リトライ回数をテレメトリに記録
+        
+        Args:
+            provider: プロバイダ名
+            model: モデル名
+            latency: 分析にかかった壁時計時間（秒）
+            usage: input_tokens, output_tokens, cached_tokens を含む辞書
+            retries: リトライ回数
+            success: 分析が成功したかどうか
+            image_path: 分析した画像のパス
+        """
+        if self.telemetry is None:
+            return
+        
+        usage = usage or {}
+        self.telemetry.record(
+            provider=provider,
+            model=model,
+            latency=latency,
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+            cached_tokens=usage.get("cached_tokens", 0),
+            retries=retries,
+            success=success,
+            camera=self.camera,
+            image_path=image_path
+        )
     
     def resize_image(self, image_path: str) -> bytes:
         """
@@ -38,21 +78,31 @@ class ImageAnalyzer(ABC):
         try:
             # 画像を開く
             img = Image.open(image_path)
+            image_format = img.format
+            canvas_size = self.resize_dimensions
+            
+            # 空以外（地面・建物・海）を送らないよう、空の範囲で切り抜く
+            if self.sky_mask is not None:
+                img = self.sky_mask.crop(img)
             
             # 画像をリサイズ（アスペクト比を維持しつつ、指定サイズに収まるようにする）
             img.thumbnail(self.resize_dimensions, Image.LANCZOS)
             
+            # 切り抜いた場合は余白を付けず、縮小した大きさのまま送る（トークン数を減らすため）
+            if self.sky_mask is not None and self.sky_mask.box:
+                canvas_size = img.size
+            
             # 新しい白い背景画像を作成
-            new_img = Image.new("RGB", self.resize_dimensions, (255, 255, 255))
+            new_img = Image.new("RGB", canvas_size, (255, 255, 255))
             
             # リサイズした画像を中央に配置
-            position = ((self.resize_dimensions[0] - img.width) // 2, 
-                        (self.resize_dimensions[1] - img.height) // 2)
+            position = ((canvas_size[0] - img.width) // 2, 
+                        (canvas_size[1] - img.height) // 2)
             new_img.paste(img, position)
             
             # リサイズした画像をバイトストリームに保存
             buffered = BytesIO()
-            new_img.save(buffered, format=img.format if img.format else "JPEG")
+            new_img.save(buffered, format=image_format if image_format else "JPEG")
             return buffered.getvalue()
         
         except FileNotFoundError as e:
@@ -92,10 +142,17 @@ class ImageAnalyzer(ABC):
 class QwenCloudAnalyzer(ImageAnalyzer):
     """Qwen APIを使用した雲分析クラス"""
     
+    SYSTEM_PROMPT = "You are an expert in accurately analyzing sky photographs, specifically distinguishing between natural clouds and airplane contrails."
+    
     def __init__(self, api_key: str, 
                  model: str = "qwen2.5-vl-7b-instruct", 
                  resize_dimensions: Tuple[int, int] = (640, 360),
-                 base_url: str = "https://dashscope-intl.aliyuncs.com/compatible-mode/v1"):
+                 base_url: str = "https://dashscope-intl.aliyuncs.com/compatible-mode/v1",
+                 prompt_cache: bool = False,
+                 max_retries: int = 2,
+                 telemetry=None,
+                 camera: Optional[str] = None,
+                 sky_mask=None):
         """
         初期化
         
@@ -104,23 +161,34 @@ class QwenCloudAnalyzer(ImageAnalyzer):
             model: 使用するモデル名
             resize_dimensions: リサイズする画像のサイズ
             base_url: API のベースURL
+            prompt_cache: システムプロンプトと固定の指示文を画像より前に置き、キャッシュ対象として送信するかどうか
+            max_retries: 一時的なエラー（接続・タイムアウト・レート制限・サーバーエラー）時のリトライ回数
+            telemetry: API呼び出しを記録するAPITelemetry（Noneの場合は記録しない）
+            camera: テレメトリに記録するカメラ名
+            sky_mask: リサイズの前に空の範囲で切り抜くSkyMask（Noneの場合は画像全体を使う）
         """
-        super().__init__(resize_dimensions)
+        super().__init__(resize_dimensions, telemetry=telemetry, camera=camera, sky_mask=sky_mask)
         self.api_key = api_key
         self.model = model
         self.base_url = base_url
+        self.prompt_cache = prompt_cache
+        self.max_retries = max_retries
         self.client = self._initialize_client()
     
-    def _initialize_client(self) -> OpenAI:
+    def _initialize_client(self) -> "OpenAI":
         """
-        APIクライアントを初期化
+        APIクライアントを初期化（openaiはQwenを使う場合のみ必要なため、ここでインポートする）
         
         Returns:
             OpenAI: 初期化されたクライアント
         """
+        from openai import OpenAI
+
+        # リトライ回数をテレメトリに記録するため、クライアント側の自動リトライは無効にする
         return OpenAI(
             api_key=self.api_key,
-            base_url=self.base_url
+            base_url=self.base_url,
+            max_retries=0
         )
     
     def _create_prompt(self, additional_instructions: str = "") -> str:
@@ -163,6 +231,84 @@ No text, no JSON, just the number.
             
         return prompt
     
+    def _create_messages(self, base64_image: str, additional_instructions: str = "") -> list:
+        """
+        APIに送信するメッセージを作成
+        
+        prompt_cacheが有効な場合は、全フレームで共通のシステムプロンプトと指示文を
+        先頭に置いてキャッシュ対象とし、フレームごとに変わる画像と追加指示を後ろに置く。
+        
+        Args:
+            base64_image: base64エンコードされた画像データ
+            additional_instructions: プロンプトに追加する指示
+            
+        Returns:
+            list: メッセージのリスト
+        """
+        image_content = {
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{base64_image}"
+            },
+        }
+        
+        if not self.prompt_cache:
+            return [
+                {
+                    "role": "system",
+                    "content": [{"type": "text", "text": self.SYSTEM_PROMPT}],
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        image_content,
+                        {"type": "text", "text": self._create_prompt(additional_instructions)},
+                    ],
+                },
+            ]
+        
+        cache_control = {"type": "ephemeral"}
+        user_content = [
+            {"type": "text", "text": self._create_prompt(), "cache_control": cache_control},
+            image_content,
+        ]
+        if additional_instructions:
+            user_content.append({"type": "text", "text": additional_instructions})
+        
+        return [
+            {
+                "role": "system",
+                "content": [{"type": "text", "text": self.SYSTEM_PROMPT, "cache_control": cache_control}],
+            },
+            {
+                "role": "user",
+                "content": user_content,
+            },
+        ]
+    
+    def _extract_usage(self, completion) -> Dict[str, int]:
+        """
+        レスポンスからトークン使用量を取得
+        
+        Args:
+            completion: APIからのレスポンス
+            
+        Returns:
+            Dict[str, int]: 入力・出力・キャッシュヒットのトークン数
+        """
+        usage = getattr(completion, "usage", None)
+        if usage is None:
+            return {"input_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+        
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        
+        return {
+            "input_tokens": usage.prompt_tokens or 0,
+            "output_tokens": usage.completion_tokens or 0,
+            "cached_tokens": cached_tokens,
+        }
+    
     def analyze(self, image_path: str, additional_instructions: str = "") -> Dict[str, Any]:
         """
         Qwen APIを使用して画像を分析
@@ -179,49 +325,76 @@ No text, no JSON, just the number.
             resized_image_data = self.resize_image(image_path)
             base64_image = self.encode_image(resized_image_data)
             
-            # プロンプトを作成
-            prompt = self._create_prompt(additional_instructions)
-            
-            # APIリクエストを送信
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": [{"type": "text", "text": "You are an expert in accurately analyzing sky photographs, specifically distinguishing between natural clouds and airplane contrails."}],
-                    },
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}"
-                                },
-                            },
-                            {"type": "text", "text": prompt},
-                        ],
-                    },
-                ],
-                temperature=0  # 決定論的な応答を得るために0に設定
-            )
-            
+            messages = self._create_messages(base64_image, additional_instructions)
+        except Exception as e:
+            return {
+                "image_path": image_path,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        from openai import APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+
+        start_time = time.perf_counter()
+        retries = 0
+        while True:
+            try:
+                # APIリクエストを送信
+                completion = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0  # 決定論的な応答を得るために0に設定
+                )
+                break
+            except (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError) as e:
+                if retries >= self.max_retries:
+                    return self._error_result(image_path, e, start_time, retries)
+                retries += 1
+                time.sleep(min(2 ** (retries - 1), 8))  # 指数バックオフ
+            except Exception as e:
+                return self._error_result(image_path, e, start_time, retries)
+        
+        latency = time.perf_counter() - start_time
+        
+        try:
             # レスポンスを取得
             response_text = completion.choices[0].message.content
+            usage = self._extract_usage(completion)
+            self.report_telemetry("qwen", self.model, latency, usage, retries, image_path=image_path)
             
             # 結果を返す
             return {
                 "image_path": image_path,
                 "analysis": response_text,
+                "usage": usage,
+                "latency": latency,
+                "retries": retries,
                 # "timestamp": datetime.now().isoformat()
             }
         
         except Exception as e:
-            return {
-                "image_path": image_path,
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
+            return self._error_result(image_path, e, start_time, retries)
+    
+    def _error_result(self, image_path: str, error: Exception, start_time: float, retries: int) -> Dict[str, Any]:
+        """
+        エラー時の結果を作成し、失敗としてテレメトリに記録
+        
+        Args:
+            image_path: 分析した画像のパス
+            error: 発生した例外
+            start_time: 分析開始時刻（time.perf_counter）
+            retries: リトライ回数
+            
+        Returns:
+            Dict[str, Any]: エラー情報を含む結果
+        """
+        latency = time.perf_counter() - start_time
+        self.report_telemetry("qwen", self.model, latency, retries=retries, success=False, image_path=image_path)
+        return {
+            "image_path": image_path,
+            "error": str(error),
+            "timestamp": datetime.now().isoformat()
+        }
           
 import glob
 import json
@@ -292,9 +465,25 @@ class AnalysisManager:
         # 各画像を解析
         for i, image_path in enumerate(image_paths, 1):
             print(f"{i}/{len(image_paths)} を処理中... {image_path}")
-            result = self.analyzer.analyze(image_path, additional_instructions=additional_instructions)
+            result = self.analyze_image(image_path, additional_instructions)
             self.results.append(result)
     
+    def analyze_image(self, image_path: str, additional_instructions: str = "") -> Dict[str, Any]:
+        """
+        1枚の画像を分析し、analyze段階のメトリクスを記録
+        
+        Args:
+            image_path: 分析する画像のパス
+            additional_instructions: 分析に追加する指示
+            
+        Returns:
+            Dict[str, Any]: 分析結果
+        """
+        with stage("analyze", analyzer=type(self.analyzer).__name__) as s:
+            result = self.analyzer.analyze(image_path, additional_instructions=additional_instructions)
+            s.add(items=1, bytes=os.path.getsize(image_path) if os.path.exists(image_path) else 0)
+        return result
+    
     def save_results(self) -> str:
         """
         分析結果をJSONファイルに保存
@@ -0,0 +1,347 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, NamedTuple, Optional
+from config import LOG_DIR, logger
+from _contrail_analyzer_qwen import ImageAnalyzer
+from _contrail_local_classifier import log_prediction, PREDICTION_LOG_PATH
+from _api_telemetry import calculate_qwen_cost, percentile
+
+# 飛行機雲の判定を安いモデルから順に行い、判断に迷うフレームだけを上位のモデルに回す（モデルのカスケード）
+# - 各段の判定は次の場合に上位へ回す: エラー・本数として読めない応答、本数が範囲外、確信度が低い
+#   （確信度を尋ねた段が確信度を返さない場合を含む）、前の段と本数が異なる
+#   （前の段の判定で迷い、次の段が同じ本数を返した場合はその本数を採用する）
+# - 最後の段の判定はそのまま採用する
+# - フレームごとに各段の判定・理由・レイテンシ・コストをJSONLに記録し、report() で単一モデル（最後の段）で
+#   全フレームを判定した場合との比較を集計する
+# - audit_rate の割合のフレームは、途中の段で採用した場合も最後の段で判定し、一致率を記録する（結果は変えない）
+
+CASCADE_LOG_DIR = os.path.join(LOG_DIR, "contrail_cascade")
+
+# これより多い本数は誤判定として上位へ回す
+MAX_PLAUSIBLE_COUNT = 10
+# 確信度を返す段で、これ未満の場合は上位へ回す
+MIN_CONFIDENCE = 0.8
+
+# 確信度を尋ねる段に追加する指示（応答は「本数 確信度」、例: 2 0.85）
+CONFIDENCE_INSTRUCTIONS = (
+    "After the number, add a single space and your confidence in that number as a value between 0 and 1 "
+    "(for example: 2 0.85). Output nothing else."
+)
+
+RESPONSE_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+class CascadeTier(NamedTuple):
+    """
+    カスケードの1段
+
+    name: 段の名前（ログ・レポートに使う）
+    analyzer: 分析器
+    ask_confidence: 応答に確信度を含めるよう指示するかどうか（Qwenなど、確信度を返さない分析器の場合）
+    """
+    name: str
+    analyzer: ImageAnalyzer
+    ask_confidence: bool = False
+
+
+def parse_response(result: Dict[str, Any]):
+    """
+    分析結果から本数と確信度を読む
+
+    Args:
+        result: 分析器の analyze() の戻り値
+
+    Returns:
+        Tuple[Optional[int], Optional[float]]: (本数, 確信度)。読めない場合は本数がNone、確信度がない場合はNone
+    """
+    if "error" in result or result.get("analysis") is None:
+        return None, None
+    numbers = RESPONSE_PATTERN.findall(str(result["analysis"]))
+    if not numbers or "." in numbers[0]:
+        return None, None
+    confidence = result.get("confidence")
+    if confidence is None and len(numbers) > 1:
+        confidence = float(numbers[1])
+        if 1 < confidence <= 100:  # パーセントで答えた場合
+            confidence /= 100
+    return int(numbers[0]), (min(max(float(confidence), 0.0), 1.0) if confidence is not None else None)
+
+
+class CascadeAnalyzer(ImageAnalyzer):
+    """安い段から順に判定し、迷うフレームだけを上位の段に回す分析クラス"""
+
+    def __init__(self, tiers: List[CascadeTier], min_confidence: float = MIN_CONFIDENCE,
+                 max_count: int = MAX_PLAUSIBLE_COUNT, audit_rate: float = 0.0,
+                 log_dir: Optional[str] = CASCADE_LOG_DIR, prediction_log: Optional[str] = PREDICTION_LOG_PATH,
+                 camera: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            tiers: 安い順の段（最後の段の判定はそのまま採用する）
+            min_confidence: 確信度がこれ未満の場合は上位へ回す
+            max_count: 本数がこれを超える場合は上位へ回す
+            audit_rate: 途中の段で採用したフレームのうち、最後の段でも判定して一致を確かめる割合
+            log_dir: ルーティングのログ（日ごとのJSONL）の保存先（Noneの場合は記録しない）
+            prediction_log: ローカル分類器の段の判定を記録する予測ログ（_contrail_local_classifier を参照）
+            camera: ログに記録するカメラ名
+        """
+        if not tiers:
+            raise ValueError("カスケードには1つ以上の段が必要です")
+        super().__init__(tiers[0].analyzer.resize_dimensions, camera=camera)
+        self.tiers = list(tiers)
+        self.min_confidence = min_confidence
+        self.max_count = max_count
+        self.audit_rate = audit_rate
+        self.log_dir = log_dir
+        self.prediction_log = prediction_log
+        self._lock = threading.Lock()
+
+    def _run_tier(self, tier: CascadeTier, image_path: str, additional_instructions: str) -> Dict[str, Any]:
+        """1つの段で判定し、本数・確信度・レイテンシ・コストを返す"""
+        instructions = additional_instructions
+        if tier.ask_confidence:
+            instructions = "\n".join(s for s in (additional_instructions, CONFIDENCE_INSTRUCTIONS) if s)
+        start = time.perf_counter()
+        result = tier.analyzer.analyze(image_path, additional_instructions=instructions)
+        latency = time.perf_counter() - start
+        count, confidence = parse_response(result)
+        model = getattr(tier.analyzer, "model", None)
+        usage = result.get("usage") or {}
+        cost = calculate_qwen_cost(model, usage.get("input_tokens", 0), usage.get("output_tokens", 0),
+                                   usage.get("cached_tokens", 0)) if isinstance(model, str) else 0.0
+        return {"tier": tier.name, "model": model if isinstance(model, str) else type(tier.analyzer).__name__,
+                "count": count, "confidence": confidence, "latency": latency, "cost": cost,
+                "error": result.get("error"), "result": result}
+
+    def _escalation_reason(self, tier: CascadeTier, step: Dict[str, Any], previous: Optional[int]) -> Optional[str]:
+        """上位へ回す理由（採用する場合はNone）"""
+        if step["count"] is None:
+            return "error"
+        if not 0 <= step["count"] <= self.max_count:
+            return "out_of_range"
+        if previous is not None:
+            # 前の段で迷ったフレームは、2つの段の本数が一致すれば採用する
+            return None if step["count"] == previous else "disagreement"
+        if step["confidence"] is None:
+            # 確信度を尋ねたのに本数だけを返した場合は、指示に従っていない応答として採用しない
+            return "missing_confidence" if tier.ask_confidence else None
+        if step["confidence"] < self.min_confidence:
+            return "low_confidence"
+        return None
+
+    def analyze(self, image_path: str, additional_instructions: str = "", **kwargs) -> Dict[str, Any]:
+        """
+        画像を分析する
+
+        Args:
+            image_path: 分析する画像のパス
+            additional_instructions: 各段に渡す追加の指示
+
+        Returns:
+            Dict[str, Any]: 分析結果（analysis に本数の文字列、tier に採用した段、cascade に各段の判定）
+        """
+        start = time.perf_counter()
+        steps = []
+        previous = None
+        accepted = None
+        for i, tier in enumerate(self.tiers):
+            step = self._run_tier(tier, image_path, additional_instructions)
+            last = i == len(self.tiers) - 1
+            reason = None if last else self._escalation_reason(tier, step, previous)
+            step["decision"] = "accept" if reason is None else "escalate"
+            step["reason"] = reason
+            steps.append(step)
+            if reason is None:
+                accepted = step
+                break
+            if step["count"] is not None and 0 <= step["count"] <= self.max_count:
+                previous = step["count"]
+
+        latency = time.perf_counter() - start
+
+        audit = None
+        if len(steps) < len(self.tiers) and self.audit_rate > 0 and random.random() < self.audit_rate:
+            audit = self._run_tier(self.tiers[-1], image_path, additional_instructions)
+            audit["agrees"] = audit["count"] == accepted["count"]
+
+        self._record_local_predictions(image_path, steps, accepted)
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "camera": self.camera,
+            "image_path": image_path,
+            "tier": accepted["tier"],
+            "count": accepted["count"],
+            "latency": latency,
+            "cost": sum(s["cost"] for s in steps),
+            "steps": [{k: v for k, v in s.items() if k != "result"} for s in steps],
+            "audit": None if audit is None else {k: v for k, v in audit.items() if k != "result"},
+        }
+        self._log(record)
+
+        if accepted["count"] is None:
+            # 最後の段も失敗した場合は、その段のエラーをそのまま返す
+            return dict(accepted["result"], tier=accepted["tier"], cascade=record["steps"])
+        return {
+            "image_path": image_path,
+            "analysis": str(accepted["count"]),
+            "confidence": accepted["confidence"],
+            "latency": record["latency"],
+            "cost": record["cost"],
+            "tier": accepted["tier"],
+            "cascade": record["steps"],
+        }
+
+    def _record_local_predictions(self, image_path: str, steps: List[Dict[str, Any]], accepted: Dict[str, Any]) -> None:
+        """ローカル分類器の段の判定を予測ログに記録する（採用した場合だけ次の学習から除かれる）"""
+        from _contrail_local_classifier import LocalContrailAnalyzer
+
+        for tier, step in zip(self.tiers, steps):
+            if isinstance(tier.analyzer, LocalContrailAnalyzer):
+                routed = "local" if step is accepted else "fallback"
+                log_prediction(self.prediction_log, image_path,
+                               {"count": step["count"], "confidence": step["confidence"] or 0.0,
+                                "latency": step["latency"]}, routed)
+
+    def _log(self, record: Dict[str, Any]) -> None:
+        """ルーティングの記録を日ごとのJSONLに追記する"""
+        if not self.log_dir:
+            return
+        try:
+            with self._lock:
+                os.makedirs(self.log_dir, exist_ok=True)
+                path = os.path.join(self.log_dir, f"cascade_{datetime.now().strftime('%Y%m%d')}.jsonl")
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.error(f"カスケードのログの書き込み中にエラーが発生しました: {e}")
+
+
+def load_records(start_date: datetime, end_date: Optional[datetime] = None,
+                 log_dir: str = CASCADE_LOG_DIR) -> List[Dict[str, Any]]:
+    """
+    指定期間のルーティングの記録を読み込む
+
+    Args:
+        start_date: 開始日
+        end_date: 終了日（含む）。Noneの場合は開始日のみ
+        log_dir: ログのディレクトリ
+
+    Returns:
+        List[Dict[str, Any]]: フレームごとの記録
+    """
+    end_date = end_date or start_date
+    records = []
+    current = start_date
+    while current.date() <= end_date.date():
+        path = os.path.join(log_dir, f"cascade_{current.strftime('%Y%m%d')}.jsonl")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+        current += timedelta(days=1)
+    return records
+
+
+def report(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    カスケードと、最後の段（単一モデル）で全フレームを判定した場合の比較を集計する
+    単一モデルのコスト・平均レイテンシは層別に見積もる: 最後の段まで回ったフレームはその実測、途中の段で採用した
+    フレームは監査（無作為に選んだフレームを最後の段でも判定したもの）の実測の平均を、そのフレーム数に掛ける
+    監査がない場合は最後の段まで回ったフレームの平均で代用するが、これは判断に迷う（難しい）フレームに偏った値になる
+    （baseline の estimate が "final_only"）。latency_p50 は実測した呼び出し全体の中央値で、同じく難しいフレームに偏る
+
+    Args:
+        records: load_records() の戻り値
+
+    Returns:
+        Dict[str, Any]: frames, tiers（段ごとの採用数・呼び出し数・レイテンシ）, reasons（上位へ回した理由の件数）,
+            cascade / baseline（レイテンシのp50・p90、合計コスト）, audit（監査した件数と一致率）
+    """
+    if not records:
+        return {"frames": 0}
+    tiers = {}
+    reasons = {}
+    for record in records:
+        for step in record["steps"]:
+            entry = tiers.setdefault(step["tier"], {"accepted": 0, "calls": 0, "latencies": []})
+            entry["calls"] += 1
+            entry["latencies"].append(step["latency"])
+            if step["reason"]:
+                reasons[step["reason"]] = reasons.get(step["reason"], 0) + 1
+        tiers[record["tier"]]["accepted"] += 1
+    final_tier = max(records, key=lambda r: len(r["steps"]))["steps"][-1]["tier"]
+    # 最後の段まで回ったフレームの実測と、途中の段で採用したフレームのうち監査したものの実測
+    final_runs = [s for r in records for s in r["steps"] if s["tier"] == final_tier]
+    early = [r for r in records if r["steps"][-1]["tier"] != final_tier]
+    audits = [r["audit"] for r in early if r.get("audit")]
+    latencies = [r["latency"] for r in records]
+    summary = {
+        "frames": len(records),
+        "tiers": {name: {"accepted": t["accepted"], "calls": t["calls"],
+                         "latency_p50": percentile(t["latencies"], 50)} for name, t in tiers.items()},
+        "reasons": reasons,
+        "cascade": {"latency_p50": percentile(latencies, 50), "latency_p90": percentile(latencies, 90),
+                    "total_cost": sum(r["cost"] for r in records)},
+        "baseline": None,
+        "audit": {"frames": len(audits),
+                  "agreement": sum(a["agrees"] for a in audits) / len(audits) if audits else None},
+    }
+    # 途中の段で採用したフレームの見積もりに使う実測（監査がない場合は最後の段まで回ったフレームで代用）
+    early_sample = audits or final_runs
+    if early_sample:
+        def mean(runs, key):
+            return sum(s[key] for s in runs) / len(runs) if runs else 0.0
+
+        measured = final_runs + audits
+        summary["baseline"] = {
+            "tier": final_tier,
+            "estimate": "stratified" if audits or not early else "final_only",
+            "measured_calls": len(measured),
+            "latency_p50": percentile([s["latency"] for s in measured], 50),
+            "latency_mean": (sum(s["latency"] for s in final_runs) + mean(early_sample, "latency") * len(early))
+                            / len(records),
+            "total_cost": sum(s["cost"] for s in final_runs) + mean(early_sample, "cost") * len(early),
+        }
+    return summary
+
+
+def build_default_cascade(api_key: str, telemetry=None, camera: Optional[str] = None,
+                          audit_rate: float = 0.0, sky_mask=None) -> CascadeAnalyzer:
+    """
+    既定のカスケード: ローカル分類器（学習済みの場合）→ qwen2.5-vl-3b（確信度を尋ねる）→ qwen2.5-vl-7b
+
+    Args:
+        api_key: Qwen API キー
+        telemetry: API呼び出しを記録するAPITelemetry
+        camera: カメラ名
+        audit_rate: CascadeAnalyzer の audit_rate
+        sky_mask: Qwenの段で画像を切り抜くSkyMask
+
+    Returns:
+        CascadeAnalyzer: カスケード
+    """
+    from _contrail_analyzer_qwen import QwenCloudAnalyzer
+    from _contrail_local_classifier import LocalContrailAnalyzer, MODEL_PATH
+
+    tiers = []
+    if os.path.exists(MODEL_PATH):
+        tiers.append(CascadeTier("local", LocalContrailAnalyzer(MODEL_PATH, prediction_log=None,
+                                                                telemetry=telemetry, camera=camera)))
+    for model, ask_confidence in (("qwen2.5-vl-3b-instruct", True), ("qwen2.5-vl-7b-instruct", False)):
+        tiers.append(CascadeTier(model, QwenCloudAnalyzer(api_key=api_key, model=model, resize_dimensions=(640, 360),
+                                                          telemetry=telemetry, camera=camera, sky_mask=sky_mask),
+                                 ask_confidence))
+    return CascadeAnalyzer(tiers, audit_rate=audit_rate, camera=camera)
+
+
+if __name__ == "__main__":
+    # python _contrail_cascade.py [開始日 YYYYMMDD] [終了日 YYYYMMDD]   カスケードと単一モデルの比較を表示（既定は直近7日）
+    end = datetime.strptime(sys.argv[2], "%Y%m%d") if len(sys.argv) > 2 else datetime.now()
+    start = datetime.strptime(sys.argv[1], "%Y%m%d") if len(sys.argv) > 1 else end - timedelta(days=6)
+    print(json.dumps(report(load_records(start, end)), ensure_ascii=False, indent=2))
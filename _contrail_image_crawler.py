@@ -1,12 +1,16 @@
 import requests
-from PIL import Image
 from io import BytesIO
 import datetime
 import os, time, random
 from config import *
+from _stage_metrics import stage
 import re
 from datetime import datetime, timedelta
 
+# 常駐スケジューラから繰り返し呼ばれる場合に接続を再利用するためのセッション
+session = requests.Session()
+session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"})
+REQUEST_TIMEOUT = 30  # 秒
 
 
 def convert_to_base_url(page_url, size="640"):
@@ -47,10 +51,13 @@ def generate_url(url, _time_stamp):
     return full_url, timestamp
 
 def download_crawl_image(url,save_dir, timestamp):
+    from PIL import Image  # 画像を保存する場合のみ必要なため遅延インポート
+
     full_url, timestamp = generate_url(url, timestamp)
     try:
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"}
-        response = requests.get(full_url, headers=headers)
+        with stage("crawl") as s:
+            response = session.get(full_url, timeout=REQUEST_TIMEOUT)
+            s.add(items=1, bytes=len(response.content))
         if response.status_code == 200:
             image = Image.open(BytesIO(response.content))
             rgb_image = image.convert("RGB")
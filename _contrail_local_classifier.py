@@ -0,0 +1,345 @@
+import os
+import sys
+import csv
+import json
+import time
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from PIL import Image, ImageFilter
+from config import DATA_DIR, IMAGE_ANALYSIS_DIR, logger
+from _contrail_analyzer_qwen import ImageAnalyzer
+
+# Qwenが判定した飛行機雲の本数（contrail_timeline_by_qwen.csv）を教師データとして、CPUだけで動く小さな分類器を学習する
+# - 特徴量は縮小したグレースケール画像の勾配方向ヒストグラム（HOG）、エッジ・細い明るい線の割合、色の統計
+# - 分類器は scikit-learn のランダムフォレスト（本数を MAX_COUNT で打ち切ったクラスを予測し、最大の確率を確信度とする）
+# - LocalContrailAnalyzer は確信度が min_confidence 以上のフレームをローカルで判定し、それ以外を fallback（Qwenなど）に回す
+#   ローカルで判定したフレームは予測ログに記録し、次の学習の教師データから除く（自分の予測を学習しないため）
+
+MODEL_DIR = os.path.join(DATA_DIR, "models")
+MODEL_PATH = os.path.join(MODEL_DIR, "contrail_local_classifier.joblib")
+PREDICTION_LOG_PATH = os.path.join(MODEL_DIR, "contrail_local_predictions.csv")
+
+TIMELINE_PATH = os.path.join(IMAGE_ANALYSIS_DIR, "suma", "contrail_timeline_by_qwen.csv")
+IMAGE_DIR = os.path.join(IMAGE_ANALYSIS_DIR, "suma", "input_image")
+
+# 特徴量の版（特徴量の計算を変えた場合は上げる。版の違うモデルは読み込まない）
+FEATURE_VERSION = 1
+# 特徴量を計算する画像サイズ（幅, 高さ）とHOGのセル数（横, 縦）・方向のビン数
+FEATURE_SIZE = (160, 90)
+CELL_GRID = (4, 3)
+ORIENTATION_BINS = 9
+EDGE_THRESHOLDS = (0.02, 0.05, 0.1)
+
+# これより多い本数は同じクラスとして扱う
+MAX_COUNT = 4
+# ローカルの判定を採用する確信度
+MIN_CONFIDENCE = 0.8
+
+
+def extract_features(image) -> "np.ndarray":
+    """
+    画像から特徴量を計算する
+
+    Args:
+        image: 画像のパス、またはPILの画像
+
+    Returns:
+        np.ndarray: 特徴量（float32の1次元配列）
+    """
+    import numpy as np
+
+    img = Image.open(image) if isinstance(image, str) else image
+    # JPEGはデコード時に縮小する（フル解像度で展開しないため速い）
+    img.draft("RGB", (FEATURE_SIZE[0] * 2, FEATURE_SIZE[1] * 2))
+    img = img.convert("RGB").resize(FEATURE_SIZE, Image.BILINEAR)
+    rgb = np.asarray(img, dtype=np.float32) / 255.0
+    gray = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    height, width = gray.shape
+
+    # 勾配（中心差分）の大きさと方向（0〜π）
+    gx = np.zeros_like(gray)
+    gy = np.zeros_like(gray)
+    gx[:, 1:-1] = gray[:, 2:] - gray[:, :-2]
+    gy[1:-1, :] = gray[2:, :] - gray[:-2, :]
+    magnitude = np.hypot(gx, gy)
+    orientation = np.arctan2(gy, gx) % np.pi
+    bins = np.minimum((orientation / np.pi * ORIENTATION_BINS).astype(np.int64), ORIENTATION_BINS - 1)
+
+    # HOG: セルごとの方向ヒストグラム（勾配の大きさで重み付け、セルごとにL2正規化）
+    cols, rows = CELL_GRID
+    cell = (np.arange(height)[:, None] * rows // height) * cols + (np.arange(width)[None, :] * cols // width)
+    hog = np.bincount((cell * ORIENTATION_BINS + bins).ravel(), weights=magnitude.ravel(),
+                      minlength=cols * rows * ORIENTATION_BINS).reshape(cols * rows, ORIENTATION_BINS)
+    hog /= np.sqrt((hog ** 2).sum(axis=1, keepdims=True)) + 1e-6
+
+    # 強いエッジの割合と、強いエッジの方向のそろい方（直線的な構造ほど特定の方向に集中する）
+    edge_fractions = [float((magnitude > t).mean()) for t in EDGE_THRESHOLDS]
+    strong = magnitude > EDGE_THRESHOLDS[1]
+    direction = np.bincount(bins[strong], minlength=ORIENTATION_BINS).astype(np.float64)
+    direction = direction / direction.sum() if direction.sum() else direction
+    nonzero = direction[direction > 0]
+    direction_stats = [float(direction.max()), float(-(nonzero * np.log(nonzero)).sum())]
+
+    # 細い明るい線: 周囲の平均より明るい画素（飛行機雲は空より明るい細い線として写る）
+    blurred = np.asarray(Image.fromarray((gray * 255).astype(np.uint8)).filter(ImageFilter.BoxBlur(3)),
+                         dtype=np.float32) / 255.0
+    ridge = np.clip(gray - blurred, 0, None)
+    ridge_stats = [float(ridge.mean()), float((ridge > 0.03).mean()), float((ridge > 0.06).mean())]
+
+    # 色の統計（空の青さ・明るさ、上半分と下半分の明るさ）
+    total = rgb.sum(axis=2) + 1e-6
+    blue_ratio = rgb[..., 2] / total
+    sky = (rgb[..., 2] > rgb[..., 0]) & (rgb[..., 2] > rgb[..., 1])
+    color_stats = [*rgb.mean(axis=(0, 1)), *rgb.std(axis=(0, 1)), float(blue_ratio.mean()), float(blue_ratio.std()),
+                   float(sky.mean()), float(gray[: height // 2].mean()), float(gray[height // 2:].mean())]
+
+    return np.concatenate([hog.ravel(), edge_fractions, direction_stats, ridge_stats, color_stats]).astype(np.float32)
+
+
+def _resolve_image(path: str, image_dir: str) -> Optional[str]:
+    """CSVに記録された画像のパス（見つからない場合は image_dir の同名のファイル）"""
+    if os.path.exists(path):
+        return path
+    candidate = os.path.join(image_dir, os.path.basename(path))
+    return candidate if os.path.exists(candidate) else None
+
+
+def _locally_labeled(prediction_log: str) -> set:
+    """ローカルで判定した（Qwenのラベルがない）画像のパス"""
+    if not os.path.exists(prediction_log):
+        return set()
+    with open(prediction_log, "r", newline="", encoding="utf-8") as f:
+        return {row["image_path"] for row in csv.DictReader(f) if row.get("routed") == "local"}
+
+
+def load_labels(timeline_path: str = TIMELINE_PATH, image_dir: str = IMAGE_DIR,
+                prediction_log: str = PREDICTION_LOG_PATH) -> List[Tuple[str, str, int]]:
+    """
+    Qwenの判定結果から、画像が残っているフレームの (日時, 画像のパス, 本数) を日時順に返す
+
+    Args:
+        timeline_path: contrail_timeline_by_qwen.csv
+        image_dir: CSVのパスに画像がない場合に探すディレクトリ
+        prediction_log: LocalContrailAnalyzerの予測ログ（ローカルで判定したフレームは除く）
+
+    Returns:
+        List[Tuple[str, str, int]]: (日時, 画像のパス, 本数)
+    """
+    excluded = _locally_labeled(prediction_log)
+    labels = {}
+    with open(timeline_path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            if row["image_path"] in excluded:
+                continue
+            try:
+                count = int(row["contrail_count"])
+            except (TypeError, ValueError):
+                continue
+            path = _resolve_image(row["image_path"], image_dir)
+            if path:
+                labels[path] = (row["date"], path, count)  # 同じ画像は後の判定を使う
+    return sorted(labels.values())
+
+
+def train(timeline_path: str = TIMELINE_PATH, model_path: str = MODEL_PATH, image_dir: str = IMAGE_DIR,
+          prediction_log: str = PREDICTION_LOG_PATH, holdout: float = 0.2,
+          min_confidence: float = MIN_CONFIDENCE) -> Dict[str, Any]:
+    """
+    Qwenの判定結果から分類器を学習して保存する
+    日時の新しい holdout の割合のフレームで評価してから、全てのフレームで学習し直す
+    （隣り合うフレームはよく似ているため、ランダムではなく時間で分ける）
+
+    Args:
+        timeline_path: contrail_timeline_by_qwen.csv
+        model_path: モデルの保存先
+        image_dir: CSVのパスに画像がない場合に探すディレクトリ
+        prediction_log: LocalContrailAnalyzerの予測ログ
+        holdout: 評価に使う割合
+        min_confidence: 評価で使う、ローカルの判定を採用する確信度
+
+    Returns:
+        Dict[str, Any]: 評価結果
+    """
+    import numpy as np
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+
+    labels = load_labels(timeline_path, image_dir, prediction_log)
+    if len(labels) < 20:
+        raise ValueError(f"学習に使える画像が少なすぎます（{len(labels)} 枚）")
+
+    start = time.perf_counter()
+    features, targets = [], []
+    for _, path, count in labels:
+        try:
+            features.append(extract_features(path))
+            targets.append(min(count, MAX_COUNT))
+        except Exception as e:
+            logger.error(f"特徴量の計算中にエラーが発生しました: {path}: {e}")
+    X, y = np.vstack(features), np.array(targets)
+    extract_seconds = time.perf_counter() - start
+
+    def build():
+        return RandomForestClassifier(n_estimators=100, min_samples_leaf=2, class_weight="balanced_subsample",
+                                      n_jobs=-1, random_state=0)
+
+    split = int(len(y) * (1 - holdout))
+    model = build().fit(X[:split], y[:split])
+    metrics = evaluate(model, X[split:], y[split:], min_confidence)
+    metrics.update({"frames": len(y), "train_frames": split, "positive_ratio": float((y > 0).mean()),
+                    "feature_ms_per_frame": extract_seconds / len(y) * 1000})
+
+    model = build().fit(X, y)
+    model.n_jobs = 1  # 1枚ずつ推論するため、並列化のオーバーヘッドを避ける
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    joblib.dump({"model": model, "feature_version": FEATURE_VERSION, "max_count": MAX_COUNT,
+                 "trained_at": datetime.now().isoformat(), "metrics": metrics}, model_path)
+    logger.info(f"飛行機雲の分類器を保存しました: {model_path}（{len(y)} 枚、評価: {json.dumps(metrics, ensure_ascii=False)}）")
+    return metrics
+
+
+def evaluate(model, X, y, min_confidence: float = MIN_CONFIDENCE) -> Dict[str, Any]:
+    """
+    評価用のフレームでの正解率と、確信度で振り分けた場合のローカル判定の割合・正解率
+
+    Returns:
+        Dict[str, Any]: count_accuracy（本数の一致）、presence_accuracy（有無の一致）、count_mae、
+            local_coverage（確信度が min_confidence 以上の割合）、local_accuracy（そのフレームの本数の一致）
+    """
+    import numpy as np
+
+    if len(y) == 0:
+        return {}
+    proba = model.predict_proba(X)
+    predicted = model.classes_[proba.argmax(axis=1)]
+    confident = proba.max(axis=1) >= min_confidence
+    return {
+        "holdout_frames": int(len(y)),
+        "count_accuracy": float((predicted == y).mean()),
+        "presence_accuracy": float(((predicted > 0) == (y > 0)).mean()),
+        "count_mae": float(np.abs(predicted - y).mean()),
+        "local_coverage": float(confident.mean()),
+        "local_accuracy": float((predicted[confident] == y[confident]).mean()) if confident.any() else None,
+    }
+
+
+_log_lock = threading.Lock()
+
+
+def log_prediction(prediction_log: Optional[str], image_path: str, local: Dict[str, Any], routed: str) -> None:
+    """
+    ローカルの判定を予測ログに追記する（routed が "local" のフレームは次の学習で除く）
+
+    Args:
+        prediction_log: 予測ログのCSV（Noneの場合は記録しない）
+        image_path: 画像のパス
+        local: count, confidence, latency
+        routed: "local"（ローカルの判定を採用）または "fallback"（他の分析器の判定を採用）
+    """
+    if not prediction_log:
+        return
+    try:
+        with _log_lock:
+            os.makedirs(os.path.dirname(prediction_log), exist_ok=True)
+            is_new = not os.path.exists(prediction_log)
+            with open(prediction_log, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if is_new:
+                    writer.writerow(["timestamp", "image_path", "count", "confidence", "latency", "routed"])
+                writer.writerow([datetime.now().isoformat(timespec="seconds"), image_path, local["count"],
+                                 round(local["confidence"], 4), round(local["latency"], 4), routed])
+    except Exception as e:
+        logger.error(f"予測ログの書き込み中にエラーが発生しました: {e}")
+
+
+class LocalContrailAnalyzer(ImageAnalyzer):
+    """Qwenの判定結果から学習した分類器で、CPUだけで飛行機雲の本数を判定するクラス"""
+
+    def __init__(self, model_path: str = MODEL_PATH, min_confidence: float = MIN_CONFIDENCE,
+                 fallback: Optional[ImageAnalyzer] = None, prediction_log: Optional[str] = PREDICTION_LOG_PATH,
+                 telemetry=None, camera: Optional[str] = None):
+        """
+        初期化
+
+        Args:
+            model_path: train() で保存したモデル
+            min_confidence: この確信度未満のフレームは fallback で判定する
+            fallback: 確信度が低い場合に使う分析器（Noneの場合はローカルの判定をそのまま返す）
+            prediction_log: 判定ごとに記録するCSV（Noneの場合は記録しない）
+            telemetry: 判定を記録するAPITelemetry（Noneの場合は記録しない）
+            camera: テレメトリに記録するカメラ名
+        """
+        super().__init__(FEATURE_SIZE, telemetry=telemetry, camera=camera)
+        import joblib
+
+        saved = joblib.load(model_path)
+        if saved.get("feature_version") != FEATURE_VERSION:
+            raise ValueError(f"特徴量の版が異なるモデルです（{saved.get('feature_version')} != {FEATURE_VERSION}）。学習し直してください")
+        self.model = saved["model"]
+        self.model_info = {k: v for k, v in saved.items() if k != "model"}
+        self.min_confidence = min_confidence
+        self.fallback = fallback
+        self.prediction_log = prediction_log
+
+    def predict(self, image_path: str) -> Tuple[int, float]:
+        """
+        本数と確信度を予測する
+
+        Args:
+            image_path: 画像のパス
+
+        Returns:
+            Tuple[int, float]: (本数, 確信度)
+        """
+        proba = self.model.predict_proba(extract_features(image_path)[None, :])[0]
+        best = int(proba.argmax())
+        return int(self.model.classes_[best]), float(proba[best])
+
+    def analyze(self, image_path: str, additional_instructions: str = "", **kwargs) -> Dict[str, Any]:
+        """
+        画像を分析する（確信度が低く fallback がある場合は fallback の結果に local を加えて返す）
+
+        Args:
+            image_path: 分析する画像のパス
+            additional_instructions: fallback に渡す追加の指示
+
+        Returns:
+            Dict[str, Any]: 分析結果（analysis に本数の文字列、routed に "local" / "fallback"）
+        """
+        start_time = time.perf_counter()
+        try:
+            count, confidence = self.predict(image_path)
+        except Exception as e:
+            if self.fallback is None:
+                return {"image_path": image_path, "error": str(e), "timestamp": datetime.now().isoformat()}
+            logger.error(f"ローカルの判定に失敗したため fallback で判定します: {image_path}: {e}")
+            count, confidence = None, 0.0
+        latency = time.perf_counter() - start_time
+        local = {"count": count, "confidence": confidence, "latency": latency}
+
+        if confidence >= self.min_confidence or self.fallback is None:
+            self.report_telemetry("local", "contrail_local_classifier", latency, image_path=image_path)
+            log_prediction(self.prediction_log, image_path, local, "local")
+            return {"image_path": image_path, "analysis": str(count), "confidence": confidence,
+                    "latency": latency, "retries": 0, "routed": "local"}
+
+        result = self.fallback.analyze(image_path, additional_instructions=additional_instructions)
+        log_prediction(self.prediction_log, image_path, local, "fallback")
+        return dict(result, local=local, routed="fallback")
+
+
+if __name__ == "__main__":
+    # python _contrail_local_classifier.py train [contrail_timeline_by_qwen.csv]   学習してモデルを保存
+    # python _contrail_local_classifier.py predict 画像のパス...                     本数と確信度を表示
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "train":
+        print(json.dumps(train(sys.argv[2] if len(sys.argv) > 2 else TIMELINE_PATH), ensure_ascii=False, indent=2))
+    elif command == "predict" and len(sys.argv) > 2:
+        analyzer = LocalContrailAnalyzer(prediction_log=None)
+        for path in sys.argv[2:]:
+            start = time.perf_counter()
+            count, confidence = analyzer.predict(path)
+            print(f"{path}: {count} 本（確信度 {confidence:.2f}、{(time.perf_counter() - start) * 1000:.1f} ms）")
+    else:
+        print("使い方: python _contrail_local_classifier.py train [CSVのパス] | predict 画像のパス...")
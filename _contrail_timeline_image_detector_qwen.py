@@ -12,6 +12,10 @@ from dotenv import load_dotenv
 import os
 from config import *
 from _contrail_analyzer_qwen import QwenCloudAnalyzer, AnalysisManager
+from _api_telemetry import APITelemetry
+from _contrail_local_classifier import LocalContrailAnalyzer, MODEL_PATH as LOCAL_MODEL_PATH
+from _contrail_cascade import build_default_cascade
+from _sky_mask import SkyMask
 
 class EnhancedAnalysisManager(AnalysisManager):
     """飛行機雲分析と結果管理を行う拡張クラス - 完全な時系列記録と重複回避機能に対応"""
@@ -168,7 +172,7 @@ class EnhancedAnalysisManager(AnalysisManager):
         # 各画像を解析
         for i, image_path in enumerate(unprocessed_images, 1):
             print(f"{i}/{len(unprocessed_images)} を処理中... {image_path}")
-            result = self.analyzer.analyze(image_path, additional_instructions=additional_instructions)
+            result = self.analyze_image(image_path, additional_instructions)
             self.results.append(result)
             
             # 分析結果から飛行機雲の数を取得
@@ -231,6 +235,7 @@ class EnhancedAnalysisManager(AnalysisManager):
 
 # mainは以前と同じ
 def main():
+    ensure_directories()
     # 環境変数の読み込み
     load_dotenv()
     api_key = os.getenv("DASHSCOPE_API_KEY")
@@ -244,10 +249,29 @@ def main():
         print("エラー: DASHSCOPE_API_KEYが設定されていません。")
         return
     
+    # カメラの空の範囲（初回と、古くなった場合に入力画像から作る）。画像は送る前にこの範囲で切り抜く
+    sky_mask = SkyMask("suma")
+    sky_mask.ensure_built(INPUT_DIR)
+    
     # 分析器と拡張マネージャーの初期化
     analyzer = QwenCloudAnalyzer(api_key=api_key,
                                model="qwen2.5-vl-7b-instruct", 
-                               resize_dimensions=(640, 360))
+                               resize_dimensions=(640, 360),
+                               telemetry=APITelemetry(),
+                               camera="suma",
+                               sky_mask=sky_mask)
+    
+    # AQI_CONTRAIL_CASCADE=1 の場合は、ローカル分類器 → 3B → 7B の順に判定し、迷うフレームだけを上位に回す
+    # それ以外で学習済みの分類器がある場合は、ローカルで判定できないフレームだけQwenに送る
+    if os.getenv("AQI_CONTRAIL_CASCADE") == "1":
+        analyzer = build_default_cascade(api_key, telemetry=analyzer.telemetry, camera="suma",
+                                         audit_rate=float(os.getenv("AQI_CONTRAIL_CASCADE_AUDIT", "0.05")),
+                                         sky_mask=sky_mask)
+    elif os.path.exists(LOCAL_MODEL_PATH):
+        analyzer = LocalContrailAnalyzer(model_path=LOCAL_MODEL_PATH,
+                                         fallback=analyzer,
+                                         telemetry=analyzer.telemetry,
+                                         camera="suma")
     
     manager = EnhancedAnalysisManager(analyzer=analyzer,
                                    input_dir=INPUT_DIR,
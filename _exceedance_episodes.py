@@ -0,0 +1,397 @@
+import os
+import sys
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from config import DATA_DIR, CSV_FILE_PATH, logger
+
+# 汚染物質ごと・閾値ごとに、1時間ごとの最大値が閾値を連続して超えた期間（エピソード）を求める
+# - 1時間の格子に並べた超過フラグの連長（ランレングス）をnumpyで求めるため、系列の長さに関係なく1回の走査で済む
+# - 欠測の時間はエピソードを区切る
+# - ExceedanceTracker は取得のたびに新しい行だけを処理する。終わっていないエピソードを含む末尾の時間だけを保持し、
+#   終わったエピソードをCSVに追記する
+
+EPISODE_DIR = os.path.join(DATA_DIR, "episodes")
+
+# 汚染物質ごとの閾値（o3_basic_analysis.py の 30 / 50、o3_relation_analysis.py のPM2.5の区分の 35 / 50）
+THRESHOLDS = {"O3": [30, 50], "PM2.5": [35, 50]}
+
+EPISODE_COLUMNS = ["pollutant", "threshold", "start", "end", "hours", "peak", "peak_time", "mean"]
+
+
+def _empty_episodes():
+    import pandas as pd
+
+    return pd.DataFrame({column: pd.Series(dtype="datetime64[ns]" if column in ("start", "end", "peak_time") else
+                                           "object" if column == "pollutant" else "float64")
+                         for column in EPISODE_COLUMNS})
+
+
+def hourly_max(series, freq: str = "h"):
+    """
+    値を1時間ごとの最大値にまとめ、最初から最後までの全ての時間を並べる（値のない時間はNaN）
+
+    Args:
+        series (pd.Series): DatetimeIndexの数値系列
+        freq: まとめる間隔
+
+    Returns:
+        pd.Series: 時間の開始時刻をインデックスとした最大値
+    """
+    import pandas as pd
+
+    values = series.dropna()
+    if values.empty:
+        return pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+    grouped = values.groupby(values.index.floor(freq)).max()
+    return grouped.reindex(pd.date_range(grouped.index.min(), grouped.index.max(), freq=freq))
+
+
+def find_episodes(series, threshold: float, pollutant: str = "", freq: str = "h"):
+    """
+    閾値を連続して超えた期間を求める
+
+    Args:
+        series (pd.Series): DatetimeIndexの数値系列（freqを持つ系列は格子に並んでいるものとしてそのまま使い、
+            それ以外は hourly_max でまとめる）
+        threshold: 閾値（この値を超えた時間を超過とする）
+        pollutant: 結果に入れる汚染物質名
+        freq: 時間の格子の間隔
+
+    Returns:
+        pd.DataFrame: エピソードごとの pollutant, threshold, start（最初の超過時間）, end（最後の超過時間）,
+            hours（継続時間数）, peak, peak_time, mean
+    """
+    import numpy as np
+    import pandas as pd
+
+    hourly = series if series.index.freq is not None else hourly_max(series, freq)
+    values = hourly.to_numpy(dtype=float)
+    above = values > threshold  # NaNはFalse
+    if not above.any():
+        return _empty_episodes()
+
+    # ランレングス: 超過の始まりと終わりの位置
+    flags = above.astype(np.int8)
+    starts = np.flatnonzero(np.diff(flags, prepend=0) == 1)
+    ends = np.flatnonzero(np.diff(flags, append=0) == -1)
+
+    # 超過していない時間を除いて区間ごとに集計する（区間は次のエピソードの開始まで）
+    masked = np.where(above, values, -np.inf)
+    peaks = np.maximum.reduceat(masked, starts)
+    sums = np.add.reduceat(np.where(above, values, 0.0), starts)
+    hours = ends - starts + 1
+
+    # 各エピソードで最初に最大値になった時間
+    run_id = np.cumsum(np.diff(flags, prepend=0) == 1) - 1
+    at_peak = np.flatnonzero(above & (values == peaks[np.clip(run_id, 0, None)]))
+    _, first = np.unique(run_id[at_peak], return_index=True)
+
+    index = hourly.index
+    return pd.DataFrame({
+        "pollutant": pollutant,
+        "threshold": float(threshold),
+        "start": index[starts],
+        "end": index[ends],
+        "hours": hours,
+        "peak": peaks,
+        "peak_time": index[at_peak[first]],
+        "mean": sums / hours,
+    })
+
+
+def find_all_episodes(df, thresholds: Optional[Dict[str, List[float]]] = None, time_column: str = "取得時間"):
+    """
+    元データの全ての汚染物質・閾値のエピソードを求める
+
+    Args:
+        df (pd.DataFrame): 元データ（time_columnの日時列、またはDatetimeIndexを持つ）
+        thresholds: 汚染物質 → 閾値のリスト（Noneの場合はTHRESHOLDS）
+        time_column: 日時列
+
+    Returns:
+        pd.DataFrame: find_episodesの結果をまとめたもの（開始時刻順）
+    """
+    import pandas as pd
+
+    data = _prepare(df, list(thresholds or THRESHOLDS), time_column)
+    frames = []
+    for pollutant, levels in (thresholds or THRESHOLDS).items():
+        if pollutant not in data:
+            continue
+        hourly = hourly_max(data[pollutant])
+        frames.extend(find_episodes(hourly, threshold, pollutant) for threshold in levels)
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return _empty_episodes()
+    return pd.concat(frames, ignore_index=True).sort_values(["start", "pollutant", "threshold"], ignore_index=True)
+
+
+def monthly_summary(episodes):
+    """
+    エピソードを開始月ごとに集計する
+
+    Args:
+        episodes (pd.DataFrame): find_episodes / find_all_episodes の結果
+
+    Returns:
+        pd.DataFrame: pollutant, threshold, month ごとの episodes（件数）, hours（合計時間数）,
+            longest（最長の継続時間数）, peak（最大値）, days（超過が始まった日数）
+    """
+    import pandas as pd
+
+    if episodes.empty:
+        return pd.DataFrame(columns=["pollutant", "threshold", "month", "episodes", "hours", "longest", "peak", "days"])
+    frame = episodes.assign(month=episodes["start"].dt.to_period("M").astype(str),
+                            day=episodes["start"].dt.normalize())
+    return frame.groupby(["pollutant", "threshold", "month"]).agg(
+        episodes=("start", "size"),
+        hours=("hours", "sum"),
+        longest=("hours", "max"),
+        peak=("peak", "max"),
+        days=("day", "nunique"),
+    ).reset_index()
+
+
+def _prepare(df, columns: List[str], time_column: str):
+    """元データを時刻インデックス・数値列のDataFrameに変換（"non"などはNaN）"""
+    import pandas as pd
+
+    data = df.set_index(time_column) if time_column in df.columns else df
+    data = data.set_axis(pd.to_datetime(data.index, errors="coerce"))
+    data = data[~data.index.isna()]
+    return data[[c for c in columns if c in data.columns]].apply(pd.to_numeric, errors="coerce").sort_index()
+
+
+class ExceedanceTracker:
+    """取得のたびにエピソードを更新する（スレッドセーフ）"""
+
+    def __init__(self, name: str = "aqi", episode_dir: str = EPISODE_DIR,
+                 thresholds: Optional[Dict[str, List[float]]] = None, time_column: str = "取得時間"):
+        """
+        初期化
+
+        Args:
+            name: ストア名（ファイル名の接頭辞）
+            episode_dir: 保存先ディレクトリ
+            thresholds: 汚染物質 → 閾値のリスト（Noneの場合はTHRESHOLDS）
+            time_column: 元データの日時列
+        """
+        self.name = name
+        self.episode_dir = episode_dir
+        self.thresholds = thresholds or THRESHOLDS
+        self.time_column = time_column
+        self.state = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def episodes_path(self) -> str:
+        return os.path.join(self.episode_dir, f"{self.name}_episodes.csv")
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.episode_dir, f"{self.name}_episodes_state.json")
+
+    @property
+    def is_built(self) -> bool:
+        """一度でも処理したことがあるかどうか"""
+        return os.path.exists(self.state_path)
+
+    def _disk_version(self):
+        """保存済みファイルの版（inodeと更新時刻）。別のプロセスが書き換えた場合に変わる（ファイルがない場合はNone）"""
+        try:
+            stat = os.stat(self.state_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load_state(self) -> Dict[str, Any]:
+        """状態を読み込む（読み込み済みで、別のプロセスがファイルを書き換えていない場合は何もしない）"""
+        version = self._disk_version()
+        if self.state is None or version != self._version:
+            self._version = version
+            self.state = {}
+            if os.path.exists(self.state_path):
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    self.state = json.load(f)
+        return self.state
+
+    def _tail_series(self, pollutant: str):
+        """保持している末尾の1時間ごとの最大値"""
+        import pandas as pd
+
+        tail = self.state.get("tail", {}).get(pollutant)
+        if not tail:
+            return pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+        index = pd.date_range(tail["start"], periods=len(tail["values"]), freq="h")
+        return pd.Series([float("nan") if v is None else v for v in tail["values"]], index=index, dtype=float)
+
+    def ingest(self, df, save: bool = True) -> int:
+        """
+        新しい行を処理し、終わったエピソードを追記する（前回までに処理した最新時刻以前の行は無視する）
+
+        直後の1時間が揃うまでエピソードは終わったものとしない（同じ時間の取得が後から届く場合があるため）
+
+        Args:
+            df: 元データ（time_columnの日時列、またはDatetimeIndexを持つ）。行の辞書のリストも可
+            save: Trueの場合は状態とエピソードをファイルに保存
+
+        Returns:
+            int: 処理した行数
+        """
+        import pandas as pd
+
+        if isinstance(df, list):
+            df = pd.DataFrame(df)
+        data = _prepare(df, list(self.thresholds), self.time_column)
+        with self._lock:
+            self._load_state()
+            return self._ingest(data, save)
+
+    def _ingest(self, data, save: bool) -> int:
+        """前処理済みの行を処理する（ロック取得済みで呼ぶ）"""
+        import pandas as pd
+
+        watermark = self.state.get("last_ingested")
+        if watermark:
+            data = data[data.index > pd.Timestamp(watermark)]
+        if data.empty:
+            return 0
+
+        tails = self.state.setdefault("tail", {})
+        closed_until = self.state.setdefault("closed_until", {})
+        open_episodes = []
+        closed = []
+        for pollutant, levels in self.thresholds.items():
+            if pollutant not in data:
+                continue
+            hourly = hourly_max(pd.concat([self._tail_series(pollutant), data[pollutant]]))
+            if hourly.empty:
+                continue
+            last = hourly.index.max()
+            settled = last - pd.Timedelta(hours=1)
+            tail_start = settled
+            for threshold in levels:
+                key = f"{pollutant}:{threshold}"
+                episodes = find_episodes(hourly, threshold, pollutant)
+                done = episodes[episodes["end"] < settled]
+                if key in closed_until:
+                    done = done[done["start"] > pd.Timestamp(closed_until[key])]
+                if not done.empty:
+                    closed.append(done)
+                    closed_until[key] = done["end"].max().isoformat()
+                ongoing = episodes[episodes["end"] >= settled]
+                open_episodes.append(ongoing)
+                if not ongoing.empty:
+                    tail_start = min(tail_start, ongoing["start"].min())
+            kept = hourly[hourly.index >= max(tail_start, hourly.index.min())]
+            tails[pollutant] = {"start": kept.index.min().isoformat(),
+                                "values": [None if pd.isna(v) else float(v) for v in kept]}
+
+        open_episodes = [frame for frame in open_episodes if not frame.empty]
+        ongoing = pd.concat(open_episodes) if open_episodes else _empty_episodes()
+        for column in ("start", "end", "peak_time"):
+            ongoing[column] = ongoing[column].dt.strftime("%Y-%m-%d %H:%M:%S")
+        self.state["open"] = ongoing[EPISODE_COLUMNS].to_dict("records")
+        self.state.update({
+            "last_ingested": data.index.max().isoformat(),
+            "rows": self.state.get("rows", 0) + len(data),
+            "updated_at": datetime.now().isoformat(),
+        })
+        if save:
+            self._save(pd.concat(closed) if closed else None)
+        return len(data)
+
+    def _save(self, closed) -> None:
+        """終わったエピソードの追記と状態の書き出し（ロック取得済みで呼ぶ）"""
+        os.makedirs(self.episode_dir, exist_ok=True)
+        if closed is not None and not closed.empty:
+            closed = closed.sort_values(["start", "pollutant", "threshold"])
+            header = not os.path.exists(self.episodes_path)
+            closed[EPISODE_COLUMNS].to_csv(self.episodes_path, mode="a", header=header, index=False, encoding="utf-8-sig",
+                                           date_format="%Y-%m-%d %H:%M:%S")
+        with open(self.state_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(self.state_path + ".tmp", self.state_path)
+        self._version = self._disk_version()
+
+    def rebuild(self, df) -> int:
+        """
+        元データ全体からエピソードを作り直す
+
+        Args:
+            df: 元データ
+
+        Returns:
+            int: 処理した行数
+        """
+        data = _prepare(df, list(self.thresholds), self.time_column)
+        # 作り直しの途中で他のスレッドが取り込まないよう、初期化と取り込みを1回のロックで行う
+        with self._lock:
+            if os.path.exists(self.episodes_path):
+                os.remove(self.episodes_path)
+            self.state = {}
+            return self._ingest(data, save=True)
+
+    def ensure_built(self, csv_path: str = CSV_FILE_PATH) -> bool:
+        """
+        まだ処理したことがない場合は、既存のCSV全体から作成する
+
+        Args:
+            csv_path: 元データのCSV
+
+        Returns:
+            bool: 作成した場合はTrue
+        """
+        import pandas as pd
+
+        if self.is_built or not os.path.exists(csv_path):
+            return False
+        rows = self.rebuild(pd.read_csv(csv_path, encoding="utf-8-sig"))
+        logger.info(f"超過エピソードを作成しました: {self.name}（{rows} 行）")
+        return True
+
+    def episodes(self, include_open: bool = True):
+        """
+        記録済みのエピソード
+
+        Args:
+            include_open: Trueの場合は終わっていないエピソードも含める（open列がTrue）
+
+        Returns:
+            pd.DataFrame: EPISODE_COLUMNS と open 列
+        """
+        import pandas as pd
+
+        with self._lock:
+            self._load_state()
+            frames = []
+            if os.path.exists(self.episodes_path):
+                frames.append(pd.read_csv(self.episodes_path, encoding="utf-8-sig").assign(open=False))
+            if include_open and self.state.get("open"):
+                frames.append(pd.DataFrame(self.state["open"]).assign(open=True))
+        if not frames:
+            return _empty_episodes().assign(open=pd.Series(dtype=bool))
+        result = pd.concat(frames, ignore_index=True)
+        for column in ("start", "end", "peak_time"):
+            result[column] = pd.to_datetime(result[column])
+        return result.sort_values(["start", "pollutant", "threshold"], ignore_index=True)
+
+
+if __name__ == "__main__":
+    # python _exceedance_episodes.py rebuild [CSVのパス]     CSV全体からエピソードを作り直す
+    # python _exceedance_episodes.py show                   エピソードと月ごとの集計を表示
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    tracker = ExceedanceTracker()
+    if command == "rebuild":
+        import pandas as pd
+        csv_path = sys.argv[2] if len(sys.argv) > 2 else CSV_FILE_PATH
+        print(f"{tracker.rebuild(pd.read_csv(csv_path, encoding='utf-8-sig'))} 行を処理しました")
+    elif command == "show":
+        episodes = tracker.episodes()
+        print(episodes.to_string())
+        print(monthly_summary(episodes).to_string())
+    else:
+        print("使い方: python _exceedance_episodes.py rebuild [CSVのパス] | show")
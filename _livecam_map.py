@@ -0,0 +1,282 @@
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, Optional
+from config import IMAGE_WEB_URL_DIR, STATIC_DIR, logger
+
+# ライブカメラ約3000地点の地図をHTMLとして書き出す
+# マーカーはPython側で1つずつ作らず、地域ごとに [緯度, 経度, エリア名, 区分, URL] の配列として埋め込み、
+# ブラウザ側（FastMarkerCluster）でクラスタリングしながら生成する
+# 出力はカメラ一覧CSVのハッシュと一緒に保存し、CSVが変わったときだけ再生成する
+
+LIVECAM_CSV_PATH = os.path.join(IMAGE_WEB_URL_DIR, "livecam_links_with_lat_lon.csv")
+LIVECAM_MAP_PATH = os.path.join(STATIC_DIR, "livecam_map.html")
+
+# 描画内容を変えたときに上げる（キャッシュを無効にするため）
+MAP_RENDER_VERSION = 1
+
+# 地域ごとの表示名・色・アイコン（CSVのregion列はローマ字）
+REGION_STYLES = {
+    "hokkaido": ("北海道", "pink", "snowflake-o"),
+    "tohoku": ("東北", "blue", "leaf"),
+    "kanto": ("関東", "purple", "building"),
+    "chubu": ("中部", "orange", "tree"),
+    "kinki": ("近畿", "red", "university"),
+    "chugoku": ("中国", "darkblue", "pagelines"),
+    "shikoku": ("四国", "green", "ship"),
+    "kyushu": ("九州", "cadetblue", "sun-o"),
+    "okinawa": ("沖縄", "orange", "umbrella"),
+}
+DEFAULT_STYLE = ("その他", "gray", "info-sign")
+
+# 配列の1行からマーカーを作るJavaScript（FastMarkerClusterのcallback）
+MARKER_CALLBACK = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {
+        icon: L.AwesomeMarkers.icon({icon: '%(icon)s', prefix: 'fa', markerColor: '%(color)s'})
+    });
+    var popup = '<div style="width: 200px"><h4>' + row[2] + '</h4>'
+        + '<p>地域: %(label)s / ' + row[3] + '</p>'
+        + '<p><a href="' + row[4] + '" target="_blank">詳細を見る</a></p></div>';
+    marker.bindPopup(popup, {maxWidth: 300});
+    marker.bindTooltip(row[2]);
+    return marker;
+}
+"""
+
+# エリア名の検索（全地域のマーカーから候補リストを作り、選択した地点へ移動する）
+# 地図とクラスタの変数が定義された後に実行するため、loadイベントで登録する
+SEARCH_HTML = """
+<div style="position: fixed; top: 10px; right: 60px; z-index: 9999;">
+    <input id="livecam-search" list="livecam-areas" placeholder="エリアを検索..."
+           style="width: 220px; padding: 4px; border: 2px solid grey;">
+    <datalist id="livecam-areas"></datalist>
+</div>
+"""
+
+SEARCH_SCRIPT = """
+window.addEventListener('load', function () {
+    var points = {};
+    var datalist = document.getElementById('livecam-areas');
+    [%(clusters)s].forEach(function (cluster) {
+        cluster.getLayers().forEach(function (marker) {
+            var area = marker.getTooltip().getContent();
+            if (!(area in points)) {
+                points[area] = marker.getLatLng();
+                var option = document.createElement('option');
+                option.value = area;
+                datalist.appendChild(option);
+            }
+        });
+    });
+    document.getElementById('livecam-search').addEventListener('change', function (e) {
+        var point = points[e.target.value];
+        if (point) { %(map)s.setView(point, 15); }
+    });
+});
+"""
+
+
+def file_fingerprint(path: str) -> str:
+    """
+    ファイル内容のSHA-256を返す
+
+    Args:
+        path: 対象ファイル
+
+    Returns:
+        str: 16進数のハッシュ値
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _meta_path(output_path: str) -> str:
+    """キャッシュ情報（元CSVのハッシュなど）を保存するファイルのパス"""
+    return os.path.splitext(output_path)[0] + ".meta.json"
+
+
+def is_map_up_to_date(csv_path: str, output_path: str) -> bool:
+    """
+    出力済みの地図が現在のCSVから作られたものかどうかを判定
+
+    Args:
+        csv_path: カメラ一覧CSV
+        output_path: 地図HTMLの出力先
+
+    Returns:
+        bool: 再生成が不要な場合はTrue
+    """
+    meta_path = _meta_path(output_path)
+    if not (os.path.exists(output_path) and os.path.exists(meta_path)):
+        return False
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    # 更新時刻とサイズが同じならハッシュ計算を省略する
+    stat = os.stat(csv_path)
+    if meta.get("version") != MAP_RENDER_VERSION:
+        return False
+    if meta.get("mtime") == stat.st_mtime and meta.get("size") == stat.st_size:
+        return True
+    return meta.get("sha256") == file_fingerprint(csv_path)
+
+
+def load_region_points(csv_path: str) -> Dict[str, list]:
+    """
+    カメラ一覧CSVを地域ごとのコンパクトな配列に変換
+
+    Args:
+        csv_path: カメラ一覧CSV
+
+    Returns:
+        Dict[str, list]: 地域名 → [[緯度, 経度, エリア名, 区分, URL], ...]
+    """
+    import pandas as pd
+
+    df = pd.read_csv(csv_path, encoding="utf-8-sig")
+    df["latitude"] = pd.to_numeric(df["latitude"], errors="coerce")
+    df["longitude"] = pd.to_numeric(df["longitude"], errors="coerce")
+    df = df.dropna(subset=["latitude", "longitude"])
+    # 座標は小数点以下5桁（約1m）に丸めてHTMLを小さくする
+    df = df.assign(latitude=df["latitude"].round(5), longitude=df["longitude"].round(5))
+    df[["area", "division", "area_url"]] = df[["area", "division", "area_url"]].fillna("").astype(str)
+
+    columns = ["latitude", "longitude", "area", "division", "area_url"]
+    return {region: group[columns].values.tolist() for region, group in df.groupby("region", sort=True)}
+
+
+def render_livecam_map(region_points: Dict[str, list], output_path: str) -> None:
+    """
+    地域ごとのレイヤーを持つクラスタリング地図をHTMLに書き出す
+
+    Args:
+        region_points: load_region_pointsの戻り値
+        output_path: 出力先
+    """
+    import folium
+    from folium.plugins import FastMarkerCluster
+
+    all_points = [row for rows in region_points.values() for row in rows]
+    if all_points:
+        center = [sum(p[0] for p in all_points) / len(all_points), sum(p[1] for p in all_points) / len(all_points)]
+    else:
+        center = [36.0, 138.0]
+    m = folium.Map(location=center, zoom_start=6, prefer_canvas=True)
+
+    # AwesomeMarkersのJS/CSSを読み込ませるため、通常のIconを1つ登録しておく
+    folium.Icon().add_to(m)
+
+    clusters = []
+    for region, rows in region_points.items():
+        label, color, icon = REGION_STYLES.get(region, DEFAULT_STYLE)
+        cluster = FastMarkerCluster(
+            data=rows,
+            callback=MARKER_CALLBACK % {"icon": icon, "color": color, "label": label},
+            name=f"{label}地域（{len(rows)}）",
+            overlay=True,
+            options={"chunkedLoading": True, "showCoverageOnHover": False},
+        )
+        cluster.add_to(m)
+        clusters.append(cluster)
+
+    folium.LayerControl().add_to(m)
+
+    # 凡例
+    legend_html = """
+    <div style="position: fixed; bottom: 50px; right: 50px; border:2px solid grey; z-index:9999;
+                background-color:white; padding: 10px; font-size:14px;">
+    <h4>地域の凡例</h4>
+    """
+    for region in region_points:
+        label, color, icon = REGION_STYLES.get(region, DEFAULT_STYLE)
+        legend_html += f"""
+        <div style="display: flex; align-items: center; margin-bottom: 5px;">
+            <i class="fa fa-{icon}" style="color:{color}; margin-right: 5px;"></i>
+            <span>{label}</span>
+        </div>
+        """
+    legend_html += "</div>"
+    m.get_root().html.add_child(folium.Element(legend_html))
+
+    # 検索欄（候補はクラスタ内のマーカーから作り、データを二重に埋め込まない）
+    m.get_root().html.add_child(folium.Element(SEARCH_HTML))
+    cluster_names = ", ".join(cluster.get_name() for cluster in clusters)
+    m.get_root().script.add_child(folium.Element(SEARCH_SCRIPT % {"clusters": cluster_names, "map": m.get_name()}))
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    m.save(tmp_path)
+    os.replace(tmp_path, output_path)
+
+
+def build_livecam_map(csv_path: str = LIVECAM_CSV_PATH, output_path: str = LIVECAM_MAP_PATH,
+                      force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    カメラ一覧CSVから地図を作成（CSVが変わっていなければ既存の出力を使う）
+
+    Args:
+        csv_path: カメラ一覧CSV
+        output_path: 地図HTMLの出力先
+        force: Trueの場合はキャッシュを無視して再生成
+
+    Returns:
+        Dict[str, Any]: output_path, regenerated, points, regions。CSVがない場合や失敗時はNone
+    """
+    if not os.path.exists(csv_path):
+        logger.error(f"カメラ一覧CSVが見つかりません: {csv_path}")
+        return None
+
+    try:
+        if not force and is_map_up_to_date(csv_path, output_path):
+            logger.info(f"カメラ一覧に変更がないため、既存の地図を使用します: {output_path}")
+            return {"output_path": output_path, "regenerated": False}
+
+        region_points = load_region_points(csv_path)
+        render_livecam_map(region_points, output_path)
+
+        stat = os.stat(csv_path)
+        meta = {
+            "version": MAP_RENDER_VERSION,
+            "source": os.path.abspath(csv_path),
+            "sha256": file_fingerprint(csv_path),
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "points": sum(len(rows) for rows in region_points.values()),
+            "regions": {region: len(rows) for region, rows in region_points.items()},
+            "generated_at": datetime.now().isoformat(),
+        }
+        with open(_meta_path(output_path), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.error(f"ライブカメラ地図の作成中にエラーが発生しました: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        return None
+
+    logger.info(f"ライブカメラ地図を作成しました（{meta['points']} 地点）: {output_path}")
+    return {"output_path": output_path, "regenerated": True, "points": meta["points"], "regions": meta["regions"]}
+
+
+def main():
+    """
+    python _livecam_map.py [--force] [CSVのパス] [出力先]
+    """
+    args = [a for a in sys.argv[1:] if a != "--force"]
+    csv_path = args[0] if len(args) > 0 else LIVECAM_CSV_PATH
+    output_path = args[1] if len(args) > 1 else LIVECAM_MAP_PATH
+    result = build_livecam_map(csv_path, output_path, force="--force" in sys.argv)
+    if result is None:
+        sys.exit(1)
+    print(f"地図: {result['output_path']}（{'再生成' if result['regenerated'] else 'キャッシュを使用'}）")
+
+
+if __name__ == "__main__":
+    main()
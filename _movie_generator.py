@@ -1,14 +1,28 @@
 import os
 import cv2
 import glob
+import shutil
+import tempfile
+import subprocess
 from config import *
+from _stage_metrics import stage
 import sys
 from datetime import datetime
 
+# fps を指定しない場合のフレームレート
 FPS = 60
 
+# 1回のffmpeg起動でMP4とWebMを同時に出力する際のエンコード設定
+MP4_CODEC_ARGS = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p', '-movflags', '+faststart']
+WEBM_CODEC_ARGS = ['-c:v', 'libvpx-vp9', '-b:v', '1M', '-crf', '30', '-deadline', 'good', '-row-mt', '1', '-pix_fmt', 'yuv420p']
+# yuv420pは幅・高さが偶数である必要があるため、奇数の場合は1ピクセル切り落とす
+EVEN_SIZE_FILTER = 'crop=trunc(iw/2)*2:trunc(ih/2)*2'
+
 def set_FPS(fps):
-    """FPSを設定"""
+    """
+    fps を指定しない場合のFPSを設定
+    （モジュール全体の値を書き換えるため、複数の動画を並行して作成する場合は各関数の fps 引数を使う）
+    """
     global FPS
     FPS = fps
     print(f"FPSが {FPS} に設定されました", file=sys.stderr)
@@ -111,14 +125,12 @@ def filter_images_by_days(image_files, days=None):
     
     return filtered_images
 
-def generate_movie(input_dir, output_dir, output_file_name, days=None, time_stamp=True):
+def select_images(input_dir, days=None):
     """
-    タイムスタンプ付きの画像からムービーを作成する
+    入力ディレクトリから動画にする画像を選ぶ
     days: 処理する日数（指定がない場合はすべての日を処理）
+    画像が見つからない場合はNoneを返す
     """
-    # 出力ディレクトリの作成
-    os.makedirs(output_dir, exist_ok=True)
-    
     # 入力ディレクトリから画像ファイルを取得（jpgのみ）
     image_files = glob.glob(os.path.join(input_dir, "*.jpg"))
     
@@ -142,6 +154,32 @@ def generate_movie(input_dir, output_dir, output_file_name, days=None, time_stam
         print("指定された日数分の画像が見つかりません")
         return None
     
+    return filtered_images
+
+def print_progress(i, total_images, progress_bar_length=20):
+    """進捗を標準エラー出力に表示（ログに記録されない）"""
+    if i % 20 == 0:  # 進捗表示を減らす
+        # 現在の進捗率を計算
+        progress = int((i + 1) / total_images * progress_bar_length)
+        # ■の数を進捗に合わせて増やす
+        progress_bar = '■' * progress + ' ' * (progress_bar_length - progress)
+        print(f"処理中: [{progress_bar}] {i+1}/{total_images}", end='\r', file=sys.stderr)
+
+def generate_movie(input_dir, output_dir, output_file_name, days=None, time_stamp=True, fps=None):
+    """
+    タイムスタンプ付きの画像からムービーを作成する
+    days: 処理する日数（指定がない場合はすべての日を処理）
+    fps: フレームレート（指定がない場合は FPS）
+    """
+    fps = FPS if fps is None else fps
+    # 出力ディレクトリの作成
+    os.makedirs(output_dir, exist_ok=True)
+    
+    filtered_images = select_images(input_dir, days)
+    if not filtered_images:
+        return None
+    total_images = len(filtered_images)
+    
     # 最初の画像を読み込んでサイズを取得
     first_image = cv2.imread(filtered_images[0])
     if first_image is None:
@@ -164,44 +202,166 @@ def generate_movie(input_dir, output_dir, output_file_name, days=None, time_stam
     # 動画ライターの設定
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')  # MP4形式
     video_writer = cv2.VideoWriter(
-        output_path, fourcc, FPS, (width, height)
+        output_path, fourcc, fps, (width, height)
     )
     
     # プログレスバーの設定
     progress_bar_length = 20  # プログレスバーの最大長
+    frames_written = 0
     
-    # 各画像を動画に追加
-    for i, img_file in enumerate(filtered_images):
-        if i % 20 == 0:  # 進捗表示を減らす
-            # 現在の進捗率を計算
-            progress = int((i + 1) / total_images * progress_bar_length)
-            # ■の数を進捗に合わせて増やす
-            progress_bar = '■' * progress + ' ' * (progress_bar_length - progress)
-            # 標準エラー出力に進捗を表示（ログに記録されない）
-            print(f"処理中: [{progress_bar}] {i+1}/{total_images}", end='\r', file=sys.stderr)
+    # 各画像を動画に追加（encode段階として計測）
+    with stage("encode", format="mp4") as s:
+        for i, img_file in enumerate(filtered_images):
+            print_progress(i, total_images, progress_bar_length)
         
-        img = cv2.imread(img_file)
-        if img is not None and time_stamp:
-            # タイムスタンプを取得
-            timestamp = format_timestamp(img_file)
-            # 画像にタイムスタンプを追加
-            img = add_timestamp_to_image(img, timestamp)
-            # 動画に追加
-            video_writer.write(img)
-    
-    # 処理完了を標準エラー出力に表示（ログに記録されない）
-    progress_bar = '■' * progress_bar_length
-    print(f"処理完了: [{progress_bar}] {total_images}/{total_images}", file=sys.stderr)
-    
-    # リソースの解放
-    video_writer.release()
+            img = cv2.imread(img_file)
+            if img is not None and time_stamp:
+                # タイムスタンプを取得
+                timestamp = format_timestamp(img_file)
+                # 画像にタイムスタンプを追加
+                img = add_timestamp_to_image(img, timestamp)
+                # 動画に追加
+                video_writer.write(img)
+                frames_written += 1
+    
+        # 処理完了を標準エラー出力に表示（ログに記録されない）
+        progress_bar = '■' * progress_bar_length
+        print(f"処理完了: [{progress_bar}] {total_images}/{total_images}", file=sys.stderr)
+    
+        # リソースの解放
+        video_writer.release()
+        s.add(items=frames_written, bytes=os.path.getsize(output_path) if os.path.exists(output_path) else 0)
     
     # 標準出力に結果のみを表示（ログに記録される）- 時分を含む
     time_with_minutes = current_datetime.strftime("%Y-%m-%d %H:%M")
     print(f"[{time_with_minutes}] タイムスタンプ付き動画が生成されました: {output_path}")
     return output_path
 
-import subprocess
+def build_single_pass_command(width, height, fps, outputs):
+    """
+    パイプから受け取った生フレーム（BGR24）を1回のffmpeg起動で複数ファイルにエンコードするコマンドを作成
+    width, height: フレームのサイズ
+    fps: フレームレート
+    outputs: [(出力パス, 'mp4' または 'webm', 縦の解像度またはNone), ...]
+    """
+    cmd = [
+        'ffmpeg', '-y', '-hide_banner', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps),
+        '-i', 'pipe:0',
+    ]
+    for path, fmt, rendition_height in outputs:
+        # 縮小版は高さを指定し、幅は縦横比を保った偶数にする
+        video_filter = f'scale=-2:{rendition_height}' if rendition_height else EVEN_SIZE_FILTER
+        cmd += ['-map', '0:v', '-vf', video_filter]
+        cmd += MP4_CODEC_ARGS if fmt == 'mp4' else WEBM_CODEC_ARGS
+        cmd.append(path)
+    return cmd
+
+def generate_movie_single_pass(input_dir, output_dir, output_file_name, days=None, time_stamp=True,
+                               webm=True, renditions=None, fps=None):
+    """
+    タイムスタンプを追加したフレームをパイプでffmpegに渡し、MP4(H.264)とWebM(VP9)を1回のエンコードで作成する
+    （MP4を書き出してからWebMに再変換する場合と比べ、デコード・エンコードが1世代少ない）
+    days: 処理する日数（指定がない場合はすべての日を処理）
+    webm: WebMも出力するかどうか
+    renditions: 追加で出力する縮小版の高さのリスト（例: [360]）。ファイル名に _360p が付く
+    fps: フレームレート（指定がない場合は FPS）
+    戻り値: {'mp4': パス, 'webm': パス, '360p_mp4': パス, ...}。失敗時はNone
+    ffmpegがない場合は generate_movie と convert_to_webm による従来の2段階の処理を行う
+    """
+    fps = FPS if fps is None else fps
+    if shutil.which('ffmpeg') is None:
+        print("ffmpegが見つからないため、従来の方法で動画を作成します", file=sys.stderr)
+        mp4_output = generate_movie(input_dir, output_dir, output_file_name, days, time_stamp, fps)
+        if mp4_output is None:
+            return None
+        outputs = {'mp4': mp4_output}
+        if webm:
+            webm_output = convert_to_webm(mp4_output)
+            if webm_output:
+                outputs['webm'] = webm_output
+        return outputs
+    
+    # 出力ディレクトリの作成
+    os.makedirs(output_dir, exist_ok=True)
+    
+    filtered_images = select_images(input_dir, days)
+    if not filtered_images:
+        return None
+    total_images = len(filtered_images)
+    
+    # 最初の画像を読み込んでサイズを取得
+    first_image = cv2.imread(filtered_images[0])
+    if first_image is None:
+        print(f"画像の読み込みに失敗しました: {filtered_images[0]}")
+        return None
+    height, width = first_image.shape[:2]
+    
+    # 出力ファイルの一覧（エンコード中は一時ファイルに書き、成功後に置き換える）
+    base_name = f"{output_file_name}_{days}days" if days else output_file_name
+    formats = ['mp4', 'webm'] if webm else ['mp4']
+    targets = []
+    for rendition_height in [None] + sorted(renditions or [], reverse=True):
+        suffix = f"_{rendition_height}p" if rendition_height else ""
+        for fmt in formats:
+            key = f"{rendition_height}p_{fmt}" if rendition_height else fmt
+            final_path = os.path.join(output_dir, f"{base_name}{suffix}.{fmt}")
+            tmp_path = os.path.join(output_dir, f".{base_name}{suffix}.tmp.{fmt}")
+            targets.append((key, final_path, tmp_path, fmt, rendition_height))
+    
+    cmd = build_single_pass_command(width, height, fps, [(tmp, fmt, h) for _, _, tmp, fmt, h in targets])
+    print(f"FFmpegでMP4/WebMを同時にエンコードします: {', '.join(os.path.basename(t[1]) for t in targets)}",
+          file=sys.stderr)
+    
+    frames_written = 0
+    with stage("encode", format="+".join(formats), renditions=len(renditions or [])) as s, \
+            tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr_file)
+        try:
+            for i, img_file in enumerate(filtered_images):
+                print_progress(i, total_images)
+                img = first_image if i == 0 else cv2.imread(img_file)
+                if img is None:
+                    continue
+                # サイズが異なる画像は最初の画像に合わせる（生フレームは全て同じサイズである必要がある）
+                if img.shape[:2] != (height, width):
+                    img = cv2.resize(img, (width, height))
+                if time_stamp:
+                    img = add_timestamp_to_image(img, format_timestamp(img_file))
+                process.stdin.write(img.tobytes())
+                frames_written += 1
+        except BrokenPipeError:
+            # ffmpegが途中で終了した場合は、下でエラー内容を表示する
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            returncode = process.wait()
+        
+        progress_bar = '■' * 20
+        print(f"処理完了: [{progress_bar}] {total_images}/{total_images}", file=sys.stderr)
+        
+        if returncode != 0 or frames_written == 0:
+            stderr_file.seek(0)
+            error = stderr_file.read().decode('utf-8', errors='replace')
+            print(f"動画のエンコードに失敗しました。エラー: {error}", file=sys.stderr)
+            for _, _, tmp_path, _, _ in targets:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            return None
+        
+        outputs = {}
+        for key, final_path, tmp_path, _, _ in targets:
+            os.replace(tmp_path, final_path)
+            outputs[key] = final_path
+        s.add(items=frames_written, bytes=sum(os.path.getsize(p) for p in outputs.values()))
+    
+    time_with_minutes = datetime.now().strftime("%Y-%m-%d %H:%M")
+    for path in outputs.values():
+        print(f"[{time_with_minutes}] タイムスタンプ付き動画が生成されました: {path}")
+    return outputs
 
 def convert_to_webm(input_file, output_file=None):
     """
@@ -228,12 +388,14 @@ def convert_to_webm(input_file, output_file=None):
         print(f"FFmpegでWebM変換を開始します: {input_file} -> {output_file}", file=sys.stderr)
         
         # サブプロセスとしてFFmpeg実行
-        process = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+        with stage("encode", format="webm") as st:
+            process = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+            st.add(items=1, bytes=os.path.getsize(output_file) if os.path.exists(output_file) else 0)
         
         # 結果確認
         if process.returncode == 0:
@@ -253,11 +415,8 @@ if __name__ == "__main__":
     input_dir = os.path.join(IMAGE_ANALYSIS_DIR, 'suma/input_image')
     output_dir = MOVIE_DIR
     
-    # まずMP4で生成
-    mp4_output = generate_movie(input_dir, output_dir, file_name, 20)
+    # MP4とWebMを1回のエンコードで生成
+    outputs = generate_movie_single_pass(input_dir, output_dir, file_name, 20)
     
-    if mp4_output:
-        # MP4が生成できたらWebMに変換
-        webm_output = convert_to_webm(mp4_output)
-        if webm_output:
-            print(f"最終出力（WebM形式）: {webm_output}")
\ No newline at end of file
+    if outputs and 'webm' in outputs:
+        print(f"最終出力（WebM形式）: {outputs['webm']}")
\ No newline at end of file
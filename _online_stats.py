@@ -0,0 +1,407 @@
+import os
+import sys
+import json
+import math
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from config import DATA_DIR, CSV_FILE_PATH, logger
+
+# 測定値を1件ずつ追加して、直近の時間窓の統計と指数移動平均（EWMA）を常に最新に保つ
+# - 時間窓（例: 直近8時間）の平均・分散はWelford法の追加・削除、最小・最大は単調なdequeで、1件あたり償却O(1)で更新する
+# - EWMAは測定の間隔に応じて減衰させる（半減期で指定するため、測定間隔が不規則でもよい）
+# - 状態（最も長い時間窓に入る測定値とEWMA）と最新の統計をJSONに保存し、再起動後は測定値を再生して復元する
+#   「現在の8時間平均O3」のような値は snapshot() またはJSONの "snapshot" から読むだけで得られる
+
+STATS_DIR = os.path.join(DATA_DIR, "online_stats")
+
+DEFAULT_COLUMNS = ["AQI値", "PM2.5", "PM10", "O3", "NO2"]
+
+# 時間窓（名前 → 秒）とEWMAの半減期（名前 → 秒）
+WINDOWS = {"1h": 3600, "8h": 8 * 3600, "24h": 24 * 3600}
+EWMA_HALFLIVES = {"1h": 3600, "24h": 24 * 3600}
+
+# 変化率（slope）を求めるのに必要な測定値の件数と期間
+# 測定が2件だけ（欠測の直後や再起動の直後）の変化率は1件の外れ値で大きく振れ、アラートの誤発報につながる
+SLOPE_MIN_SAMPLES = 4
+SLOPE_MIN_SPAN = 3 * 3600
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _to_datetime(timestamp: float) -> datetime:
+    """エポック秒を日時に戻す（取り込み時と同じく、タイムゾーンなしの日時をUTCとして数えた秒）"""
+    return EPOCH + timedelta(seconds=timestamp)
+
+
+class RollingWindow:
+    """直近 seconds 秒の測定値の件数・平均・分散・最小・最大"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.samples = deque()   # (時刻, 値)
+        self._min = deque()      # 値が単調増加する (時刻, 値)
+        self._max = deque()      # 値が単調減少する (時刻, 値)
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def push(self, timestamp: float, value: float) -> None:
+        """
+        測定値を追加し、時間窓から外れた測定値を削除する
+
+        Args:
+            timestamp: 時刻（エポック秒、単調増加）
+            value: 値
+        """
+        self.samples.append((timestamp, value))
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((timestamp, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((timestamp, value))
+        self.expire(timestamp)
+
+    def expire(self, now: float) -> None:
+        """now - seconds 以前の測定値を削除"""
+        cutoff = now - self.seconds
+        while self.samples and self.samples[0][0] <= cutoff:
+            _, value = self.samples.popleft()
+            self.count -= 1
+            if self.count == 0:
+                self.mean, self._m2 = 0.0, 0.0
+            else:
+                delta = value - self.mean
+                self.mean -= delta / self.count
+                self._m2 = max(self._m2 - delta * (value - self.mean), 0.0)
+        while self._min and self._min[0][0] <= cutoff:
+            self._min.popleft()
+        while self._max and self._max[0][0] <= cutoff:
+            self._max.popleft()
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """件数・平均・分散（不偏）・標準偏差・最小・最大（測定値がない場合はNone）"""
+        if not self.count:
+            return {"count": 0, "mean": None, "var": None, "std": None, "min": None, "max": None}
+        var = self._m2 / (self.count - 1) if self.count > 1 else 0.0
+        return {"count": self.count, "mean": self.mean, "var": var, "std": math.sqrt(var),
+                "min": self._min[0][1], "max": self._max[0][1]}
+
+
+class Ewma:
+    """測定の間隔に応じて減衰させる指数移動平均"""
+
+    def __init__(self, halflife: float, value: Optional[float] = None, timestamp: Optional[float] = None):
+        self.halflife = halflife
+        self.value = value
+        self.timestamp = timestamp
+
+    def push(self, timestamp: float, value: float) -> None:
+        if self.value is None:
+            self.value = value
+        else:
+            # 前回からの経過時間が半減期に等しいとき、前回までの値の重みが1/2になる
+            alpha = 1 - 0.5 ** (max(timestamp - self.timestamp, 0.0) / self.halflife)
+            self.value += alpha * (value - self.value)
+        self.timestamp = timestamp
+
+
+class OnlineStats:
+    """列ごとの時間窓の統計とEWMA（スレッドセーフ）"""
+
+    def __init__(self, name: str = "aqi", stats_dir: str = STATS_DIR, columns: Optional[List[str]] = None,
+                 windows: Optional[Dict[str, float]] = None, halflives: Optional[Dict[str, float]] = None,
+                 time_column: str = "取得時間"):
+        """
+        初期化
+
+        Args:
+            name: ストア名（ファイル名の接頭辞）
+            stats_dir: 保存先ディレクトリ
+            columns: 対象の数値列
+            windows: 時間窓（名前 → 秒）
+            halflives: EWMAの半減期（名前 → 秒）
+            time_column: 元データの日時列
+        """
+        self.name = name
+        self.stats_dir = stats_dir
+        self.columns = columns or list(DEFAULT_COLUMNS)
+        self.windows = windows or dict(WINDOWS)
+        self.halflives = halflives or dict(EWMA_HALFLIVES)
+        self.time_column = time_column
+        self.state = None
+        self.meta = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.stats_dir, f"{self.name}_online_stats.json")
+
+    @property
+    def is_built(self) -> bool:
+        """一度でも集計したことがあるかどうか"""
+        return os.path.exists(self.path)
+
+    def _disk_version(self):
+        """保存済みファイルの版（inodeと更新時刻）。別のプロセスが書き換えた場合に変わる（ファイルがない場合はNone）"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _new_column(self) -> Dict[str, Any]:
+        return {"windows": {name: RollingWindow(seconds) for name, seconds in self.windows.items()},
+                "ewma": {name: Ewma(halflife) for name, halflife in self.halflives.items()},
+                "last": None}
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        保存済みの状態を読み込む（読み込み済みで、別のプロセスがファイルを書き換えていない場合は何もしない）
+        時間窓は保存した測定値を再生して復元する
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 列名 → 時間窓・EWMA・最新の値
+        """
+        version = self._disk_version()
+        if self.state is not None and version == self._version:
+            return self.state
+        self._version = version
+        self.state = {}
+        self.meta = {}
+        if not os.path.exists(self.path):
+            return self.state
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.meta = data.get("meta", {})
+        for column, saved in data.get("columns", {}).items():
+            state = self._new_column()
+            for timestamp, value in saved.get("samples", []):
+                for window in state["windows"].values():
+                    window.push(timestamp, value)
+            for name, (value, timestamp) in saved.get("ewma", {}).items():
+                if name in state["ewma"]:
+                    state["ewma"][name] = Ewma(self.halflives[name], value, timestamp)
+            state["last"] = saved.get("last")
+            self.state[column] = state
+        return self.state
+
+    @property
+    def last_ingested(self) -> Optional[str]:
+        """最後に取り込んだ行の時刻（ISO形式）"""
+        with self._lock:
+            self.load()
+            return self.meta.get("last_ingested")
+
+    def _prepare(self, df):
+        """元データを時刻順の時刻インデックス・数値列のDataFrameに変換（"non"などはNaN）"""
+        import pandas as pd
+
+        if isinstance(df, list):
+            df = pd.DataFrame(df)
+        data = df.set_index(self.time_column) if self.time_column in df.columns else df
+        data = data.set_axis(pd.to_datetime(data.index, errors="coerce"))
+        data = data[~data.index.isna()]
+        data = data[[c for c in self.columns if c in data.columns]].apply(pd.to_numeric, errors="coerce")
+        return data.sort_index(kind="stable")
+
+    def ingest(self, df, save: bool = True) -> int:
+        """
+        新しい行を時刻順に追加（前回までに取り込んだ最新時刻以前の行は無視する）
+
+        Args:
+            df: 元データ（time_columnの日時列、またはDatetimeIndexを持つ）。行の辞書のリストも可
+            save: Trueの場合はファイルに保存
+
+        Returns:
+            int: 取り込んだ行数
+        """
+        data = self._prepare(df)
+        with self._lock:
+            self.load()
+            return self._ingest(data, save)
+
+    def _ingest(self, data, save: bool) -> int:
+        """前処理済みの行を時刻順に追加（ロック取得済みで呼ぶ）"""
+        import pandas as pd
+
+        watermark = self.meta.get("last_ingested")
+        if watermark:
+            data = data[data.index > pd.Timestamp(watermark)]
+        if data.empty:
+            return 0
+        timestamps = data.index.as_unit("ns").asi8 / 1e9
+        # 最も長い時間窓より前の行はEWMAにだけ反映する（作り直すときに全行を時間窓に通さないため）
+        window_start = timestamps[-1] - max(self.windows.values(), default=0)
+        for column in data.columns:
+            state = self.state.setdefault(column, self._new_column())
+            values = data[column].to_numpy(dtype=float)
+            for timestamp, value in zip(timestamps.tolist(), values.tolist()):
+                if value != value:  # NaN
+                    continue
+                for ewma in state["ewma"].values():
+                    ewma.push(timestamp, value)
+                if timestamp > window_start:
+                    for window in state["windows"].values():
+                        window.push(timestamp, value)
+                state["last"] = [value, timestamp]
+            # 値のない行でも時刻は進むため、古い測定値を時間窓から外す
+            for window in state["windows"].values():
+                window.expire(timestamps[-1])
+        self.meta.update({
+            "last_ingested": data.index.max().isoformat(),
+            "rows": self.meta.get("rows", 0) + len(data),
+            "updated_at": datetime.now().isoformat(),
+        })
+        if save:
+            self._save()
+        return len(data)
+
+    def rebuild(self, df) -> int:
+        """
+        元データ全体から作り直す
+
+        Args:
+            df: 元データ
+
+        Returns:
+            int: 取り込んだ行数
+        """
+        data = self._prepare(df)
+        # 作り直しの途中で他のスレッドが取り込まないよう、初期化と取り込みを1回のロックで行う
+        with self._lock:
+            self.state = {}
+            self.meta = {}
+            return self._ingest(data, save=True)
+
+    def ensure_built(self, csv_path: str = CSV_FILE_PATH) -> bool:
+        """
+        まだ集計がない場合は、既存のCSV全体から作成する
+
+        Args:
+            csv_path: 元データのCSV
+
+        Returns:
+            bool: 作成した場合はTrue
+        """
+        import pandas as pd
+
+        if self.is_built or not os.path.exists(csv_path):
+            return False
+        rows = self.rebuild(pd.read_csv(csv_path, encoding="utf-8-sig"))
+        logger.info(f"移動統計を作成しました: {self.name}（{rows} 行）")
+        return True
+
+    def _snapshot(self) -> Dict[str, Any]:
+        """最新の統計（ロック取得済みで呼ぶ）"""
+        values = {}
+        for column, state in self.state.items():
+            entry = {"last": state["last"][0] if state["last"] else None,
+                     "last_time": _to_datetime(state["last"][1]).isoformat() if state["last"] else None}
+            entry.update({name: window.stats() for name, window in state["windows"].items()})
+            entry.update({f"ewma_{name}": ewma.value for name, ewma in state["ewma"].items()})
+            values[column] = entry
+        return {"time": self.meta.get("last_ingested"), "values": values}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        最新の統計
+
+        Returns:
+            dict: time（最後に取り込んだ行の時刻）と、列ごとの last（最新の値）、時間窓ごとの
+                count / mean / var / std / min / max、ewma_{半減期}
+        """
+        with self._lock:
+            self.load()
+            return self._snapshot()
+
+    def value(self, column: str, metric: str = "last") -> Optional[float]:
+        """
+        1つの統計の現在の値（全体のsnapshotを作らずにO(1)で読む）
+
+        Args:
+            column: 列名
+            metric: "last"（最新の値）、時間窓名（平均）、"時間窓名:count|mean|std|min|max|slope"、"ewma_半減期名"
+                slope は時間窓で最も古い測定値から最新の測定値までの1時間あたりの変化
+                （測定値が SLOPE_MIN_SAMPLES 件未満、または SLOPE_MIN_SPAN 秒に満たない場合はNone）
+
+        Returns:
+            Optional[float]: 値（測定値がない場合はNone）
+        """
+        with self._lock:
+            state = self.load().get(column)
+            if state is None:
+                return None
+            if metric == "last":
+                return state["last"][0] if state["last"] else None
+            if metric.startswith("ewma_"):
+                ewma = state["ewma"].get(metric[len("ewma_"):])
+                if ewma is None:
+                    raise KeyError(f"未知のEWMA: {metric}")
+                return ewma.value
+            window_name, _, field = metric.partition(":")
+            window = state["windows"].get(window_name)
+            if window is None:
+                raise KeyError(f"未知の時間窓: {metric}")
+            if field == "slope":
+                if window.count < SLOPE_MIN_SAMPLES:
+                    return None
+                (t0, v0), (t1, v1) = window.samples[0], window.samples[-1]
+                return (v1 - v0) / (t1 - t0) * 3600 if t1 - t0 >= SLOPE_MIN_SPAN else None
+            return window.stats()[field or "mean"]
+
+    def _save(self) -> None:
+        """状態と最新の統計を書き出す（ロック取得済みで呼ぶ）"""
+        longest = max(self.windows, key=self.windows.get) if self.windows else None
+        columns = {}
+        for column, state in self.state.items():
+            columns[column] = {
+                "samples": [list(s) for s in state["windows"][longest].samples] if longest else [],
+                "ewma": {name: [ewma.value, ewma.timestamp] for name, ewma in state["ewma"].items() if ewma.value is not None},
+                "last": state["last"],
+            }
+        os.makedirs(self.stats_dir, exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"meta": self.meta, "snapshot": self._snapshot(), "columns": columns},
+                      f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(self.path + ".tmp", self.path)
+        self._version = self._disk_version()
+
+
+def read_snapshot(path: str) -> Optional[Dict[str, Any]]:
+    """
+    保存済みのJSONから最新の統計だけを読む（別プロセスから参照する場合）
+
+    Args:
+        path: OnlineStats.path
+
+    Returns:
+        Optional[dict]: OnlineStats.snapshot() と同じ形式（ファイルがない場合はNone）
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("snapshot")
+    except (OSError, ValueError):
+        return None
+
+
+if __name__ == "__main__":
+    # python _online_stats.py rebuild [CSVのパス]   CSV全体から作り直す
+    # python _online_stats.py show                 最新の統計を表示
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    stats = OnlineStats()
+    if command == "rebuild":
+        import pandas as pd
+        csv_path = sys.argv[2] if len(sys.argv) > 2 else CSV_FILE_PATH
+        print(f"{stats.rebuild(pd.read_csv(csv_path, encoding='utf-8-sig'))} 行を集計しました")
+    elif command == "show":
+        print(json.dumps(stats.snapshot(), ensure_ascii=False, indent=2))
+    else:
+        print("使い方: python _online_stats.py rebuild [CSVのパス] | show")
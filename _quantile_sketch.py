@@ -0,0 +1,460 @@
+import os
+import sys
+import json
+import math
+import threading
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional
+from config import DATA_DIR, CSV_FILE_PATH, logger
+
+# 汚染物質の長期間の分布を、全データを読み直さずに答えるための分位点スケッチ
+# - 値を対数の幅のバケット（隣り合うバケットの比が一定）に数えるため、どの分位点も相対誤差 relative_accuracy 以内になる
+# - バケットの件数を足すだけで統合できるため、取得のたびの追加も、複数の観測地点の統合も結果が変わらない
+# - SketchStore は汚染物質ごとに、全期間・時間帯（0〜23時）・月のスケッチを持ち、取得のたびに新しい行だけを追加する
+
+SKETCH_DIR = os.path.join(DATA_DIR, "sketches")
+
+DEFAULT_COLUMNS = ["AQI値", "PM2.5", "PM10", "O3", "NO2"]
+
+# 分位点の相対誤差（1%）
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# これより絶対値の小さい値は0として数える
+MIN_VALUE = 1e-9
+
+
+class QuantileSketch:
+    """対数バケットによる統合可能な分位点スケッチ"""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        """
+        初期化
+
+        Args:
+            relative_accuracy: 分位点の相対誤差
+        """
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = {}  # バケット番号 → 件数
+        self.negative = {}  # 負の値は絶対値のバケット番号 → 件数
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _keys(self, values):
+        import numpy as np
+
+        return np.ceil(np.log(values) / self._log_gamma).astype(np.int64)
+
+    def _value(self, key: int) -> float:
+        """バケットの代表値（バケットの範囲のどの値に対しても相対誤差が最小になる値）"""
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    @staticmethod
+    def _add_counts(store: Dict[int, int], keys) -> None:
+        import numpy as np
+
+        unique, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(unique.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+
+    def add(self, values) -> int:
+        """
+        値を追加する（NaNは無視する）
+
+        Args:
+            values: 数値の配列
+
+        Returns:
+            int: 追加した件数
+        """
+        import numpy as np
+
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return 0
+        positive = values[values > MIN_VALUE]
+        negative = -values[values < -MIN_VALUE]
+        if len(positive):
+            self._add_counts(self.positive, self._keys(positive))
+        if len(negative):
+            self._add_counts(self.negative, self._keys(negative))
+        self.zero_count += int(len(values) - len(positive) - len(negative))
+        self.count += int(len(values))
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        return int(len(values))
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """
+        別のスケッチの件数を足し込む（別の観測地点や期間のスケッチとの統合）
+
+        Args:
+            other: 同じ relative_accuracy のスケッチ
+
+        Returns:
+            QuantileSketch: self
+        """
+        if not math.isclose(other.relative_accuracy, self.relative_accuracy):
+            raise ValueError(f"精度の異なるスケッチは統合できません: {self.relative_accuracy} と {other.relative_accuracy}")
+        for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _buckets(self):
+        """代表値の昇順に並べたバケット（代表値, 件数）"""
+        import numpy as np
+
+        negative_keys = sorted(self.negative, reverse=True)
+        positive_keys = sorted(self.positive)
+        values = [-self._value(k) for k in negative_keys] + ([0.0] if self.zero_count else []) \
+            + [self._value(k) for k in positive_keys]
+        counts = [self.negative[k] for k in negative_keys] + ([self.zero_count] if self.zero_count else []) \
+            + [self.positive[k] for k in positive_keys]
+        return np.asarray(values, dtype=float), np.asarray(counts, dtype=np.int64)
+
+    def quantiles(self, qs: Iterable[float]):
+        """
+        分位点を求める
+
+        Args:
+            qs: 0〜1の分位（例: [0.5, 0.9, 0.99]）
+
+        Returns:
+            np.ndarray: 分位点（データがない場合はNaN）
+        """
+        import numpy as np
+
+        qs = np.asarray(list(qs), dtype=float)
+        if not self.count:
+            return np.full(len(qs), np.nan)
+        values, counts = self._buckets()
+        ranks = qs * (self.count - 1)
+        index = np.searchsorted(np.cumsum(counts), ranks, side="right")
+        result = np.clip(values[np.minimum(index, len(values) - 1)], self.min, self.max)
+        result[qs <= 0] = self.min
+        result[qs >= 1] = self.max
+        return result
+
+    def quantile(self, q: float) -> float:
+        """1つの分位点"""
+        return float(self.quantiles([q])[0])
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else float("nan")
+
+    def histogram(self, edges):
+        """
+        区間ごとの件数（各バケットの件数を代表値の区間に数える）
+
+        Args:
+            edges: 区間の境界
+
+        Returns:
+            np.ndarray: 区間ごとの件数
+        """
+        import numpy as np
+
+        values, counts = self._buckets()
+        return np.histogram(values, bins=edges, weights=counts)[0]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """保存用の辞書（バケットは最小の番号と連続した件数のリストで表す）"""
+        def dense(store):
+            if not store:
+                return {"offset": 0, "counts": []}
+            offset = min(store)
+            return {"offset": offset, "counts": [store.get(k, 0) for k in range(offset, max(store) + 1)]}
+
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zero_count": self.zero_count,
+            "positive": dense(self.positive),
+            "negative": dense(self.negative),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        """to_dictの戻り値から復元"""
+        sketch = cls(data["relative_accuracy"])
+        for name in ("positive", "negative"):
+            stored = data.get(name) or {"offset": 0, "counts": []}
+            setattr(sketch, name, {stored["offset"] + i: c for i, c in enumerate(stored["counts"]) if c})
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        sketch.min = data["min"] if data.get("min") is not None else math.inf
+        sketch.max = data["max"] if data.get("max") is not None else -math.inf
+        return sketch
+
+
+class SketchStore:
+    """汚染物質ごとの全期間・時間帯・月のスケッチ（スレッドセーフ）"""
+
+    def __init__(self, name: str = "aqi", sketch_dir: Optional[str] = SKETCH_DIR, columns: Optional[List[str]] = None,
+                 time_column: str = "取得時間", relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        """
+        初期化
+
+        Args:
+            name: ストア名（観測地点ごとに分ける。ファイル名の接頭辞）
+            sketch_dir: 保存先ディレクトリ（Noneの場合はファイルを読み書きせず、メモリ上だけで集計する）
+            columns: 対象の数値列
+            time_column: 元データの日時列
+            relative_accuracy: 分位点の相対誤差
+        """
+        self.name = name
+        self.sketch_dir = sketch_dir
+        self.columns = columns or list(DEFAULT_COLUMNS)
+        self.time_column = time_column
+        self.relative_accuracy = relative_accuracy
+        self.sketches = None
+        self.meta = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Optional[str]:
+        """保存先のファイル（メモリ上だけで集計する場合はNone）"""
+        return os.path.join(self.sketch_dir, f"{self.name}_sketches.json") if self.sketch_dir is not None else None
+
+    @property
+    def is_built(self) -> bool:
+        """一度でも集計したことがあるかどうか"""
+        return self.path is not None and os.path.exists(self.path)
+
+    def _disk_version(self):
+        """保存済みファイルの版（inodeと更新時刻）。別のプロセスが書き換えた場合に変わる（ファイルがない場合はNone）"""
+        if self.path is None:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def load(self) -> Dict[str, Dict[str, QuantileSketch]]:
+        """
+        保存済みのスケッチを読み込む（読み込み済みで、別のプロセスがファイルを書き換えていない場合は何もしない）
+
+        Returns:
+            Dict[str, Dict[str, QuantileSketch]]: 列名 → "all" / "hour=13" / "month=2025-05" → スケッチ
+        """
+        version = self._disk_version()
+        if self.sketches is not None and version == self._version:
+            return self.sketches
+        self._version = version
+        self.sketches = {}
+        self.meta = {}
+        if self.is_built:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.meta = data.get("meta", {})
+            self.sketches = {column: {key: QuantileSketch.from_dict(s) for key, s in groups.items()}
+                             for column, groups in data.get("sketches", {}).items()}
+        return self.sketches
+
+    def _sketch(self, column: str, key: str) -> QuantileSketch:
+        groups = self.sketches.setdefault(column, {})
+        if key not in groups:
+            groups[key] = QuantileSketch(self.relative_accuracy)
+        return groups[key]
+
+    def _prepare(self, df):
+        """元データを時刻インデックス・数値列のDataFrameに変換（"non"などはNaN）"""
+        import pandas as pd
+
+        if isinstance(df, list):
+            df = pd.DataFrame(df)
+        data = df.set_index(self.time_column) if self.time_column in df.columns else df
+        data = data.set_axis(pd.to_datetime(data.index, errors="coerce"))
+        data = data[~data.index.isna()]
+        return data[[c for c in self.columns if c in data.columns]].apply(pd.to_numeric, errors="coerce")
+
+    def ingest(self, df, save: bool = True) -> int:
+        """
+        新しい行を追加（前回までに取り込んだ最新時刻以前の行は二重計上を避けるため無視する）
+
+        Args:
+            df: 元データ（time_columnの日時列、またはDatetimeIndexを持つ）。行の辞書のリストも可
+            save: Trueの場合はファイルに保存
+
+        Returns:
+            int: 取り込んだ行数
+        """
+        data = self._prepare(df)
+        with self._lock:
+            self.load()
+            return self._ingest(data, save)
+
+    def _ingest(self, data, save: bool) -> int:
+        """前処理済みの行を追加（ロック取得済みで呼ぶ）"""
+        import pandas as pd
+
+        watermark = self.meta.get("last_ingested")
+        if watermark:
+            data = data[data.index > pd.Timestamp(watermark)]
+        if data.empty:
+            return 0
+        hours = data.index.hour
+        months = data.index.strftime("%Y-%m")
+        for column in data.columns:
+            values = data[column].to_numpy(dtype=float)
+            self._sketch(column, "all").add(values)
+            for hour in sorted(set(hours)):
+                self._sketch(column, f"hour={hour}").add(values[hours == hour])
+            for month in sorted(set(months)):
+                self._sketch(column, f"month={month}").add(values[months == month])
+        self.meta.update({
+            "last_ingested": data.index.max().isoformat(),
+            "rows": self.meta.get("rows", 0) + len(data),
+            "updated_at": datetime.now().isoformat(),
+        })
+        if save:
+            self._save()
+        return len(data)
+
+    def rebuild(self, df) -> int:
+        """
+        元データ全体からスケッチを作り直す
+
+        Args:
+            df: 元データ
+
+        Returns:
+            int: 取り込んだ行数
+        """
+        data = self._prepare(df)
+        # 作り直しの途中で他のスレッドが取り込まないよう、初期化と取り込みを1回のロックで行う
+        with self._lock:
+            self.sketches = {}
+            self.meta = {}
+            return self._ingest(data, save=True)
+
+    def ensure_built(self, csv_path: str = CSV_FILE_PATH) -> bool:
+        """
+        まだスケッチがない場合は、既存のCSV全体から作成する
+
+        Args:
+            csv_path: 元データのCSV
+
+        Returns:
+            bool: 作成した場合はTrue
+        """
+        import pandas as pd
+
+        if self.is_built or not os.path.exists(csv_path):
+            return False
+        rows = self.rebuild(pd.read_csv(csv_path, encoding="utf-8-sig"))
+        logger.info(f"分位点スケッチを作成しました: {self.name}（{rows} 行）")
+        return True
+
+    def _save(self) -> None:
+        """スケッチとメタ情報を書き出す（ロック取得済みで呼ぶ。メモリ上だけで集計する場合は何もしない）"""
+        if self.path is None:
+            return
+        os.makedirs(self.sketch_dir, exist_ok=True)
+        data = {"meta": self.meta,
+                "sketches": {column: {key: sketch.to_dict() for key, sketch in groups.items()}
+                             for column, groups in self.sketches.items()}}
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(self.path + ".tmp", self.path)
+        self._version = self._disk_version()
+
+    def get(self, column: str, hour: Optional[int] = None, month: Optional[str] = None) -> QuantileSketch:
+        """
+        スケッチを取り出す（データがない場合は空のスケッチ）
+
+        Args:
+            column: 列名
+            hour: 時間帯（0〜23）
+            month: 月（"2025-05"）
+
+        Returns:
+            QuantileSketch: スケッチ
+        """
+        key = f"hour={hour}" if hour is not None else f"month={month}" if month is not None else "all"
+        with self._lock:
+            sketch = self.load().get(column, {}).get(key)
+        return sketch or QuantileSketch(self.relative_accuracy)
+
+    def percentiles(self, column: str, qs=(0.1, 0.5, 0.9), by: Optional[str] = None):
+        """
+        分位点の表
+
+        Args:
+            column: 列名
+            qs: 分位
+            by: "hour"（時間帯ごと）、"month"（月ごと）、None（全期間）
+
+        Returns:
+            pd.DataFrame: 行は時間帯・月（byがNoneの場合は "all" の1行）、列は count, mean と分位（"p50" など）
+        """
+        import pandas as pd
+
+        with self._lock:
+            groups = self.load().get(column, {})
+            prefix = f"{by}=" if by else None
+            items = [(key.split("=", 1)[1], sketch) for key, sketch in groups.items()
+                     if (prefix and key.startswith(prefix)) or (not prefix and key == "all")]
+        if by == "hour":
+            items = sorted(((int(k), s) for k, s in items), key=lambda item: item[0])
+        else:
+            items = sorted(items, key=lambda item: item[0])
+        rows = []
+        for key, sketch in items:
+            row = {by or "period": key, "count": sketch.count, "mean": sketch.mean}
+            row.update({f"p{q * 100:g}": v for q, v in zip(qs, sketch.quantiles(qs))})
+            rows.append(row)
+        return pd.DataFrame(rows).set_index(by or "period") if rows else pd.DataFrame()
+
+    def merge(self, other: "SketchStore") -> "SketchStore":
+        """
+        別の観測地点のスケッチを統合する（同じ列・時間帯・月のスケッチの件数を足し込む）
+
+        Args:
+            other: 別のストア
+
+        Returns:
+            SketchStore: self（保存はしない）
+        """
+        with self._lock:
+            self.load()
+            for column, groups in other.load().items():
+                for key, sketch in groups.items():
+                    self._sketch(column, key).merge(sketch)
+            self.meta["merged"] = sorted(set(self.meta.get("merged", [])) | {other.name})
+        return self
+
+
+if __name__ == "__main__":
+    # python _quantile_sketch.py rebuild [CSVのパス]     CSV全体からスケッチを作り直す
+    # python _quantile_sketch.py show 列名 [hour|month]  分位点を表示
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    store = SketchStore()
+    if command == "rebuild":
+        import pandas as pd
+        csv_path = sys.argv[2] if len(sys.argv) > 2 else CSV_FILE_PATH
+        print(f"{store.rebuild(pd.read_csv(csv_path, encoding='utf-8-sig'))} 行を集計しました")
+    elif command == "show" and len(sys.argv) > 2:
+        print(store.percentiles(sys.argv[2], qs=(0.05, 0.25, 0.5, 0.75, 0.95, 0.99),
+                                by=sys.argv[3] if len(sys.argv) > 3 else None).to_string())
+    else:
+        print("使い方: python _quantile_sketch.py rebuild [CSVのパス] | show 列名 [hour|month]")
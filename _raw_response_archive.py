@@ -0,0 +1,228 @@
+import os
+import sys
+import glob
+import gzip
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterator
+from config import DATA_DIR, logger
+
+# APIの生レスポンスを日ごとの圧縮JSONL（gzipメンバーの連結）に追記するアーカイブ
+# 1レスポンス = 1gzipメンバーとし、タイムスタンプとバイトオフセットのインデックスで1件だけ取り出せるようにする
+# 古いファイルは保持日数と合計サイズの上限で削除する
+
+RAW_RESPONSE_DIR = os.path.join(DATA_DIR, "raw_responses")
+LEGACY_DEBUG_DIR = os.path.join(DATA_DIR, "debug")
+
+
+class RawResponseArchive:
+    """APIの生レスポンスを保存・検索するアーカイブ（スレッドセーフ）"""
+
+    def __init__(self, source: str = "waqi", archive_dir: str = RAW_RESPONSE_DIR,
+                 retention_days: Optional[int] = 90, max_total_bytes: Optional[int] = 200 * 1024 * 1024):
+        """
+        初期化
+
+        Args:
+            source: データソース名（ファイル名の接頭辞とサブディレクトリ名に使用）
+            archive_dir: アーカイブのルートディレクトリ
+            retention_days: 保持日数（Noneの場合は日数で削除しない）
+            max_total_bytes: アーカイブの合計サイズの上限（Noneの場合はサイズで削除しない）
+        """
+        self.source = source
+        self.archive_dir = os.path.join(archive_dir, source)
+        self.retention_days = retention_days
+        self.max_total_bytes = max_total_bytes
+        self._lock = threading.Lock()
+        self._last_retention_date = None
+
+    def _data_path(self, date: datetime) -> str:
+        """指定日のアーカイブファイルのパスを返す"""
+        return os.path.join(self.archive_dir, f"{self.source}_{date.strftime('%Y%m%d')}.jsonl.gz")
+
+    def _index_path(self, date: datetime) -> str:
+        """指定日のインデックスファイルのパスを返す"""
+        return os.path.join(self.archive_dir, f"{self.source}_{date.strftime('%Y%m%d')}.idx")
+
+    def append(self, payload: Any, timestamp: Optional[datetime] = None,
+               meta: Optional[Dict[str, Any]] = None, retention: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        レスポンスを1件追記
+
+        Args:
+            payload: レスポンス本体（JSONに変換できる値）
+            timestamp: 取得時刻（Noneの場合は現在時刻）
+            meta: 一緒に保存する付加情報（URL、ステータスコードなど）
+            retention: Trueの場合は保持ポリシーを適用する（過去のレスポンスの取り込みではFalseにし、通常の書き込みに任せる）
+
+        Returns:
+            Dict[str, Any]: インデックスの内容（timestamp, file, offset, length）。失敗時はNone
+        """
+        timestamp = timestamp or datetime.now()
+        record = {"timestamp": timestamp.isoformat(), "source": self.source, "meta": meta or {}, "payload": payload}
+        member = gzip.compress((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+
+        try:
+            with self._lock:
+                os.makedirs(self.archive_dir, exist_ok=True)
+                data_path = self._data_path(timestamp)
+                with open(data_path, "ab") as f:
+                    offset = f.tell()
+                    f.write(member)
+                with open(self._index_path(timestamp), "a", encoding="utf-8") as f:
+                    f.write(f"{record['timestamp']}\t{offset}\t{len(member)}\n")
+
+                # 保持ポリシーの適用は1日1回だけ行う
+                if retention and self._last_retention_date != timestamp.date():
+                    self._last_retention_date = timestamp.date()
+                    self._apply_retention(timestamp)
+        except Exception as e:
+            logger.error(f"生レスポンスのアーカイブ中にエラーが発生しました: {e}")
+            return None
+
+        return {"timestamp": record["timestamp"], "file": data_path, "offset": offset, "length": len(member)}
+
+    def load_index(self, date: datetime) -> List[Dict[str, Any]]:
+        """
+        指定日のインデックスを読み込む
+
+        Args:
+            date: 対象日
+
+        Returns:
+            List[Dict[str, Any]]: インデックスのリスト（timestamp, offset, length）
+        """
+        index_path = self._index_path(date)
+        if not os.path.exists(index_path):
+            return []
+        entries = []
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) == 3:
+                    entries.append({"timestamp": parts[0], "offset": int(parts[1]), "length": int(parts[2])})
+        return entries
+
+    def get(self, timestamp: datetime) -> Optional[Dict[str, Any]]:
+        """
+        指定時刻以前で最も新しいレスポンスを1件だけ読み込む（同じ日の中で検索）
+
+        Args:
+            timestamp: 検索する時刻
+
+        Returns:
+            Dict[str, Any]: 保存したレコード（timestamp, source, meta, payload）。見つからない場合はNone
+        """
+        target = timestamp.isoformat()
+        candidates = [e for e in self.load_index(timestamp) if e["timestamp"] <= target]
+        if not candidates:
+            return None
+        entry = max(candidates, key=lambda e: e["timestamp"])
+        with open(self._data_path(timestamp), "rb") as f:
+            f.seek(entry["offset"])
+            member = f.read(entry["length"])
+        return json.loads(gzip.decompress(member).decode("utf-8"))
+
+    def iter_records(self, start: datetime, end: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """
+        指定期間のレスポンスを古い順に読み込む（再解析やリプレイ用）
+
+        Args:
+            start: 開始時刻
+            end: 終了時刻（含む）。Noneの場合は現在時刻
+
+        Yields:
+            Dict[str, Any]: 保存したレコード
+        """
+        end = end or datetime.now()
+        start_key, end_key = start.isoformat(), end.isoformat()
+        current = start
+        while current.date() <= end.date():
+            data_path = self._data_path(current)
+            if os.path.exists(data_path):
+                # gzipモジュールは連結されたメンバーを順に展開する
+                with gzip.open(data_path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        record = json.loads(line)
+                        if start_key <= record["timestamp"] <= end_key:
+                            yield record
+            current += timedelta(days=1)
+
+    def _apply_retention(self, now: datetime) -> None:
+        """保持日数と合計サイズの上限を超えたファイルを古い順に削除（ロック取得済みで呼ぶ）"""
+        day_files = sorted(glob.glob(os.path.join(self.archive_dir, f"{self.source}_*.jsonl.gz")))
+        today_path = self._data_path(now)
+
+        def remove(data_path):
+            for path in (data_path, data_path[:-len(".jsonl.gz")] + ".idx"):
+                if os.path.exists(path):
+                    os.remove(path)
+            logger.info(f"古い生レスポンスのアーカイブを削除しました: {os.path.basename(data_path)}")
+
+        remaining = []
+        for data_path in day_files:
+            date_str = os.path.basename(data_path)[len(self.source) + 1:len(self.source) + 9]
+            try:
+                file_date = datetime.strptime(date_str, "%Y%m%d")
+            except ValueError:
+                continue
+            if self.retention_days is not None and data_path != today_path \
+                    and (now - file_date).days > self.retention_days:
+                remove(data_path)
+            else:
+                remaining.append(data_path)
+
+        if self.max_total_bytes is None:
+            return
+        total = sum(os.path.getsize(p) for p in remaining)
+        for data_path in remaining:
+            if total <= self.max_total_bytes or data_path == today_path:
+                break
+            total -= os.path.getsize(data_path)
+            remove(data_path)
+
+    def migrate_legacy_files(self, legacy_dir: str = LEGACY_DEBUG_DIR, delete: bool = False) -> int:
+        """
+        旧形式の data/debug/api_response_<YYYYmmdd_HHMMSS>.json をアーカイブに取り込む
+        取り込みの途中では保持ポリシーを適用しない（過去の時刻を基準に、取り込んだばかりのファイルを削除しないため）。
+        保持日数を過ぎたファイルは、次の通常の書き込みで削除される
+
+        Args:
+            legacy_dir: 旧形式のファイルがあるディレクトリ
+            delete: 取り込んだファイルを削除するかどうか
+
+        Returns:
+            int: 取り込んだファイル数
+        """
+        count = 0
+        for path in sorted(glob.glob(os.path.join(legacy_dir, "api_response_*.json"))):
+            name = os.path.basename(path)[len("api_response_"):-len(".json")]
+            try:
+                timestamp = datetime.strptime(name, "%Y%m%d_%H%M%S")
+                with open(path, "r", encoding="utf-8") as f:
+                    payload = json.load(f)
+            except Exception as e:
+                logger.warning(f"{path} を取り込めませんでした: {e}")
+                continue
+            if self.append(payload, timestamp, meta={"migrated_from": name}, retention=False) is None:
+                continue
+            if delete:
+                os.remove(path)
+            count += 1
+        logger.info(f"{count} 件の旧形式のレスポンスをアーカイブに取り込みました")
+        return count
+
+
+if __name__ == "__main__":
+    # python _raw_response_archive.py migrate [--delete]  旧形式のファイルを取り込む
+    # python _raw_response_archive.py show YYYYmmddHHMMSS  指定時刻以前の最新レスポンスを表示
+    archive = RawResponseArchive()
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "migrate":
+        archive.migrate_legacy_files(delete="--delete" in sys.argv)
+    elif command == "show" and len(sys.argv) > 2:
+        record = archive.get(datetime.strptime(sys.argv[2], "%Y%m%d%H%M%S"))
+        print(json.dumps(record, ensure_ascii=False, indent=2) if record else "レスポンスが見つかりません")
+    else:
+        print("使い方: python _raw_response_archive.py migrate [--delete] | show YYYYmmddHHMMSS")
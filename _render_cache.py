@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import inspect
+from typing import Dict, Any, Iterable, List, Optional
+from config import DATA_DIR, logger
+
+# 分析の図のキャッシュ
+# キーは（入力データのフィンガープリント、描画関数（コードを含む）、パラメータ、出力先ディレクトリ）
+# 同じキーで描画済みの図が残っていれば、描画せずにそのファイルを返す
+# 古いエントリは件数と最終利用日時で削除し、どのエントリからも参照されなくなった図のファイルも削除する
+# キャッシュを使わずに描き直す場合は RENDER_CACHE_PATH のファイルを削除する
+
+RENDER_CACHE_PATH = os.path.join(DATA_DIR, "render_cache.json")
+
+# 保持するエントリ数と、最後に使われてからの保持日数
+RENDER_CACHE_MAX_ENTRIES = 500
+RENDER_CACHE_MAX_AGE_DAYS = 30
+
+
+def file_fingerprint(paths: Iterable[str]) -> str:
+    """
+    入力ファイルの内容のSHA-256（複数のファイルはまとめて1つの値にする）
+
+    Args:
+        paths: 入力ファイルのパス（存在しないファイルは「なし」として扱う）
+
+    Returns:
+        str: 16進数のハッシュ値
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.abspath(path).encode("utf-8"))
+        if not os.path.exists(path):
+            digest.update(b"<missing>")
+            continue
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _update_value(digest, value) -> None:
+    """値の内容をハッシュに加える（DataFrameやndarrayは中身、それ以外はrepr）"""
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(type(value).__name__.encode("utf-8"))
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode("utf-8"))
+        digest.update(repr(value.dtypes if isinstance(value, pd.DataFrame) else value.dtype).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype, value.shape)).encode("utf-8"))
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(repr(key).encode("utf-8"))
+            _update_value(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}:{len(value)}".encode("utf-8"))
+        for item in value:
+            _update_value(digest, item)
+    else:
+        digest.update(repr(value).encode("utf-8"))
+
+
+def data_fingerprint(value) -> str:
+    """
+    メモリ上のデータ（DataFrame・配列・辞書・リストなど）の内容のハッシュ
+
+    Args:
+        value: 対象のデータ
+
+    Returns:
+        str: 16進数のハッシュ値
+    """
+    digest = hashlib.sha256()
+    _update_value(digest, value)
+    return digest.hexdigest()
+
+
+def function_fingerprint(func) -> str:
+    """描画関数の名前とソースコードのハッシュ（関数を書き換えるとキーが変わる）"""
+    try:
+        source = inspect.getsource(func)
+    except (OSError, TypeError):
+        source = repr(getattr(getattr(func, "__code__", None), "co_code", func))
+    name = f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', repr(func))}"
+    return hashlib.sha256(f"{name}\n{source}".encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """描画済みの図のインデックス（キー → 図のファイル）"""
+
+    def __init__(self, index_path: str = RENDER_CACHE_PATH, max_entries: int = RENDER_CACHE_MAX_ENTRIES,
+                 max_age_days: float = RENDER_CACHE_MAX_AGE_DAYS):
+        """
+        初期化
+
+        Args:
+            index_path: インデックスのJSONファイル
+            max_entries: 保持するエントリ数
+            max_age_days: 最後に使われてからこの日数を過ぎたエントリは削除
+        """
+        self.index_path = index_path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.entries = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """インデックスを読み込む（壊れている場合は空として扱う）"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def key(input_fingerprint: str, func, kwargs: Optional[Dict[str, Any]], output_path: str) -> str:
+        """
+        キャッシュのキーを作成
+
+        Args:
+            input_fingerprint: 入力データのフィンガープリント（file_fingerprint / data_fingerprint）
+            func: 描画関数
+            kwargs: 描画関数に渡すパラメータ
+            output_path: 出力先（ディレクトリのみキーに含める。ファイル名の時刻は含めない）
+
+        Returns:
+            str: キー
+        """
+        digest = hashlib.sha256()
+        digest.update(input_fingerprint.encode("utf-8"))
+        digest.update(function_fingerprint(func).encode("utf-8"))
+        digest.update(data_fingerprint(kwargs or {}).encode("utf-8"))
+        digest.update(os.path.abspath(os.path.dirname(output_path)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        描画済みの図のパスを返す（ファイルが消えているか、書き換えられている場合はNone）
+
+        Args:
+            key: RenderCache.keyの戻り値
+
+        Returns:
+            Optional[str]: 図のパス
+        """
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        try:
+            stat = os.stat(entry["path"])
+        except OSError:
+            del self.entries[key]
+            return None
+        if stat.st_size != entry.get("size") or stat.st_mtime_ns != entry.get("mtime_ns"):
+            del self.entries[key]
+            return None
+        entry["last_used"] = time.time()
+        return entry["path"]
+
+    def put(self, key: str, name: str, path: str) -> None:
+        """
+        描画した図を登録（同じパスを指す古いエントリは置き換える）
+
+        Args:
+            key: RenderCache.keyの戻り値
+            name: 図の名前（ログ用）
+            path: 図のパス
+        """
+        stat = os.stat(path)
+        for old_key in [k for k, e in self.entries.items() if e.get("path") == path]:
+            del self.entries[old_key]
+        now = time.time()
+        self.entries[key] = {"name": name, "path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                             "created": now, "last_used": now}
+
+    def evict(self, keep: Iterable[str] = ()) -> List[str]:
+        """
+        古いエントリを削除し、参照されなくなった図のファイルも削除する
+
+        Args:
+            keep: 削除しないキー（今回の実行で使ったキー）
+
+        Returns:
+            List[str]: 削除したファイルのパス
+        """
+        keep = set(keep)
+        cutoff = time.time() - self.max_age_days * 86400
+        candidates = sorted((k for k in self.entries if k not in keep), key=lambda k: self.entries[k]["last_used"])
+        excess = max(0, len(self.entries) - self.max_entries)
+        evicted = []
+        for k in candidates:
+            if self.entries[k]["last_used"] < cutoff or excess > 0:
+                evicted.append(self.entries.pop(k))
+                excess -= 1
+
+        referenced = {e["path"] for e in self.entries.values()}
+        removed = []
+        for entry in evicted:
+            if entry["path"] not in referenced and os.path.exists(entry["path"]):
+                try:
+                    os.remove(entry["path"])
+                    removed.append(entry["path"])
+                except OSError as e:
+                    logger.error(f"キャッシュの図を削除できませんでした: {entry['path']}: {e}")
+        return removed
+
+    def save(self) -> None:
+        """インデックスを保存（他のプロセスが同時に追加したエントリは残す）"""
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        # 読み込みから書き込みまでをロックする（同時に保存した他のプロセスのエントリを上書きで失わないため）
+        with open(self.index_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            merged = self._load()
+            merged.update(self.entries)
+            # 自分が削除・置き換えたエントリは他のプロセスの分から戻さない
+            paths = {e["path"]: k for k, e in self.entries.items()}
+            merged = {k: e for k, e in merged.items()
+                      if k in self.entries or (e.get("path") not in paths and os.path.exists(e.get("path", "")))}
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": merged}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.index_path)
+        self.entries = merged
@@ -0,0 +1,144 @@
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Callable, List, NamedTuple, Optional
+from config import logger
+
+# 分析レポートの図を、共有の読み取り専用データに対する独立したタスクとしてプロセスプールで描画する
+# - 各タスクは data（全タスク共通の辞書）と kwargs を受け取り、matplotlibのFigureを返すモジュールレベルの関数
+# - データはワーカーの起動時に1回だけ渡し、タスクごとには送らない
+# - ワーカーはAggバックエンドで描画し、保存後に図を閉じる
+# - cache を渡すと、入力データ・描画関数・パラメータが前回と同じ図は描画せずに既存のファイルを返す（_render_cache.py）
+# - ワーカーが異常終了した場合（メモリ不足で強制終了された場合など）は、描画できなかった図を同じプロセスで順に描画する
+# タスクの関数はpickleできる必要があるため、スクリプトのトップレベルに定義し、
+# スクリプト側の処理は if __name__ == "__main__" の中で実行する（spawn方式でワーカーが再importするため）
+
+
+class FigureTask(NamedTuple):
+    """1枚の図の描画タスク"""
+    name: str
+    func: Callable[..., Any]
+    output_path: str
+    kwargs: Optional[Dict[str, Any]] = None
+
+
+# ワーカーごとに保持する共有データ
+_shared_data = None
+
+
+def _init_worker(data: Dict[str, Any]) -> None:
+    """ワーカーの初期化（Aggバックエンドへの切り替えと共有データの保持）"""
+    global _shared_data
+    import matplotlib
+    matplotlib.use("Agg")
+    try:
+        import japanize_matplotlib  # noqa: F401
+    except ImportError:
+        pass
+    _shared_data = data
+
+
+def _render_task(task: FigureTask, data: Optional[Dict[str, Any]] = None):
+    """
+    1枚の図を描画して保存する
+
+    Returns:
+        tuple: (タスク名, 保存先またはNone, エラー内容またはNone, 所要時間（秒）)
+    """
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    try:
+        fig = task.func(_shared_data if data is None else data, **(task.kwargs or {}))
+        fig = fig if fig is not None else plt.gcf()
+        os.makedirs(os.path.dirname(task.output_path) or ".", exist_ok=True)
+        fig.savefig(task.output_path)
+        return task.name, task.output_path, None, time.perf_counter() - start
+    except Exception:
+        return task.name, None, traceback.format_exc(), time.perf_counter() - start
+    finally:
+        plt.close("all")
+
+
+def default_workers(task_count: int) -> int:
+    """タスク数とCPUコア数の小さい方（環境変数 REPORT_WORKERS で上書き可能）"""
+    workers = int(os.getenv("REPORT_WORKERS", "0")) or os.cpu_count() or 1
+    return max(1, min(task_count, workers))
+
+
+def render_figures(tasks: List[FigureTask], data: Dict[str, Any], max_workers: Optional[int] = None,
+                   cache=None, inputs: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+    """
+    図の描画タスクをまとめて実行する
+
+    Args:
+        tasks: 描画タスク
+        data: 全タスクで共有する読み取り専用のデータ（DataFrameなど）
+        max_workers: 並列数（Noneの場合は描画が必要なタスク数とCPUコア数の小さい方、1の場合は同じプロセスで順に描画）
+        cache: _render_cache.RenderCache（Noneの場合はキャッシュを使わない）
+        inputs: 入力ファイルのパス。キャッシュのキーに内容のハッシュを使う（Noneの場合はdataの内容のハッシュ）
+
+    Returns:
+        Dict[str, Optional[str]]: タスク名 → 保存先（キャッシュを使った場合は既存のファイル、失敗した場合はNone）。タスクの順番を保つ
+    """
+    if not tasks:
+        return {}
+    start = time.perf_counter()
+
+    results = {}
+    keys = {}
+    pending = list(tasks)
+    if cache is not None:
+        from _render_cache import file_fingerprint, data_fingerprint
+        fingerprint = file_fingerprint(inputs) if inputs else data_fingerprint(data)
+        pending = []
+        for task in tasks:
+            keys[task.name] = cache.key(fingerprint, task.func, task.kwargs, task.output_path)
+            cached_path = cache.get(keys[task.name])
+            if cached_path:
+                results[task.name] = cached_path
+            else:
+                pending.append(task)
+
+    workers = max_workers or default_workers(len(pending))
+    outcomes = []
+    if not pending:
+        pass
+    elif workers <= 1:
+        for task in pending:
+            outcomes.append(_render_task(task, data))
+    else:
+        broken = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as executor:
+            futures = {executor.submit(_render_task, task): task for task in pending}
+            for future in as_completed(futures):
+                try:
+                    outcomes.append(future.result())
+                except BrokenProcessPool as e:
+                    # プールが壊れると、完了していない全てのタスクがこの例外で終わる
+                    logger.error(f"図 {futures[future].name} の描画中にワーカープロセスが異常終了しました: {e}")
+                    broken.append(futures[future])
+        if broken:
+            logger.warning(f"描画できなかった {len(broken)} 枚の図を同じプロセスで順に描画します")
+            for task in sorted(broken, key=pending.index):
+                outcomes.append(_render_task(task, data))
+
+    for name, path, error, elapsed in outcomes:
+        if error:
+            logger.error(f"図 {name} の描画中にエラーが発生しました:\n{error}")
+        else:
+            logger.debug(f"図 {name} を描画しました（{elapsed:.2f} 秒）: {path}")
+            if cache is not None:
+                cache.put(keys[name], name, path)
+        results[name] = path
+
+    if cache is not None:
+        for removed in cache.evict(keep=keys.values()):
+            logger.info(f"古いキャッシュの図を削除しました: {removed}")
+        cache.save()
+
+    logger.info(f"{len(pending)} 枚の図を {workers} プロセスで描画しました（キャッシュ {len(tasks) - len(pending)} 枚、"
+                f"{time.perf_counter() - start:.2f} 秒、失敗 {sum(1 for p in results.values() if p is None)} 枚）")
+    return {task.name: results.get(task.name) for task in tasks}
@@ -0,0 +1,241 @@
+import os
+import sys
+import glob
+import json
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from PIL import Image
+from config import DATA_DIR, logger
+
+# カメラごとに、画像のうち空が写る範囲（スカイマスク）を複数のフレームから一度だけ求めて保存する
+# - 日中のフレームを縮小して重ね、画素ごとの明るさ・青さ（時間方向の中央値）と、フレーム全体の明るさで正規化した
+#   明るさの時間方向のばらつき（雲が流れる空は大きく、建物・地面は小さい）から空らしさを求める
+# - 空らしい画素のうち画像の上端につながる領域を空とし、その外接矩形（画像サイズに対する割合）を保存する
+# - 分析器は画像を縮小する前にこの矩形で切り抜く（地面・建物・海を送らないため、送るバイト数とトークン数が減り、
+#   同じ画像サイズで空をより細かく送れる）
+
+SKY_MASK_DIR = os.path.join(DATA_DIR, "sky_masks")
+
+# マスクを求める画像サイズ（幅, 高さ）と、使うフレームの数
+MASK_SIZE = (160, 90)
+MAX_FRAMES = 48
+MIN_FRAMES = 8
+# これより暗いフレーム（夜間）は使わない（0〜1の平均の明るさ）
+MIN_FRAME_BRIGHTNESS = 0.25
+# 空とみなす青さ（B / (R + G + B)）
+MIN_BLUE_RATIO = 0.36
+# 外接矩形に含める行・列の空の割合、矩形の余白（画像サイズに対する割合）
+MIN_LINE_FRACTION = 0.2
+BOX_MARGIN = 0.02
+# 空の矩形がこれより小さい場合はマスクを使わない（画像サイズに対する面積の割合）
+MIN_BOX_AREA = 0.1
+# この日数より古いマスクは作り直す（カメラの向きが変わる場合があるため）
+MAX_AGE_DAYS = 30
+
+
+def _load_frame(path: str) -> "np.ndarray":
+    """縮小したRGB画像（0〜1のfloat32）"""
+    import numpy as np
+
+    img = Image.open(path)
+    img.draft("RGB", (MASK_SIZE[0] * 2, MASK_SIZE[1] * 2))
+    return np.asarray(img.convert("RGB").resize(MASK_SIZE, Image.BILINEAR), dtype=np.float32) / 255.0
+
+
+def compute_sky_mask(image_paths: List[str]) -> Tuple["np.ndarray", Dict[str, Any]]:
+    """
+    複数のフレームから空の画素を求める
+
+    Args:
+        image_paths: 同じカメラのフレームのパス
+
+    Returns:
+        Tuple[np.ndarray, Dict[str, Any]]: MASK_SIZE の真偽値の配列（空がTrue）と、使ったフレーム数などの情報
+    """
+    import numpy as np
+    from scipy import ndimage
+
+    frames = []
+    for path in image_paths:
+        try:
+            frame = _load_frame(path)
+        except Exception as e:
+            logger.error(f"スカイマスク用の画像を読み込めません: {path}: {e}")
+            continue
+        if frame.mean() >= MIN_FRAME_BRIGHTNESS:
+            frames.append(frame)
+    if len(frames) < MIN_FRAMES:
+        raise ValueError(f"スカイマスクを求めるには日中のフレームが足りません（{len(frames)} / {MIN_FRAMES} 枚）")
+
+    stack = np.stack(frames)                                   # (フレーム, 高さ, 幅, RGB)
+    gray = stack @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    brightness = np.median(gray, axis=0)
+    blue_ratio = np.median(stack[..., 2] / (stack.sum(axis=3) + 1e-6), axis=0)
+    # フレーム全体の明るさの変化（日照）を除いた、画素ごとの明るさのばらつき
+    relative = gray / (gray.mean(axis=(1, 2), keepdims=True) + 1e-6)
+    variation = relative.std(axis=0)
+
+    def standardize(values):
+        return (values - values.mean()) / (values.std() + 1e-6)
+
+    # 青い画素、または明るく（曇天の空）ばらつきの大きい画素を空らしいとみなす
+    score = standardize(brightness) + standardize(variation)
+    candidate = (blue_ratio >= MIN_BLUE_RATIO) | (score > 0.5)
+    # 小さな点を除き、細い隙間（電線など）を埋める（端の画素が削れないよう、端を複製してから処理する）
+    pad = 3
+    padded = np.pad(candidate, pad, mode="edge")
+    padded = ndimage.binary_closing(ndimage.binary_opening(padded, iterations=1), iterations=2)
+    candidate = padded[pad:-pad, pad:-pad]
+
+    # 上端につながる領域だけを残す（海・水面など、空から離れた青い領域を除く）
+    labels, _ = ndimage.label(candidate)
+    top_labels = np.unique(labels[0][labels[0] > 0])
+    mask = np.isin(labels, top_labels)
+    return mask, {"frames": len(frames), "sky_fraction": float(mask.mean())}
+
+
+def mask_bounding_box(mask) -> Optional[List[float]]:
+    """
+    空の外接矩形（画像サイズに対する割合）
+
+    Args:
+        mask: compute_sky_mask() のマスク
+
+    Returns:
+        Optional[List[float]]: [左, 上, 右, 下]（0〜1）。空が小さすぎる場合はNone
+    """
+    import numpy as np
+
+    height, width = mask.shape
+    rows = np.flatnonzero(mask.mean(axis=1) >= MIN_LINE_FRACTION)
+    if rows.size == 0:
+        return None
+    cols = np.flatnonzero(mask[rows.min():rows.max() + 1].mean(axis=0) >= MIN_LINE_FRACTION)
+    if cols.size == 0:
+        return None
+    box = [max(cols.min() / width - BOX_MARGIN, 0.0), max(rows.min() / height - BOX_MARGIN, 0.0),
+           min((cols.max() + 1) / width + BOX_MARGIN, 1.0), min((rows.max() + 1) / height + BOX_MARGIN, 1.0)]
+    if (box[2] - box[0]) * (box[3] - box[1]) < MIN_BOX_AREA:
+        return None
+    return [round(float(v), 4) for v in box]
+
+
+class SkyMask:
+    """カメラごとの空の範囲（保存済みの場合は読み込み、なければフレームから作る）"""
+
+    def __init__(self, camera: str, mask_dir: str = SKY_MASK_DIR, max_age_days: int = MAX_AGE_DAYS):
+        """
+        初期化
+
+        Args:
+            camera: カメラ名（ファイル名に使う）
+            mask_dir: 保存先ディレクトリ
+            max_age_days: この日数より古いマスクは ensure_built() で作り直す
+        """
+        self.camera = camera
+        self.mask_dir = mask_dir
+        self.max_age_days = max_age_days
+        self.info = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.mask_dir, f"{self.camera}_sky_mask.json")
+
+    @property
+    def image_path(self) -> str:
+        """確認用のマスク画像（白が空）"""
+        return os.path.join(self.mask_dir, f"{self.camera}_sky_mask.png")
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        保存済みのマスクの情報を読み込む（読み込み済みの場合は何もしない）
+
+        Returns:
+            Optional[Dict[str, Any]]: box, frames, sky_fraction, built_at（保存されていない場合はNone）
+        """
+        if self.info is None and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.info = json.load(f)
+        return self.info
+
+    @property
+    def box(self) -> Optional[List[float]]:
+        """空の外接矩形 [左, 上, 右, 下]（画像サイズに対する割合、マスクがない場合はNone）"""
+        info = self.load()
+        return info.get("box") if info else None
+
+    def build(self, image_paths: List[str]) -> Optional[List[float]]:
+        """
+        フレームからマスクを作って保存する
+
+        Args:
+            image_paths: 同じカメラのフレームのパス（MAX_FRAMES を超える場合は等間隔に選ぶ）
+
+        Returns:
+            Optional[List[float]]: 空の外接矩形（空が小さすぎる場合はNone）
+        """
+        import numpy as np
+
+        if len(image_paths) > MAX_FRAMES:
+            step = len(image_paths) / MAX_FRAMES
+            image_paths = [image_paths[int(i * step)] for i in range(MAX_FRAMES)]
+        mask, info = compute_sky_mask(image_paths)
+        box = mask_bounding_box(mask)
+        self.info = dict(info, camera=self.camera, box=box, built_at=datetime.now().isoformat(timespec="seconds"))
+        os.makedirs(self.mask_dir, exist_ok=True)
+        Image.fromarray(mask.astype(np.uint8) * 255).save(self.image_path)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.info, f, ensure_ascii=False, indent=2)
+        os.replace(self.path + ".tmp", self.path)
+        logger.info(f"スカイマスクを作成しました: {self.camera}（{info['frames']} 枚、空の範囲 {box}）")
+        return box
+
+    def ensure_built(self, image_dir: str) -> bool:
+        """
+        マスクがない、または古い場合は image_dir のフレームから作る（フレームが足りない場合は作らない）
+
+        Args:
+            image_dir: カメラのフレームのディレクトリ
+
+        Returns:
+            bool: 作成した場合はTrue
+        """
+        info = self.load()
+        if info and datetime.now() - datetime.fromisoformat(info["built_at"]) < timedelta(days=self.max_age_days):
+            return False
+        # ファイル名は撮影時刻（YYYYMMDDHHMMSS.jpg）のため、名前順の末尾が新しいフレーム
+        image_paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")))[-MAX_FRAMES * 10:]
+        try:
+            self.build(image_paths)
+            return True
+        except ValueError as e:
+            logger.error(f"スカイマスクを作成できませんでした: {self.camera}: {e}")
+            return False
+
+    def crop(self, img: Image.Image) -> Image.Image:
+        """
+        画像を空の外接矩形で切り抜く（マスクがない場合はそのまま返す）
+
+        Args:
+            img: PILの画像
+
+        Returns:
+            Image.Image: 切り抜いた画像
+        """
+        box = self.box
+        if not box:
+            return img
+        width, height = img.size
+        return img.crop((round(box[0] * width), round(box[1] * height),
+                         round(box[2] * width), round(box[3] * height)))
+
+
+if __name__ == "__main__":
+    # python _sky_mask.py カメラ名 画像のディレクトリ   マスクを作り直して空の範囲を表示
+    if len(sys.argv) < 3:
+        print("使い方: python _sky_mask.py カメラ名 画像のディレクトリ")
+        sys.exit(1)
+    sky_mask = SkyMask(sys.argv[1])
+    sky_mask.build(sorted(glob.glob(os.path.join(sys.argv[2], "*.jpg")))[-MAX_FRAMES * 10:])
+    print(json.dumps(sky_mask.info, ensure_ascii=False, indent=2))
+    print(f"マスク画像: {sky_mask.image_path}")
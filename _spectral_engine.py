@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Tuple
+from scipy.signal import find_peaks, lombscargle
+
+# 複数パラメータの時系列をまとめて周波数解析するエンジン
+# - 不規則な取得時刻・重複・欠測を含むデータを1つの等間隔グリッドに揃える（短い欠測のみ線形補間）
+# - 欠測が少なければ2次元配列に対してrfftを一括で実行、多ければ観測点のみでLomb-Scargleを使う
+# - ピーク検出は scipy.signal.find_peaks、再構成は全パラメータを1回のirfft（または最小二乗）で行う
+# 周波数の単位は「1/サンプル間隔」（1時間グリッドなら1/時間）
+
+# auto モードでLomb-Scargleに切り替える欠測率
+LOMBSCARGLE_GAP_RATIO = 0.2
+
+
+def build_grid(df: pd.DataFrame, columns: List[str], freq: str = "h", time_column: Optional[str] = None,
+               max_gap: Optional[int] = 6) -> pd.DataFrame:
+    """
+    不規則な時系列を等間隔グリッドに揃える
+
+    Args:
+        df: 元データ（DatetimeIndex、またはtime_columnに日時を持つ）
+        columns: 対象のパラメータ列
+        freq: グリッドの間隔（pandasの頻度文字列）
+        time_column: 日時の列名（Noneの場合はインデックスを使用）
+        max_gap: 線形補間で埋める最大の連続欠測数（これより長い欠測はNaNのまま残す。Noneの場合は全て補間）
+
+    Returns:
+        pd.DataFrame: グリッド上の値（同じ時刻の重複は平均、長い欠測はNaN）
+    """
+    data = df.set_index(time_column) if time_column else df
+    data = data[[c for c in columns if c in data.columns]].apply(pd.to_numeric, errors="coerce")
+    data = data[~data.index.isna()].sort_index()
+    # 重複した取得時刻はresampleの平均でまとめられる
+    grid = data.resample(freq).mean()
+    interpolated = grid.interpolate(method="linear", limit_area="inside")
+    if max_gap is None:
+        return interpolated
+
+    # 欠測の連続長を列ごとに求め、max_gap以下の欠測だけ補間値を採用する
+    missing = grid.isna()
+    run_length = missing.apply(lambda col: col.groupby((~col).cumsum()).transform("sum"))
+    return interpolated.where(~missing | (run_length <= max_gap))
+
+
+def batch_rfft(values: np.ndarray, sampling_freq: float = 1.0) -> Dict[str, np.ndarray]:
+    """
+    2次元配列（パラメータ×時刻）の各行に対してrfftを一括実行
+
+    Args:
+        values: 形状 (P, N) の配列。NaNは各行の平均で埋める（平均除去後は0）
+        sampling_freq: サンプリング周波数
+
+    Returns:
+        Dict[str, np.ndarray]: freqs (F,), amplitudes (P, F), phases (P, F), spectrum (P, F), means (P,)
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    n = values.shape[1]
+    means = np.nanmean(values, axis=1) if n else np.zeros(values.shape[0])
+    centered = np.nan_to_num(values - means[:, None], nan=0.0)
+    spectrum = np.fft.rfft(centered, axis=1)
+    return {
+        "freqs": np.fft.rfftfreq(n, d=1 / sampling_freq),
+        "amplitudes": 2.0 / n * np.abs(spectrum),
+        "phases": np.angle(spectrum),
+        "spectrum": spectrum,
+        "means": means,
+    }
+
+
+def lomb_scargle_amplitudes(times: np.ndarray, values: np.ndarray, freqs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    観測点のみを使ってLomb-Scargleで振幅スペクトルを計算（行ごとに観測点が異なるため行単位で処理）
+
+    Args:
+        times: 観測時刻（サンプル間隔単位、形状 (N,)）
+        values: 形状 (P, N) の配列（NaNは欠測）
+        freqs: 評価する周波数（0を含まない）
+
+    Returns:
+        tuple: (amplitudes (P, F), means (P,))
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    amplitudes = np.zeros((values.shape[0], len(freqs)))
+    means = np.zeros(values.shape[0])
+    angular = 2 * np.pi * freqs
+    for row, series in enumerate(values):
+        observed = ~np.isnan(series)
+        if observed.sum() < 4:
+            continue
+        means[row] = series[observed].mean()
+        power = lombscargle(times[observed], series[observed] - means[row], angular)
+        # 正規化なしのパワーから正弦波の振幅に換算（FFTの 2/N*|X| と同じ尺度）
+        amplitudes[row] = np.sqrt(4 * power / observed.sum())
+    return amplitudes, means
+
+
+def find_dominant_frequencies_batch(freqs: np.ndarray, amplitudes: np.ndarray, n_peaks: int = 5,
+                                    min_dist: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    各行の振幅スペクトルから主要な周波数を抽出（直流成分は除外）
+
+    Args:
+        freqs: 周波数配列 (F,)
+        amplitudes: 振幅 (P, F)
+        n_peaks: 行ごとに抽出するピーク数
+        min_dist: ピーク間の最小距離（ビン数）
+
+    Returns:
+        tuple: (主要周波数 (P, n_peaks), 振幅 (P, n_peaks))。見つからない分はNaN
+    """
+    amplitudes = np.atleast_2d(amplitudes)
+    dom_freqs = np.full((amplitudes.shape[0], n_peaks), np.nan)
+    dom_amps = np.full((amplitudes.shape[0], n_peaks), np.nan)
+    start = 1 if len(freqs) and freqs[0] < 1e-10 else 0
+    if len(freqs) - start < min_dist + 1:
+        return dom_freqs, dom_amps
+
+    for row, amps in enumerate(amplitudes):
+        peaks, _ = find_peaks(amps[start:], distance=min_dist)
+        if len(peaks) == 0:
+            continue
+        peaks = peaks + start
+        top = peaks[np.argsort(amps[peaks])[::-1][:n_peaks]]
+        dom_freqs[row, :len(top)] = freqs[top]
+        dom_amps[row, :len(top)] = amps[top]
+    return dom_freqs, dom_amps
+
+
+def reconstruct_batch(spectrum: np.ndarray, freqs: np.ndarray, dominant_freqs: np.ndarray,
+                      means: np.ndarray, n: int) -> np.ndarray:
+    """
+    主要周波数の成分だけを残して全パラメータを一括で逆変換
+
+    Args:
+        spectrum: rfftの結果 (P, F)
+        freqs: 周波数配列 (F,)
+        dominant_freqs: 主要周波数 (P, K)（NaNは無視）
+        means: 各行の平均 (P,)
+        n: 元の系列長
+
+    Returns:
+        np.ndarray: 再構成した信号 (P, n)
+    """
+    dominant_freqs = np.atleast_2d(dominant_freqs)
+    # 各主要周波数に最も近いビンを (P, K) で求め、(P, F) のマスクに変換
+    valid = ~np.isnan(dominant_freqs)
+    bins = np.abs(freqs[None, None, :] - np.nan_to_num(dominant_freqs)[:, :, None]).argmin(axis=2)
+    mask = np.zeros(spectrum.shape, dtype=bool)
+    rows = np.broadcast_to(np.arange(spectrum.shape[0])[:, None], bins.shape)
+    mask[rows[valid], bins[valid]] = True
+    return np.fft.irfft(np.where(mask, spectrum, 0), n=n, axis=1) + means[:, None]
+
+
+def reconstruct_least_squares(times: np.ndarray, values: np.ndarray, dominant_freqs: np.ndarray,
+                              means: np.ndarray, eval_times: np.ndarray) -> np.ndarray:
+    """
+    観測点に主要周波数の正弦波を最小二乗で当てはめて再構成（Lomb-Scargle用）
+
+    Args:
+        times: 観測時刻 (N,)
+        values: 形状 (P, N) の配列（NaNは欠測）
+        dominant_freqs: 主要周波数 (P, K)
+        means: 各行の平均 (P,)
+        eval_times: 再構成する時刻 (M,)
+
+    Returns:
+        np.ndarray: 再構成した信号 (P, M)
+    """
+    values = np.atleast_2d(values)
+    result = np.tile(means[:, None], (1, len(eval_times))).astype(float)
+    for row, series in enumerate(values):
+        freqs = dominant_freqs[row][~np.isnan(dominant_freqs[row])]
+        observed = ~np.isnan(series)
+        if len(freqs) == 0 or observed.sum() < 2 * len(freqs):
+            continue
+        phase = 2 * np.pi * np.outer(times[observed], freqs)
+        design = np.hstack([np.cos(phase), np.sin(phase)])
+        coef, *_ = np.linalg.lstsq(design, series[observed] - means[row], rcond=None)
+        eval_phase = 2 * np.pi * np.outer(eval_times, freqs)
+        result[row] += np.hstack([np.cos(eval_phase), np.sin(eval_phase)]) @ coef
+    return result
+
+
+def analyze_frame(grid: pd.DataFrame, columns: Optional[List[str]] = None, method: str = "auto",
+                  n_peaks: int = 5, min_dist: int = 2, sampling_freq: float = 1.0) -> Dict[str, Any]:
+    """
+    等間隔グリッド上の全パラメータをまとめて解析
+
+    Args:
+        grid: build_gridの戻り値（欠測はNaN）
+        columns: 対象のパラメータ（Noneの場合は全列）
+        method: "fft"、"lombscargle"、"auto"（欠測率がLOMBSCARGLE_GAP_RATIOを超える列があればLomb-Scargle）
+        n_peaks: 抽出する主要周波数の数
+        min_dist: ピーク間の最小距離（ビン数）
+        sampling_freq: サンプリング周波数
+
+    Returns:
+        Dict[str, Any]: method, index, freqs, gap_ratio, パラメータごとの結果（parameters[列名]）
+            各結果は amplitudes, dominant_freqs, dominant_amps, reconstructed（グリッド上）
+    """
+    columns = [c for c in (columns or list(grid.columns)) if c in grid.columns]
+    values = grid[columns].to_numpy(dtype=float).T
+    n = values.shape[1]
+    gap_ratio = np.isnan(values).mean(axis=1) if n else np.zeros(len(columns))
+    if method == "auto":
+        method = "lombscargle" if (gap_ratio > LOMBSCARGLE_GAP_RATIO).any() else "fft"
+
+    if method == "fft":
+        fft = batch_rfft(values, sampling_freq)
+        freqs, amplitudes, means = fft["freqs"], fft["amplitudes"], fft["means"]
+        dom_freqs, dom_amps = find_dominant_frequencies_batch(freqs, amplitudes, n_peaks, min_dist)
+        reconstructed = reconstruct_batch(fft["spectrum"], freqs, dom_freqs, means, n)
+    elif method == "lombscargle":
+        # FFTと同じ周波数グリッド（直流を除く）で評価する
+        times = np.arange(n) / sampling_freq
+        freqs = np.fft.rfftfreq(n, d=1 / sampling_freq)[1:]
+        amplitudes, means = lomb_scargle_amplitudes(times, values, freqs)
+        dom_freqs, dom_amps = find_dominant_frequencies_batch(freqs, amplitudes, n_peaks, min_dist)
+        reconstructed = reconstruct_least_squares(times, values, dom_freqs, means, times)
+    else:
+        raise ValueError(f"不明な解析方法です: {method}")
+
+    parameters = {}
+    for row, column in enumerate(columns):
+        found = ~np.isnan(dom_freqs[row])
+        parameters[column] = {
+            "amplitudes": amplitudes[row],
+            "dominant_freqs": dom_freqs[row][found],
+            "dominant_amps": dom_amps[row][found],
+            "reconstructed": reconstructed[row],
+            "mean": means[row],
+            "gap_ratio": float(gap_ratio[row]),
+        }
+    return {"method": method, "index": grid.index, "freqs": freqs, "parameters": parameters}
@@ -0,0 +1,335 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import atexit
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional
+from config import LOG_DIR, logger
+
+# パイプラインの各段階（fetch, parse, store, preprocess, render, encode, crawl, analyze）の
+# 実行時間・件数・バイト数を記録し、Prometheusのtextfile形式とJSONで書き出す
+# 複数のプロセス（cronや常駐スケジューラの各ジョブ）の値は書き出し時にファイル上で合算する
+#
+# 使い方:
+#   with stage("fetch") as s:
+#       response = session.get(url)
+#       s.add(items=1, bytes=len(response.content))
+#
+#   @timed_stage("render")
+#   def create_graph(...): ...
+#
+# 環境変数 AQI_PROFILE=cprofile,tracemalloc を設定すると、段階ごとにcProfileの結果（.prof）と
+# tracemallocのピークメモリを記録する（対象の段階を絞る場合は AQI_PROFILE_STAGES=render,encode）
+
+METRICS_DIR = os.path.join(LOG_DIR, "metrics")
+METRICS_JSON_PATH = os.path.join(METRICS_DIR, "aqi_pipeline_metrics.json")
+METRICS_PROM_PATH = os.path.join(METRICS_DIR, "aqi_pipeline.prom")
+PROFILE_DIR = os.path.join(METRICS_DIR, "profiles")
+
+METRIC_PREFIX = "aqi_stage"
+
+
+class StageRecord:
+    """1回分の段階の計測値（withブロック内で件数・バイト数を追加する）"""
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+        self.items = 0
+        self.bytes = 0
+        self.duration = 0.0
+        self.peak_memory = None
+        self.error = False
+
+    def add(self, items: int = 0, bytes: int = 0) -> None:
+        """
+        処理した件数とバイト数を加算
+
+        Args:
+            items: 件数（行数、画像枚数、フレーム数など）
+            bytes: バイト数（レスポンスサイズ、出力ファイルサイズなど）
+        """
+        self.items += items
+        self.bytes += bytes
+
+
+class StageMetrics:
+    """段階ごとの計測値を集計し、ファイルに書き出すクラス（スレッドセーフ）"""
+
+    def __init__(self, json_path: str = METRICS_JSON_PATH, prom_path: str = METRICS_PROM_PATH,
+                 profile: Optional[str] = None, profile_stages: Optional[str] = None,
+                 profile_dir: str = PROFILE_DIR):
+        """
+        初期化
+
+        Args:
+            json_path: 累積値を保存するJSONファイルのパス
+            prom_path: Prometheusのtextfile形式で書き出すパス
+            profile: "cprofile", "tracemalloc" のカンマ区切り（Noneの場合は環境変数 AQI_PROFILE）
+            profile_stages: プロファイルする段階のカンマ区切り（Noneの場合は環境変数 AQI_PROFILE_STAGES、未設定なら全て）
+            profile_dir: cProfileの結果（.prof）を保存するディレクトリ
+        """
+        self.json_path = json_path
+        self.prom_path = prom_path
+        self.profile_dir = profile_dir
+        profile = os.getenv("AQI_PROFILE", "") if profile is None else profile
+        profile_stages = os.getenv("AQI_PROFILE_STAGES", "") if profile_stages is None else profile_stages
+        self.profile_modes = {mode.strip() for mode in profile.split(",") if mode.strip()}
+        self.profile_stages = {s.strip() for s in profile_stages.split(",") if s.strip()}
+        self._lock = threading.Lock()
+        # cProfileは同時に1つしか有効にできないため、プロファイル中の段階は1つに限る
+        self._profile_lock = threading.Lock()
+        self._pending = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, str]) -> str:
+        """段階名とラベルから集計キーを作る"""
+        if not labels:
+            return name
+        return name + "|" + ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+
+    def _should_profile(self, name: str) -> bool:
+        """この段階をプロファイルするかどうか"""
+        return bool(self.profile_modes) and (not self.profile_stages or name in self.profile_stages)
+
+    @contextmanager
+    def stage(self, name: str, **labels):
+        """
+        段階の実行時間を計測するコンテキストマネージャ
+
+        Args:
+            name: 段階名（fetch, parse, store, preprocess, render, encode, crawl, analyze）
+            **labels: 追加のラベル（カメラ名など。値の種類が少ないものに限る）
+
+        Yields:
+            StageRecord: 件数・バイト数を追加するための記録
+        """
+        record = StageRecord(name, {k: str(v) for k, v in labels.items()})
+        profiler = None
+        tracing = False
+        profiling = self._should_profile(name) and self._profile_lock.acquire(blocking=False)
+        if profiling:
+            if "tracemalloc" in self.profile_modes:
+                import tracemalloc
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    tracing = True
+                elif hasattr(tracemalloc, "reset_peak"):  # Python 3.9以降
+                    tracemalloc.reset_peak()
+            if "cprofile" in self.profile_modes:
+                import cProfile
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # 他のプロファイラが有効な場合
+                    profiler = None
+
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record.error = True
+            raise
+        finally:
+            record.duration = time.perf_counter() - start
+            if profiling:
+                if profiler is not None:
+                    profiler.disable()
+                    self._dump_profile(name, profiler)
+                if "tracemalloc" in self.profile_modes:
+                    import tracemalloc
+                    record.peak_memory = tracemalloc.get_traced_memory()[1]
+                    if tracing:
+                        tracemalloc.stop()
+                self._profile_lock.release()
+            self.observe(record)
+
+    def timed_stage(self, name: str, **labels):
+        """
+        関数全体を1つの段階として計測するデコレータ
+
+        Args:
+            name: 段階名
+            **labels: 追加のラベル
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, record: StageRecord) -> None:
+        """
+        1回分の計測値を未書き出しの集計に加える
+
+        Args:
+            record: 計測値
+        """
+        key = self._key(record.name, record.labels)
+        with self._lock:
+            entry = self._pending.setdefault(key, {
+                "stage": record.name, "labels": record.labels, "runs": 0, "errors": 0,
+                "duration_total": 0.0, "duration_max": 0.0, "duration_last": 0.0,
+                "items_total": 0, "bytes_total": 0, "peak_memory_max": None, "last_run": None,
+            })
+            entry["runs"] += 1
+            entry["errors"] += 1 if record.error else 0
+            entry["duration_total"] += record.duration
+            entry["duration_max"] = max(entry["duration_max"], record.duration)
+            entry["duration_last"] = record.duration
+            entry["items_total"] += record.items
+            entry["bytes_total"] += record.bytes
+            entry["last_run"] = time.time()
+            if record.peak_memory is not None:
+                entry["peak_memory_max"] = max(entry["peak_memory_max"] or 0, record.peak_memory)
+
+    def _dump_profile(self, name: str, profiler) -> None:
+        """cProfileの結果を.profファイルに保存"""
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.prof")
+            profiler.dump_stats(path)
+            logger.info(f"段階 {name} のプロファイルを {path} に保存しました")
+        except Exception as e:
+            logger.error(f"プロファイルの保存中にエラーが発生しました: {e}")
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """
+        未書き出しの集計をファイル上の累積値に合算し、JSONとPrometheus形式で書き出す
+
+        Returns:
+            Dict[str, Any]: 合算後の累積値。書き出すものがない・失敗した場合はNone
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return None
+
+        try:
+            os.makedirs(os.path.dirname(self.json_path), exist_ok=True)
+            # 他のプロセスと同時に書き出さないようロックファイルで排他する
+            with open(self.json_path + ".lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                state = self.load()
+                for key, entry in pending.items():
+                    total = state["stages"].get(key)
+                    if total is None:
+                        state["stages"][key] = entry
+                        continue
+                    for field in ("runs", "errors", "duration_total", "items_total", "bytes_total"):
+                        total[field] += entry[field]
+                    total["duration_max"] = max(total["duration_max"], entry["duration_max"])
+                    total["duration_last"] = entry["duration_last"]
+                    total["last_run"] = entry["last_run"]
+                    if entry["peak_memory_max"] is not None:
+                        total["peak_memory_max"] = max(total["peak_memory_max"] or 0, entry["peak_memory_max"])
+                state["updated"] = datetime.now().isoformat()
+
+                self._atomic_write(self.json_path, json.dumps(state, ensure_ascii=False, indent=2))
+                self._atomic_write(self.prom_path, self.to_prometheus(state))
+            return state
+        except Exception as e:
+            logger.error(f"メトリクスの書き出し中にエラーが発生しました: {e}")
+            return None
+
+    def load(self) -> Dict[str, Any]:
+        """
+        ファイル上の累積値を読み込む
+
+        Returns:
+            Dict[str, Any]: {"updated": ..., "stages": {キー: 累積値}}
+        """
+        if os.path.exists(self.json_path):
+            with open(self.json_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"updated": None, "stages": {}}
+
+    @staticmethod
+    def to_prometheus(state: Dict[str, Any]) -> str:
+        """
+        累積値をPrometheusのtextfile形式に変換
+
+        Args:
+            state: load()の戻り値
+
+        Returns:
+            str: node_exporterのtextfile collectorが読める形式のテキスト
+        """
+        metrics = [
+            ("runs_total", "counter", "段階の実行回数", "runs"),
+            ("errors_total", "counter", "例外で終了した回数", "errors"),
+            ("duration_seconds_total", "counter", "実行時間の合計（秒）", "duration_total"),
+            ("duration_seconds_max", "gauge", "実行時間の最大値（秒）", "duration_max"),
+            ("duration_seconds_last", "gauge", "直近の実行時間（秒）", "duration_last"),
+            ("items_total", "counter", "処理した件数", "items_total"),
+            ("bytes_total", "counter", "処理したバイト数", "bytes_total"),
+            ("peak_memory_bytes", "gauge", "tracemallocによるピークメモリ（バイト）", "peak_memory_max"),
+            ("last_run_timestamp_seconds", "gauge", "直近の実行終了時刻（UNIX時間）", "last_run"),
+        ]
+        lines = []
+        for suffix, metric_type, help_text, field in metrics:
+            name = f"{METRIC_PREFIX}_{suffix}"
+            samples = []
+            for entry in state["stages"].values():
+                value = entry.get(field)
+                if value is None:
+                    continue
+                labels = {"stage": entry["stage"], **entry.get("labels", {})}
+                label_text = ",".join(f'{k}="{str(v)}"' for k, v in labels.items())
+                samples.append(f"{name}{{{label_text}}} {value}")
+            if samples:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _atomic_write(path: str, text: str) -> None:
+        """一時ファイルに書いてから置き換える（読み取り側が書きかけのファイルを見ないように）"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def summary_lines(self, state: Optional[Dict[str, Any]] = None) -> list:
+        """累積値を段階ごとの1行サマリーにする（合計時間の長い順）"""
+        state = state or self.load()
+        entries = sorted(state["stages"].values(), key=lambda e: e["duration_total"], reverse=True)
+        lines = []
+        for e in entries:
+            label = e["stage"] + ("".join(f" {k}={v}" for k, v in e.get("labels", {}).items()))
+            mean = e["duration_total"] / e["runs"] if e["runs"] else 0.0
+            lines.append(f"{label:30s} 実行 {e['runs']:6d}回 (エラー {e['errors']}回)  合計 {e['duration_total']:10.2f}s  "
+                         f"平均 {mean:8.3f}s  最大 {e['duration_max']:8.3f}s  件数 {e['items_total']:,}  "
+                         f"バイト {e['bytes_total']:,}")
+        return lines
+
+
+# プロセス全体で共有するインスタンス
+metrics = StageMetrics()
+stage = metrics.stage
+timed_stage = metrics.timed_stage
+
+# cronから起動された単発のスクリプトでも終了時に書き出す
+atexit.register(metrics.flush)
+
+
+if __name__ == "__main__":
+    # 累積値のサマリーを表示（--reset で累積値を削除）
+    if "--reset" in sys.argv:
+        for path in (METRICS_JSON_PATH, METRICS_PROM_PATH):
+            if os.path.exists(path):
+                os.remove(path)
+        print("メトリクスを削除しました")
+    else:
+        lines = metrics.summary_lines()
+        print("\n".join(lines) if lines else "記録がありません")
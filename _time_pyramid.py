@@ -0,0 +1,379 @@
+import os
+import sys
+import glob
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from config import DATA_DIR, CSV_FILE_PATH, logger
+
+# AQI・気象データの多重解像度（1分・1時間・1日・1週間）の集計ストア
+# 各レベルのバケットに min / max / sum / count を保持し、取得のたびに新しい行だけを集計して末尾のバケットに統合する
+# 問い合わせでは、要求された点数に収まる最も細かいレベルを選ぶため、期間の長さに関係なく返す点数が一定以下になる
+
+PYRAMID_DIR = os.path.join(DATA_DIR, "pyramid")
+
+# (レベル名, バケットの長さ（秒）)。週のバケットは月曜0時始まり
+LEVELS = [("1min", 60), ("1h", 3600), ("1d", 86400), ("1w", 7 * 86400)]
+LEVEL_SECONDS = dict(LEVELS)
+
+# レベルごとのファイル分割の単位（strftime形式、Noneは分割しない）
+# 取り込み時は新しい行が入るパーティションだけを書き直す
+PARTITION_FORMATS = {"1min": "%Y%m", "1h": "%Y%m", "1d": "%Y", "1w": None}
+
+DEFAULT_COLUMNS = ["AQI値", "PM2.5", "PM10", "O3", "NO2", "温度", "湿度", "気圧", "風速", "降水量"]
+STATS = ["min", "max", "sum", "count"]
+
+
+def bucket_start(times, level: str):
+    """
+    時刻を各レベルのバケットの開始時刻に切り捨てる
+
+    Args:
+        times (pd.DatetimeIndex): 時刻
+        level: レベル名
+
+    Returns:
+        pd.DatetimeIndex: バケットの開始時刻
+    """
+    import pandas as pd
+
+    if level == "1w":
+        days = times.normalize()
+        return days - pd.to_timedelta(days.dayofweek, unit="D")
+    return times.floor({"1min": "min", "1h": "h", "1d": "D"}[level])
+
+
+class TimePyramid:
+    """時系列の多重解像度集計（スレッドセーフ）"""
+
+    def __init__(self, name: str = "aqi", pyramid_dir: str = PYRAMID_DIR, columns: Optional[List[str]] = None,
+                 time_column: str = "取得時間"):
+        """
+        初期化
+
+        Args:
+            name: ストア名（ファイル名の接頭辞）
+            pyramid_dir: 保存先ディレクトリ
+            columns: 集計する数値列
+            time_column: 元データの日時列
+        """
+        self.name = name
+        self.pyramid_dir = pyramid_dir
+        self.columns = columns or list(DEFAULT_COLUMNS)
+        self.time_column = time_column
+        self.levels = None
+        self.meta = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _partition_path(self, level: str, partition: Optional[str]) -> str:
+        suffix = f"_{partition}" if partition else ""
+        return os.path.join(self.pyramid_dir, f"{self.name}_{level}{suffix}.csv")
+
+    def _partition_start(self, timestamp, level: str):
+        """時刻を含むパーティションの開始時刻"""
+        if PARTITION_FORMATS[level] == "%Y":
+            return timestamp.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+        return timestamp.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.pyramid_dir, f"{self.name}_meta.json")
+
+    @property
+    def is_built(self) -> bool:
+        """一度でも集計したことがあるかどうか"""
+        return os.path.exists(self._meta_path())
+
+    def _disk_version(self):
+        """保存済みファイルの版（inodeと更新時刻）。別のプロセスが書き換えた場合に変わる（ファイルがない場合はNone）"""
+        try:
+            stat = os.stat(self._meta_path())
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def load(self) -> Dict[str, Any]:
+        """
+        保存済みの集計を読み込む（読み込み済みで、別のプロセスがファイルを書き換えていない場合は何もしない）
+
+        Returns:
+            Dict[str, pd.DataFrame]: レベル名 → バケットの開始時刻をインデックスとした集計
+        """
+        import pandas as pd
+
+        version = self._disk_version()
+        if self.levels is not None and version == self._version:
+            return self.levels
+        self._version = version
+        self.levels = {}
+        self.meta = {}
+        for level, _ in LEVELS:
+            if PARTITION_FORMATS[level]:
+                digits = len(datetime.now().strftime(PARTITION_FORMATS[level]))
+                paths = sorted(glob.glob(self._partition_path(level, "[0-9]" * digits)))
+            else:
+                paths = [p for p in [self._partition_path(level, None)] if os.path.exists(p)]
+            frames = [pd.read_csv(p, index_col=0, parse_dates=[0], encoding="utf-8-sig") for p in paths]
+            self.levels[level] = pd.concat(frames).sort_index() if frames else self._empty_frame()
+        if os.path.exists(self._meta_path()):
+            with open(self._meta_path(), "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        return self.levels
+
+    def _empty_frame(self):
+        import pandas as pd
+
+        frame = pd.DataFrame(columns=[f"{c}_{s}" for c in self.columns for s in STATS], dtype=float)
+        frame.index = pd.DatetimeIndex([], name="bucket")
+        return frame
+
+    def _prepare(self, df):
+        """元データを時刻インデックス・数値列のDataFrameに変換（"non"などはNaN）"""
+        import pandas as pd
+
+        data = df.set_index(self.time_column) if self.time_column in df.columns else df
+        data = data.set_axis(pd.to_datetime(data.index, errors="coerce"))
+        data = data[~data.index.isna()]
+        columns = [c for c in self.columns if c in data.columns]
+        return data[columns].apply(pd.to_numeric, errors="coerce").sort_index()
+
+    def _aggregate(self, data, level: str):
+        """新しい行をレベルのバケットごとに集計"""
+        import pandas as pd
+
+        grouped = data.groupby(bucket_start(data.index, level))
+        # 全てNaNのバケットのsumは0ではなくNaNにする
+        parts = {stat: grouped.sum(min_count=1) if stat == "sum" else getattr(grouped, stat)() for stat in STATS}
+        frame = pd.DataFrame({f"{c}_{s}": parts[s][c] for c in data.columns for s in STATS})
+        frame = frame.reindex(columns=self._empty_frame().columns)
+        frame.index.name = "bucket"
+        return frame
+
+    def _merge(self, existing, new):
+        """既存の集計に新しい集計を統合（重なるのは末尾のバケットだけなので、そこだけを再集計する）"""
+        import pandas as pd
+
+        if existing.empty:
+            return new
+        if new.empty:
+            return existing
+        head = existing[existing.index < new.index.min()]
+        tail = existing[existing.index >= new.index.min()]
+        combined = pd.concat([tail, new])
+        rules = {c: ("min" if c.endswith("_min") else "max" if c.endswith("_max") else "sum") for c in combined.columns}
+        # sumは全てNaNのときに0になるため、countが0のバケットのsumはNaNに戻す
+        merged = combined.groupby(level=0).agg(rules)
+        for column in self.columns:
+            if f"{column}_count" in merged:
+                merged.loc[merged[f"{column}_count"] == 0, f"{column}_sum"] = float("nan")
+        return pd.concat([head, merged]).sort_index()
+
+    def ingest(self, df, save: bool = True) -> int:
+        """
+        新しい行を全レベルに追加（前回までに取り込んだ最新時刻以前の行は二重計上を避けるため無視する）
+
+        Args:
+            df: 元データ（time_columnの日時列、またはDatetimeIndexを持つ）。行の辞書のリストも可
+            save: Trueの場合は変更したレベルをファイルに保存
+
+        Returns:
+            int: 取り込んだ行数
+        """
+        import pandas as pd
+
+        if isinstance(df, list):
+            df = pd.DataFrame(df)
+        data = self._prepare(df)
+        with self._lock:
+            self.load()
+            return self._ingest(data, save)
+
+    def _ingest(self, data, save: bool) -> int:
+        """前処理済みの行を全レベルに追加（ロック取得済みで呼ぶ）"""
+        import pandas as pd
+
+        watermark = self.meta.get("last_ingested")
+        if watermark:
+            data = data[data.index > pd.Timestamp(watermark)]
+        if data.empty:
+            return 0
+        changed = {}
+        for level, _ in LEVELS:
+            new = self._aggregate(data, level)
+            self.levels[level] = self._merge(self.levels[level], new)
+            changed[level] = new.index.min()
+        self.meta.update({
+            "last_ingested": data.index.max().isoformat(),
+            "rows": self.meta.get("rows", 0) + len(data),
+            "updated_at": datetime.now().isoformat(),
+        })
+        if save:
+            self._save(changed)
+        return len(data)
+
+    def rebuild(self, df) -> int:
+        """
+        元データ全体から集計を作り直す（過去の行を修正した場合や初回の構築に使う）
+
+        Args:
+            df: 元データ
+
+        Returns:
+            int: 取り込んだ行数
+        """
+        data = self._prepare(df)
+        # 作り直しの途中で他のスレッドが取り込まないよう、初期化と取り込みを1回のロックで行う
+        with self._lock:
+            self.levels = {level: self._empty_frame() for level, _ in LEVELS}
+            self.meta = {}
+            rows = self._ingest(data, save=False)
+            # 全てのパーティションを書き直し、元データから消えた期間の古いパーティションを残さない
+            self._save(None)
+            return rows
+
+    def ensure_built(self, csv_path: str = CSV_FILE_PATH) -> bool:
+        """
+        まだ集計がない場合は、既存のCSV全体から構築する
+
+        Args:
+            csv_path: 元データのCSV
+
+        Returns:
+            bool: 構築した場合はTrue
+        """
+        import pandas as pd
+
+        if self.is_built or not os.path.exists(csv_path):
+            return False
+        rows = self.rebuild(pd.read_csv(csv_path, encoding="utf-8-sig"))
+        logger.info(f"時間ピラミッドを構築しました: {self.name}（{rows} 行）")
+        return True
+
+    def _save(self, changed: Optional[Dict[str, Any]] = None) -> None:
+        """
+        集計とメタ情報を書き出す（ロック取得済みで呼ぶ）
+
+        Args:
+            changed: レベル名 → 変更された最初のバケット。指定したバケット以降を含むパーティションだけを書き直す
+                （Noneの場合は全て書き直し、書き出さなかったパーティションのファイルを削除する）
+        """
+        os.makedirs(self.pyramid_dir, exist_ok=True)
+        for level, frame in self.levels.items():
+            fmt = PARTITION_FORMATS[level]
+            if fmt is None:
+                parts = [(None, frame)]
+            else:
+                if changed is not None and not frame.empty:
+                    frame = frame[frame.index >= self._partition_start(changed[level], level)]
+                parts = frame.groupby(frame.index.strftime(fmt)) if not frame.empty else []
+            written = set()
+            for partition, part in parts:
+                path = self._partition_path(level, partition)
+                part.to_csv(path + ".tmp", encoding="utf-8-sig")
+                os.replace(path + ".tmp", path)
+                written.add(path)
+            # 先に削除すると、書き直しの途中で読み込んだプロセスからそのレベルが空に見えるため、書き出した後で削除する
+            if fmt is not None and (changed is None or frame.empty):
+                for path in glob.glob(self._partition_path(level, "*")):
+                    if path not in written:
+                        os.remove(path)
+        with open(self._meta_path() + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        os.replace(self._meta_path() + ".tmp", self._meta_path())
+        self._version = self._disk_version()
+
+    def time_range(self):
+        """
+        集計済みの期間
+
+        Returns:
+            tuple: (最初の時刻, 最後の時刻)。データがない場合は (None, None)
+        """
+        import pandas as pd
+
+        frame = self.load()["1min"]
+        if frame.empty:
+            return None, None
+        return frame.index.min(), pd.Timestamp(self.meta.get("last_ingested", frame.index.max()))
+
+    def choose_level(self, start, end, max_points: int) -> str:
+        """
+        期間内のバケット数がmax_points以下になる最も細かいレベルを選ぶ（どのレベルでも超える場合は最も粗いレベル）
+
+        Args:
+            start: 開始時刻
+            end: 終了時刻
+            max_points: 最大の点数
+
+        Returns:
+            str: レベル名
+        """
+        span = max((end - start).total_seconds(), 0)
+        for level, seconds in LEVELS:
+            if span / seconds + 1 <= max_points:
+                return level
+        return LEVELS[-1][0]
+
+    def query(self, start=None, end=None, max_points: int = 1000, columns: Optional[List[str]] = None,
+              level: Optional[str] = None):
+        """
+        期間の集計を取り出す
+
+        Args:
+            start: 開始時刻（Noneの場合は最初から）
+            end: 終了時刻（Noneの場合は最後まで）
+            max_points: 返す点数の上限（levelを指定しない場合のレベル選択に使う）
+            columns: 取り出す列（Noneの場合は全列）
+            level: レベルを直接指定する場合のレベル名
+
+        Returns:
+            pd.DataFrame: バケットの開始時刻をインデックスとし、列ごとに {列}_min, {列}_max, {列}_mean, {列}_count を持つ
+                選んだレベルは frame.attrs["level"] に入る
+        """
+        import pandas as pd
+
+        levels = self.load()
+        first, last = self.time_range()
+        start = pd.Timestamp(start) if start is not None else first
+        end = pd.Timestamp(end) if end is not None else last
+        if first is None or start is None or end is None:
+            result = pd.DataFrame()
+            result.attrs["level"] = level or LEVELS[0][0]
+            return result
+
+        level = level or self.choose_level(start, end, max_points)
+        if level not in levels:
+            raise ValueError(f"不明なレベルです: {level}")
+        frame = levels[level]
+        # バケットの開始時刻で切り出す（startを含むバケットから）
+        selected = frame.loc[bucket_start(pd.DatetimeIndex([start]), level)[0]:end]
+
+        result = pd.DataFrame(index=selected.index)
+        for column in columns or self.columns:
+            if f"{column}_count" not in selected:
+                continue
+            count = selected[f"{column}_count"]
+            result[f"{column}_min"] = selected[f"{column}_min"]
+            result[f"{column}_max"] = selected[f"{column}_max"]
+            result[f"{column}_mean"] = selected[f"{column}_sum"] / count.where(count > 0)
+            result[f"{column}_count"] = count
+        result.attrs["level"] = level
+        return result
+
+
+if __name__ == "__main__":
+    # python _time_pyramid.py rebuild [CSVのパス]           CSV全体から集計を作り直す
+    # python _time_pyramid.py query START END [最大点数]      期間の集計を表示
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    pyramid = TimePyramid()
+    if command == "rebuild":
+        import pandas as pd
+        csv_path = sys.argv[2] if len(sys.argv) > 2 else CSV_FILE_PATH
+        print(f"{pyramid.rebuild(pd.read_csv(csv_path, encoding='utf-8-sig'))} 行を集計しました")
+    elif command == "query" and len(sys.argv) > 3:
+        frame = pyramid.query(sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else 1000)
+        print(f"レベル: {frame.attrs['level']}（{len(frame)} 点）")
+        print(frame.to_string())
+    else:
+        print("使い方: python _time_pyramid.py rebuild [CSVのパス] | query START END [最大点数]")
@@ -0,0 +1,224 @@
+import os
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from config import DATA_DIR, IMAGE_ANALYSIS_DIR, logger
+
+# WAQI・Google Air Quality API・コントレイル検出の3つの時系列を、時刻で突き合わせた1つの表にする
+# - 時刻はすべてタイムゾーンなしの日本時間に揃える（WAQIと検出結果は日本時間、GoogleはUTCの +00:00 付き）
+# - 基準の系列の各時刻に、他の系列の最も近い行を許容時間内で結合する（pandas.merge_asof）
+# - 結果は元ファイルの更新時刻・サイズと一緒に保存し、元ファイルと条件が変わらなければ読み込むだけにする
+
+ALIGNED_DIR = os.path.join(DATA_DIR, "aligned")
+
+# 結合の仕方を変えたときに上げる（保存済みの表を無効にするため）
+ALIGN_VERSION = 1
+
+LOCAL_TZ = "Asia/Tokyo"
+
+AQI_COLUMNS = ["AQI値", "PM2.5", "PM10", "O3", "NO2", "温度", "湿度", "気圧", "風速", "降水量"]
+
+# 系列ごとの既定のパス・時刻の列・値の列・結合後の列名の接頭辞・バケットにまとめるときの集計方法
+SOURCES = {
+    "waqi": {
+        "path": os.path.join(DATA_DIR, "kobe_aqi_data.csv"),
+        "time_column": "取得時間",
+        "time_format": None,
+        "columns": AQI_COLUMNS,
+        "prefix": "waqi_",
+        "aggregate": "mean",
+    },
+    "google": {
+        "path": os.path.join(DATA_DIR, "o3_google_api_1month", "o3_by_google_aqi_api.csv"),
+        "time_column": "取得時間",
+        "time_format": None,
+        "columns": ["AQI値", "PM2.5", "PM10", "O3", "NO2"],
+        "prefix": "google_",
+        "aggregate": "mean",
+    },
+    "contrail": {
+        "path": os.path.join(IMAGE_ANALYSIS_DIR, "suma", "contrail_timeline_by_qwen.csv"),
+        "time_column": "date",
+        "time_format": "%Y%m%d%H%M%S",
+        "columns": ["contrail_count"],
+        "prefix": "",
+        "aggregate": "sum",
+    },
+    # contrail_hourly_counts_analysis.py が集計した1時間ごとの検出数（contrail と同じ値のため、既定では結合しない）
+    "contrail_hourly": {
+        "path": os.path.join(IMAGE_ANALYSIS_DIR, "suma", "contrail_hourly_counts.csv"),
+        "time_column": "timestamp",
+        "time_format": None,
+        "columns": ["contrail_count"],
+        "prefix": "",
+        "aggregate": "sum",
+        "default": False,
+    },
+}
+
+
+def _default_sources() -> List[str]:
+    """othersを指定しない場合に結合する系列"""
+    return [name for name, source in SOURCES.items() if source.get("default", True)]
+
+
+def to_local_time(values, time_format: Optional[str] = None):
+    """
+    時刻の文字列を日本時間（タイムゾーンなし）に変換
+    UTCオフセット付きの値は日本時間に換算し、オフセットのない値は日本時間としてそのまま扱う
+
+    Args:
+        values: 時刻の配列
+        time_format: オフセットのない値の書式（Noneの場合は自動判定）
+
+    Returns:
+        pd.Series: datetime64の系列（読めない値はNaT）
+    """
+    import pandas as pd
+
+    text = pd.Series(values).astype(str).str.strip()
+    aware = text.str.contains(r"(?:Z|[+-]\d{2}:?\d{2})$", regex=True)
+    result = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    if (~aware).any():
+        result[~aware] = pd.to_datetime(text[~aware], format=time_format, errors="coerce")
+    if aware.any():
+        converted = pd.to_datetime(text[aware], utc=True, errors="coerce").dt.tz_convert(LOCAL_TZ)
+        result[aware] = converted.dt.tz_localize(None)
+    return result
+
+
+def load_source(name: str, path: Optional[str] = None, freq: Optional[str] = None):
+    """
+    1つの系列を読み込み、時刻（datetime列）と接頭辞付きの値の列（例: google_O3、contrail_count）に揃える
+
+    Args:
+        name: SOURCESのキー
+        path: CSVのパス（Noneの場合は既定のパス）
+        freq: 指定した場合はこの間隔のバケットにまとめる（SOURCESの集計方法を使用）
+
+    Returns:
+        pd.DataFrame: 時刻順のデータ
+    """
+    import pandas as pd
+
+    source = SOURCES[name]
+    df = pd.read_csv(path or source["path"], encoding="utf-8-sig")
+    columns = [c for c in source["columns"] if c in df.columns]
+    frame = pd.DataFrame({"datetime": to_local_time(df[source["time_column"]], source["time_format"])})
+    for column in columns:
+        # "N/A" や "non" などの欠測はNaN
+        frame[source["prefix"] + column] = pd.to_numeric(df[column], errors="coerce")
+    frame = frame.dropna(subset=["datetime"]).sort_values("datetime", kind="stable")
+
+    if freq:
+        values = frame.set_index("datetime")
+        grouped = values.groupby(values.index.floor(freq))
+        if source["aggregate"] == "sum":
+            # 基準の系列になる場合に備え、検出のなかったバケットは0として期間全体を埋める
+            values = grouped.sum(min_count=1)
+            if len(values):
+                values = values.reindex(pd.date_range(values.index.min(), values.index.max(), freq=freq), fill_value=0)
+        else:
+            values = grouped.mean()
+        frame = values.rename_axis("datetime").reset_index()
+    return frame.reset_index(drop=True)
+
+
+def align_sources(base: str = "contrail", others: Optional[List[str]] = None, freq: Optional[str] = "h",
+                  tolerance: str = "30min", direction: str = "nearest",
+                  paths: Optional[Dict[str, str]] = None):
+    """
+    基準の系列の各時刻に、他の系列の最も近い行を許容時間内で結合する
+
+    Args:
+        base: 基準の系列（結果の行はこの系列の時刻になる）
+        others: 結合する系列（Noneの場合は基準以外のすべて）
+        freq: 各系列を先にまとめるバケットの間隔（Noneの場合は元の時刻のまま結合）
+        tolerance: 結合を許す時刻の差（これより離れた行しかない場合はNaN）
+        direction: "nearest"、"backward"（直前の値）、"forward"（直後の値）
+        paths: 系列ごとのCSVのパス（指定しない系列は既定のパス）
+
+    Returns:
+        pd.DataFrame: datetime、基準の値、他の系列の値と結合した行の時刻（{系列}_time）
+    """
+    import pandas as pd
+
+    paths = paths or {}
+    others = [name for name in (others or _default_sources()) if name != base]
+    aligned = load_source(base, paths.get(base), freq)
+    for name in others:
+        path = paths.get(name) or SOURCES[name]["path"]
+        if not os.path.exists(path):
+            logger.error(f"{name} のデータが見つからないため結合しません: {path}")
+            continue
+        right = load_source(name, path, freq)
+        right[f"{name}_time"] = right["datetime"]
+        aligned = pd.merge_asof(aligned, right, on="datetime", tolerance=pd.Timedelta(tolerance),
+                                direction=direction)
+    return aligned
+
+
+def _source_signature(path: str) -> Optional[Dict[str, Any]]:
+    """ファイルの更新時刻とサイズ（ファイルがない場合はNone）"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {"path": os.path.abspath(path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def load_aligned_table(base: str = "contrail", others: Optional[List[str]] = None, freq: Optional[str] = "h",
+                       tolerance: str = "30min", direction: str = "nearest",
+                       paths: Optional[Dict[str, str]] = None, output_dir: str = ALIGNED_DIR,
+                       force: bool = False):
+    """
+    結合済みの表を返す（元ファイルと条件が前回と同じなら保存済みの表を読み込む）
+
+    Args:
+        base, others, freq, tolerance, direction, paths: align_sourcesと同じ
+        output_dir: 結合済みの表の保存先
+        force: Trueの場合は保存済みの表を使わずに作り直す
+
+    Returns:
+        pd.DataFrame: align_sourcesの戻り値と同じ形式
+    """
+    import pandas as pd
+
+    paths = paths or {}
+    others = [name for name in (others or _default_sources()) if name != base]
+    options = {"version": ALIGN_VERSION, "base": base, "others": others, "freq": freq,
+               "tolerance": tolerance, "direction": direction}
+    sources = {name: _source_signature(paths.get(name) or SOURCES[name]["path"]) for name in [base] + others}
+
+    # 条件と元ファイルのパスごとに別の表として保存する
+    source_paths = {name: (signature or {}).get("path") for name, signature in sources.items()}
+    key = hashlib.sha256(json.dumps([options, source_paths], sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    table_path = os.path.join(output_dir, f"aligned_{base}_{key}.csv")
+    meta_path = os.path.splitext(table_path)[0] + ".meta.json"
+
+    if not force and os.path.exists(table_path) and os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("options") == options and meta.get("sources") == sources:
+                time_columns = ["datetime"] + [f"{name}_time" for name in others]
+                table = pd.read_csv(table_path, encoding="utf-8-sig")
+                for column in time_columns:
+                    if column in table.columns:
+                        table[column] = pd.to_datetime(table[column], errors="coerce")
+                return table
+        except (OSError, ValueError) as e:
+            logger.error(f"結合済みの表を読み込めないため作り直します: {e}")
+
+    table = align_sources(base, others, freq, tolerance, direction, paths)
+
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_path = table_path + ".tmp"
+    table.to_csv(tmp_path, index=False, encoding="utf-8-sig")
+    os.replace(tmp_path, table_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"options": options, "sources": sources, "rows": len(table),
+                   "generated_at": datetime.now().isoformat()}, f, ensure_ascii=False, indent=2)
+    logger.info(f"結合済みの表を作成しました（{len(table)} 行）: {table_path}")
+    return table
@@ -0,0 +1,465 @@
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from config import CSV_FILE_PATH, IMAGE_ANALYSIS_DIR, MOVIE_DIR, logger
+from _online_stats import OnlineStats, read_snapshot
+from _timeline_alignment import LOCAL_TZ
+
+# 測定値・集計値・移動統計・飛行機雲の検出結果・動画の一覧をJSONで返すローカルHTTP API
+# CSVはメモリに保持し、バックグラウンドのスレッドがファイルの更新を検知したときだけ読み直す
+# レスポンスはデータのバージョンとクエリから決まるETagで管理し、If-None-Matchが一致すれば304を返す
+# （python api_server.py [--host HOST] [--port PORT]）
+
+CONTRAIL_TIMELINE_PATH = os.path.join(IMAGE_ANALYSIS_DIR, "suma", "contrail_timeline_by_qwen.csv")
+
+API_HOST = os.environ.get("AQI_API_HOST", "127.0.0.1")
+API_PORT = int(os.environ.get("AQI_API_PORT", "8050"))
+
+# ファイル更新の確認間隔（秒）
+REFRESH_INTERVAL = 30
+# メモリに保持するレスポンスの数
+RESPONSE_CACHE_SIZE = 256
+# これより小さいレスポンスは圧縮しない
+GZIP_MIN_BYTES = 1024
+# 1回のレスポンスで返す最大の行数
+MAX_ROWS = 20000
+
+# resolutionパラメータとpandasの頻度文字列の対応（rawは集計しない）
+RESOLUTIONS = {"raw": None, "10min": "10min", "hour": "h", "day": "D", "week": "W"}
+
+AQI_TEXT_COLUMNS = ["地点", "大気質ステータス", "主要汚染物質"]
+
+
+def load_aqi_table(path):
+    """
+    aqi_data.csv を取得時間をインデックスとしたDataFrameとして読み込む（"non"などの欠測はNaN）
+
+    Args:
+        path (str): CSVのパス
+
+    Returns:
+        pd.DataFrame: 時刻順に並べたデータ
+    """
+    import pandas as pd
+
+    df = pd.read_csv(path, encoding="utf-8-sig")
+    df["取得時間"] = pd.to_datetime(df["取得時間"], errors="coerce")
+    df = df.dropna(subset=["取得時間"]).set_index("取得時間").sort_index()
+    for column in df.columns:
+        if column not in AQI_TEXT_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+
+def load_contrail_table(path):
+    """
+    contrail_timeline_by_qwen.csv（date, contrail_count, image_path）を読み込む
+
+    Args:
+        path (str): CSVのパス
+
+    Returns:
+        pd.DataFrame: 検出時刻をインデックスとしたデータ
+    """
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    df["timestamp"] = pd.to_datetime(df["date"].astype(str), format="%Y%m%d%H%M%S", errors="coerce")
+    df["contrail_count"] = pd.to_numeric(df["contrail_count"], errors="coerce")
+    return df.dropna(subset=["timestamp"]).set_index("timestamp").sort_index()[["contrail_count", "image_path"]]
+
+
+class CachedTable:
+    """CSVを読み込んでメモリに保持し、ファイルが更新されたときだけ読み直すテーブル"""
+
+    def __init__(self, name, path, loader):
+        """
+        初期化
+
+        Args:
+            name (str): テーブル名（ログ用）
+            path (str): CSVのパス
+            loader (callable): パスを受け取りDataFrameを返す関数
+        """
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.frame = None
+        self.version = None
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        """ファイルの更新時刻とサイズ（ファイルがない場合はNone）"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def refresh(self):
+        """
+        ファイルが更新されていれば読み直す
+
+        Returns:
+            bool: 読み直した場合はTrue
+        """
+        signature = self._signature()
+        if signature == self.version:
+            return False
+        with self._lock:
+            if signature == self.version:
+                return False
+            if signature is None:
+                self.frame, self.version = None, None
+                return True
+            try:
+                frame = self.loader(self.path)
+            except Exception as e:
+                logger.error(f"{self.name} の読み込み中にエラーが発生しました: {e}")
+                return False
+            self.frame, self.version = frame, signature
+        logger.info(f"{self.name} を読み込みました（{len(frame)} 行）")
+        return True
+
+    def get(self):
+        """
+        現在のデータとバージョンを返す（未読み込みの場合はここで読み込む）
+
+        Returns:
+            tuple: (DataFrameまたはNone, バージョン)
+        """
+        if self.frame is None:
+            self.refresh()
+        return self.frame, self.version
+
+
+class ResponseCache:
+    """ETagをキーに、JSON本体とgzip圧縮済みの本体を保持するLRUキャッシュ"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body):
+        """本体を登録し、(本体, gzip本体またはNone) を返す"""
+        compressed = gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+        entry = (body, compressed)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ApiError(Exception):
+    """クライアントに400番台で返すエラー"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_time_range(args, frame):
+    """
+    start / end パラメータを解釈する（省略時はデータの先頭・末尾）
+    UTCオフセット付きの値は日本時間に換算する（データの時刻はタイムゾーンなしの日本時間）
+
+    Returns:
+        tuple: (start, end) のpd.Timestamp
+    """
+    import pandas as pd
+
+    def parse(name, default):
+        if not args.get(name):
+            return default
+        value = pd.Timestamp(args[name])
+        if value.tzinfo is not None:
+            value = value.tz_convert(LOCAL_TZ).tz_localize(None)
+        return value
+
+    try:
+        start = parse("start", frame.index.min())
+        end = parse("end", frame.index.max())
+    except ValueError:
+        raise ApiError("start / end は ISO 8601 形式で指定してください")
+    return start, end
+
+
+def parse_resolution(args):
+    """resolutionパラメータをpandasの頻度文字列に変換"""
+    resolution = args.get("resolution", "raw")
+    if resolution not in RESOLUTIONS:
+        raise ApiError(f"resolution は {', '.join(RESOLUTIONS)} のいずれかを指定してください")
+    return resolution, RESOLUTIONS[resolution]
+
+
+def frame_to_series(frame):
+    """
+    DataFrameを列ごとの配列（{"time": [...], "series": {列名: [...]}}）に変換（NaNはnull）
+
+    Args:
+        frame (pd.DataFrame): 時刻をインデックスとしたデータ
+
+    Returns:
+        dict: JSONに変換できる辞書
+    """
+    series = {}
+    for column in frame.columns:
+        values = frame[column]
+        series[column] = values.astype(object).where(values.notna(), None).tolist()
+    return {
+        "time": [t.isoformat() for t in frame.index],
+        "series": series,
+    }
+
+
+def list_movies(movie_dir):
+    """
+    動画ディレクトリのファイル一覧（新しい順）
+
+    Returns:
+        list: name, format, bytes, modified の辞書のリスト
+    """
+    movies = []
+    if not os.path.isdir(movie_dir):
+        return movies
+    for entry in os.scandir(movie_dir):
+        name, ext = os.path.splitext(entry.name)
+        # 書き込み中の一時ファイル（.で始まる）は除く
+        if entry.name.startswith(".") or ext.lower() not in (".mp4", ".webm") or not entry.is_file():
+            continue
+        stat = entry.stat()
+        movies.append({
+            "name": entry.name,
+            "format": ext.lower()[1:],
+            "bytes": stat.st_size,
+            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"),
+        })
+    return sorted(movies, key=lambda m: m["modified"], reverse=True)
+
+
+def create_app(aqi_path=CSV_FILE_PATH, contrail_path=CONTRAIL_TIMELINE_PATH, movie_dir=MOVIE_DIR,
+               refresh_interval=REFRESH_INTERVAL, stats_path=None):
+    """
+    Flaskアプリケーションを作成
+
+    Args:
+        aqi_path (str): AQIデータのCSV
+        contrail_path (str): 飛行機雲の検出結果のCSV
+        movie_dir (str): 動画のディレクトリ
+        refresh_interval (int): ファイル更新の確認間隔（秒）。0以下の場合はバックグラウンド更新を行わず、リクエストごとに確認する
+        stats_path (str): 移動統計のJSON（省略時はデータ取得が更新する OnlineStats("aqi") のファイル）
+
+    Returns:
+        Flask: アプリケーション
+    """
+    from flask import Flask, Response, request, send_from_directory, url_for
+
+    app = Flask(__name__)
+    app.json.ensure_ascii = False
+    tables = {
+        "aqi": CachedTable("aqi_data.csv", aqi_path, load_aqi_table),
+        "contrails": CachedTable("contrail_timeline_by_qwen.csv", contrail_path, load_contrail_table),
+    }
+    cache = ResponseCache()
+    stats_path = stats_path or OnlineStats("aqi").path
+
+    def refresh_tables():
+        """更新されたテーブルを読み直し、古いレスポンスを破棄する"""
+        changed = [name for name, table in tables.items() if table.refresh()]
+        if changed:
+            cache.clear()
+        return changed
+
+    if refresh_interval > 0:
+        def refresher():
+            while True:
+                time.sleep(refresh_interval)
+                try:
+                    refresh_tables()
+                except Exception as e:
+                    logger.error(f"データの更新確認中にエラーが発生しました: {e}")
+
+        # 起動時に読み込んでおき、以降は新しいデータが届いたときだけ読み直す
+        refresh_tables()
+        threading.Thread(target=refresher, name="api-refresher", daemon=True).start()
+    else:
+        @app.before_request
+        def refresh_before_request():
+            refresh_tables()
+
+    def json_response(body, status=200):
+        return Response(json.dumps(body, ensure_ascii=False), status=status, mimetype="application/json")
+
+    def cached_json(version, build):
+        """
+        データのバージョンとURLからETagを決め、変更がなければ304、あれば（キャッシュ済みの）JSONを返す
+        ETagはgzipで返す場合に "-gz" を付け、圧縮の有無で異なる値にする
+
+        Args:
+            version (str): 応答の元になったデータのバージョン
+            build (callable): JSONに変換する辞書を作る関数
+        """
+        # 応答には url_for(_external=True) の絶対URLを含むものがあるため、ホスト・プレフィックス（url_root）もキーに含める
+        key = hashlib.sha1(f"{version}|{request.url_root}|{request.full_path}".encode("utf-8")).hexdigest()[:20]
+        # gzipと非圧縮は別の表現のため、強いETagも別にする
+        gzip_accepted = "gzip" in request.accept_encodings
+        candidates = (key + "-gz", key) if gzip_accepted else (key,)
+        etag = next((tag for tag in candidates if request.if_none_match.contains(tag)), None)
+        if etag is not None:
+            response = Response(status=304)
+        else:
+            etag = key + "-gz" if gzip_accepted else key
+            entry = cache.get(key)
+            if entry is None:
+                entry = cache.put(key, json.dumps(build(), ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            body, compressed = entry
+            response = Response(mimetype="application/json")
+            if compressed is not None and gzip_accepted:
+                response.set_data(compressed)
+                response.headers["Content-Encoding"] = "gzip"
+            else:
+                # 小さすぎて圧縮しなかった応答は、gzipを受け付ける場合も非圧縮の表現として返す
+                etag = key
+                response.set_data(body)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    def require(name):
+        frame, version = tables[name].get()
+        if frame is None:
+            raise ApiError(f"{tables[name].name} が見つかりません", status=404)
+        return frame, version
+
+    @app.errorhandler(ApiError)
+    def handle_api_error(e):
+        return json_response({"error": str(e)}, status=e.status)
+
+    @app.route("/api/health")
+    def health():
+        return json_response({
+            name: {"path": table.path, "version": table.version, "rows": None if table.frame is None else len(table.frame)}
+            for name, table in tables.items()
+        })
+
+    @app.route("/api/readings/latest")
+    def latest_reading():
+        frame, version = require("aqi")
+
+        def build():
+            if frame.empty:
+                return {"time": None, "values": {}}
+            row = frame.iloc[-1]
+            return {
+                "time": frame.index[-1].isoformat(),
+                "values": {k: (None if v != v else v) for k, v in row.items()},  # NaNはnull
+            }
+        return cached_json(version, build)
+
+    @app.route("/api/stats/latest")
+    def latest_stats():
+        # 直近1・8・24時間の統計とEWMAはデータ取得のたびに更新されるJSONから読むだけで返す
+        try:
+            stat = os.stat(stats_path)
+        except OSError:
+            raise ApiError("移動統計が見つかりません", status=404)
+        version = f"{stat.st_mtime_ns}-{stat.st_size}"
+
+        def build():
+            snapshot = read_snapshot(stats_path)
+            if snapshot is None:
+                raise ApiError("移動統計を読み込めません", status=503)
+            return snapshot
+        return cached_json(version, build)
+
+    @app.route("/api/readings")
+    def readings():
+        frame, version = require("aqi")
+        start, end = parse_time_range(request.args, frame)
+        resolution, freq = parse_resolution(request.args)
+        numeric = [c for c in frame.columns if c not in AQI_TEXT_COLUMNS]
+        columns = request.args.get("columns")
+        columns = [c for c in columns.split(",") if c in numeric] if columns else numeric
+
+        def build():
+            selected = frame.loc[start:end, columns]
+            if freq:
+                selected = selected.resample(freq).mean().round(2).dropna(how="all")
+            if len(selected) > MAX_ROWS:
+                raise ApiError(f"行数が上限（{MAX_ROWS}）を超えています。期間を短くするか resolution を指定してください")
+            return {"resolution": resolution, "start": start.isoformat(), "end": end.isoformat(), **frame_to_series(selected)}
+        return cached_json(version, build)
+
+    @app.route("/api/contrails")
+    def contrails():
+        frame, version = require("contrails")
+        start, end = parse_time_range(request.args, frame)
+        resolution, freq = parse_resolution(request.args)
+
+        def build():
+            selected = frame.loc[start:end]
+            if freq:
+                # 集計する場合は検出数の合計と画像の枚数を返す
+                grouped = selected["contrail_count"].resample(freq)
+                selected = grouped.sum().to_frame("contrail_count").assign(images=grouped.count())
+            if len(selected) > MAX_ROWS:
+                raise ApiError(f"行数が上限（{MAX_ROWS}）を超えています。期間を短くするか resolution を指定してください")
+            return {"resolution": resolution, "start": start.isoformat(), "end": end.isoformat(), **frame_to_series(selected)}
+        return cached_json(version, build)
+
+    @app.route("/api/movies")
+    def movies():
+        listing = list_movies(movie_dir)
+        version = hashlib.sha1(json.dumps(listing).encode("utf-8")).hexdigest()
+
+        def build():
+            return {"movies": [dict(m, url=url_for("movie_file", filename=m["name"], _external=True)) for m in listing]}
+        return cached_json(version, build)
+
+    @app.route("/media/movies/<path:filename>")
+    def movie_file(filename):
+        # send_from_directoryはETag・Range（シーク再生）に対応している
+        return send_from_directory(movie_dir, filename, conditional=True, max_age=60)
+
+    return app
+
+
+def main():
+    """
+    APIサーバーを起動する
+    """
+    host, port = API_HOST, API_PORT
+    args = sys.argv[1:]
+    if "--host" in args:
+        host = args[args.index("--host") + 1]
+    if "--port" in args:
+        port = int(args[args.index("--port") + 1])
+
+    app = create_app()
+    logger.info(f"APIサーバーを起動します: http://{host}:{port}/api/health")
+    app.run(host=host, port=port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
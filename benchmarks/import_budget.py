@@ -0,0 +1,148 @@
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+# エントリポイントの起動時間（import時間）を python -X importtime で計測し、予算を超えたら失敗するベンチマーク
+# 使い方: python benchmarks/import_budget.py [--json 結果ファイル] [--budget-scale 1.5]
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# シナリオごとのimport対象と予算（ミリ秒）、読み込まれてはいけない重いモジュール
+SCENARIOS = {
+    "crawler": {
+        "modules": ["suma_recent_image_crawler"],
+        "budget_ms": 250,
+        "forbidden": ["pandas", "matplotlib", "seaborn", "cv2", "openai", "anthropic", "PIL"],
+    },
+    "fetch": {
+        "modules": ["_aqi_deta_getter_waqi"],
+        "budget_ms": 250,
+        "forbidden": ["pandas", "matplotlib", "seaborn", "cv2", "openai", "anthropic"],
+    },
+    "aqi_graph": {
+        "modules": ["suma_aqi_&_graph"],
+        "budget_ms": 250,
+        "forbidden": ["pandas", "matplotlib", "seaborn", "cv2", "openai", "anthropic"],
+    },
+    "config": {
+        "modules": ["config"],
+        "budget_ms": 50,
+        "forbidden": ["requests", "pandas", "matplotlib", "cv2"],
+    },
+}
+
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_imports(modules, repeat=3):
+    """
+    新しいPythonプロセスでモジュールをimportし、-X importtime の出力を解析する
+
+    Args:
+        modules (list): importするモジュール名のリスト
+        repeat (int): 計測回数（最小値を採用してディスクキャッシュの影響を減らす）
+
+    Returns:
+        dict: total_ms（対象モジュールのimportの累積時間）、loaded（読み込まれたモジュール名の集合）、top（自己時間の大きいモジュール）
+    """
+    # importlib.import_module は -X importtime の計測対象外のため __import__ を使う
+    code = "".join(f"__import__({name!r})\n" for name in modules)
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=PROJECT_ROOT, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"{modules} のimportに失敗しました:\n{proc.stderr[-2000:]}")
+
+        total_us = 0
+        loaded = set()
+        self_times = []
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_PATTERN.match(line)
+            if not match:
+                continue
+            self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+            loaded.add(name)
+            self_times.append((self_us, name))
+            # 対象モジュールのトップレベル行の累積時間を合計する（インタプリタ起動時のsiteなどは含めない）
+            if len(indent) == 1 and name in modules:
+                total_us += cumulative_us
+
+        result = {
+            "total_ms": total_us / 1000.0,
+            "loaded": loaded,
+            "top": [(name, us / 1000.0) for us, name in sorted(self_times, reverse=True)[:10]],
+        }
+        if best is None or result["total_ms"] < best["total_ms"]:
+            best = result
+    return best
+
+
+def run_benchmark(scenarios, budget_scale=1.0, repeat=3):
+    """
+    全シナリオを計測して予算と比較する
+
+    Args:
+        scenarios (dict): SCENARIOS形式の辞書
+        budget_scale (float): 予算に掛ける倍率（遅いマシンで実行する場合に使用）
+        repeat (int): 計測回数
+
+    Returns:
+        list: シナリオごとの結果
+    """
+    results = []
+    for name, scenario in scenarios.items():
+        measured = measure_imports(scenario["modules"], repeat)
+        budget_ms = scenario["budget_ms"] * budget_scale
+        heavy = sorted(mod for mod in scenario["forbidden"] if mod in measured["loaded"])
+        results.append({
+            "scenario": name,
+            "modules": scenario["modules"],
+            "import_ms": round(measured["total_ms"], 1),
+            "budget_ms": budget_ms,
+            "forbidden_loaded": heavy,
+            "top_self_ms": [[mod, round(ms, 2)] for mod, ms in measured["top"]],
+            "passed": measured["total_ms"] <= budget_ms and not heavy,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="エントリポイントのimport時間の予算チェック")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="予算に掛ける倍率")
+    parser.add_argument("--repeat", type=int, default=3, help="シナリオごとの計測回数")
+    parser.add_argument("scenarios", nargs="*", help=f"実行するシナリオ（省略時は全て: {', '.join(SCENARIOS)}）")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"不明なシナリオです: {', '.join(unknown)}")
+    selected = {name: SCENARIOS[name] for name in (args.scenarios or SCENARIOS)}
+
+    results = run_benchmark(selected, args.budget_scale, args.repeat)
+
+    for r in results:
+        status = "OK  " if r["passed"] else "FAIL"
+        print(f"[{status}] {r['scenario']}: {r['import_ms']:.1f} ms / 予算 {r['budget_ms']:.0f} ms")
+        if r["forbidden_loaded"]:
+            print(f"       読み込まれた重いモジュール: {', '.join(r['forbidden_loaded'])}")
+        if not r["passed"]:
+            for mod, ms in r["top_self_ms"][:5]:
+                print(f"       {ms:8.2f} ms  {mod}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"結果を {args.json} に保存しました")
+
+    sys.exit(0 if all(r["passed"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import traceback
+from datetime import datetime, timedelta
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, BENCHMARK_DIR)
+
+from config import LOG_DIR, LOG_FILE_PATH, logger
+from _stage_metrics import metrics
+import synthetic_data
+
+# 合成データで各処理の実行時間を計測し、コミット間で比較できるJSONを出力するベンチマーク
+# 使い方:
+#   python benchmarks/run_benchmarks.py --scale small
+#   python benchmarks/run_benchmarks.py --scale medium --only save_to_csv preprocess_aqi_data
+#   python benchmarks/run_benchmarks.py --compare logs/benchmarks/前回.json logs/benchmarks/今回.json
+
+RESULTS_DIR = os.path.join(LOG_DIR, "benchmarks")
+
+# 規模ごとの合成データの量
+SCALES = {
+    "small": {"aqi_days": 30, "images": 200, "catalog_rows": 3000, "contrail_days": 7},
+    "medium": {"aqi_days": 365, "images": 1440, "catalog_rows": 3000, "contrail_days": 30},
+    "large": {"aqi_days": 3 * 365, "images": 10080, "catalog_rows": 3000, "contrail_days": 90},
+}
+
+# 分析スクリプトと、サンドボックス内で必要な出力先
+# サンドボックスにコピーするプロジェクトのモジュールは、スクリプトのimportから local_imports() で求める
+ANALYSIS_SCRIPTS = {
+    "o3_basic_analysis": {"script": "o3_basic_analysis.py", "outputs": ["data/o3_basic_analysis"]},
+    "o3_relation_analysis": {"script": "o3_relation_analysis.py", "outputs": ["data/o3_relation_analysis"]},
+    "o3_visualize_analysis": {"script": "o3_visualize_analysis.py", "outputs": ["data/o3_visualize_analysis"]},
+    "contrail_hourly_counts_analysis": {"script": "contrail_hourly_counts_analysis.py", "outputs": []},
+    "contrail_pm2.5_correlation_analysis": {"script": "contrail_pm2.5_correlation_analysis.py", "outputs": []},
+}
+
+
+def local_imports(script, root=PROJECT_ROOT):
+    """
+    スクリプトがimportするプロジェクト直下のモジュールを、間接的にimportするものも含めて求める
+    （関数内のimportも含む。標準ライブラリや外部パッケージは root にファイルがないため含まれない）
+
+    Args:
+        script (str): スクリプトのファイル名（rootからの相対パス）
+        root (str): プロジェクトのディレクトリ
+
+    Returns:
+        list: モジュールのファイル名（script自身は含まない）
+    """
+    import ast
+
+    found = set()
+    pending = [script]
+    while pending:
+        path = os.path.join(root, pending.pop())
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                file_name = name.split(".")[0] + ".py"
+                if file_name != script and file_name not in found and os.path.exists(os.path.join(root, file_name)):
+                    found.add(file_name)
+                    pending.append(file_name)
+    return sorted(found)
+
+
+def redirect_outputs(work_dir):
+    """
+    計測中のログ（app.log）と段階のメトリクスの書き出し先を作業ディレクトリに変更する
+    （合成データでの実行結果を本番のログ・メトリクスに混ぜないため）
+
+    Args:
+        work_dir (str): 作業ディレクトリ
+
+    Returns:
+        logging.Handler: 追加したファイルハンドラ（終了時に閉じる）
+    """
+    log_dir = os.path.join(work_dir, "logs")
+    os.makedirs(os.path.join(log_dir, "metrics"), exist_ok=True)
+    metrics.json_path = os.path.join(log_dir, "metrics", os.path.basename(metrics.json_path))
+    metrics.prom_path = os.path.join(log_dir, "metrics", os.path.basename(metrics.prom_path))
+    metrics.profile_dir = os.path.join(log_dir, "metrics", "profiles")
+
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, logging.FileHandler) and os.path.abspath(handler.baseFilename) == os.path.abspath(LOG_FILE_PATH):
+            root_logger.removeHandler(handler)
+            handler.close()
+    handler = logging.FileHandler(os.path.join(log_dir, os.path.basename(LOG_FILE_PATH)), delay=True)
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    root_logger.addHandler(handler)
+    return handler
+
+
+def git_commit():
+    """現在のコミットハッシュを返す（取得できない場合はNone）"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def time_call(name, func, repeat=3, setup=None, **info):
+    """
+    関数をrepeat回実行して実行時間を計測
+
+    Args:
+        name (str): ベンチマーク名
+        func (callable): 計測する関数（setupの戻り値を引数に取る）
+        repeat (int): 実行回数
+        setup (callable, optional): 各回の前に呼ぶ準備関数（計測に含めない）
+        **info: 結果に含める付加情報
+
+    Returns:
+        dict: 計測結果（失敗時はstatus="error"）
+    """
+    timings = []
+    try:
+        for _ in range(repeat):
+            arg = setup() if setup else None
+            start = time.perf_counter()
+            func(arg)
+            timings.append(time.perf_counter() - start)
+    except Exception as e:
+        logger.error(f"ベンチマーク {name} でエラーが発生しました: {e}")
+        return {"name": name, "status": "error", "error": f"{type(e).__name__}: {e}",
+                "traceback": traceback.format_exc(), **info}
+
+    print(f"  {name}: median {statistics.median(timings):.3f} s（{repeat}回）", file=sys.stderr)
+    return {
+        "name": name,
+        "status": "ok",
+        "runs": len(timings),
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "max": max(timings),
+        **info,
+    }
+
+
+def skipped(name, reason):
+    """実行できなかったベンチマークの結果"""
+    print(f"  {name}: スキップ（{reason}）", file=sys.stderr)
+    return {"name": name, "status": "skipped", "error": reason}
+
+
+class BenchmarkSuite:
+    """合成データを作業ディレクトリに生成し、各処理を計測する"""
+
+    def __init__(self, work_dir, scale, repeat=3):
+        """
+        初期化
+
+        Args:
+            work_dir (str): 合成データと出力を置く作業ディレクトリ
+            scale (dict): SCALESの値
+            repeat (int): 軽い処理の実行回数（重い処理は1回）
+        """
+        self.work_dir = work_dir
+        self.scale = scale
+        self.repeat = repeat
+        self.aqi_rows = None
+        # WAQIの取得結果（欠測 "non" を含む）と、分析スクリプトが読む数値のみのデータ
+        self.waqi_csv = os.path.join(work_dir, "data", "aqi_data.csv")
+        self.aqi_csv = os.path.join(work_dir, "data", "kobe_aqi_data.csv")
+        self.image_dir = os.path.join(work_dir, "data", "image_analysis", "suma", "input_image")
+        self.catalog_csv = os.path.join(work_dir, "data", "image_web_urls", "livecam_links_with_lat_lon.csv")
+        self.contrail_csv = os.path.join(work_dir, "data", "image_analysis", "suma", "contrail_timeline_by_qwen.csv")
+
+    # ------------------------- データ生成 -------------------------
+
+    def generate(self, need_images=True):
+        """合成データを生成する（生成時間も記録する）"""
+        results = []
+        start = time.perf_counter()
+        self.aqi_rows = synthetic_data.generate_aqi_rows(self.scale["aqi_days"])
+        synthetic_data.write_aqi_csv(self.waqi_csv, self.aqi_rows)
+        synthetic_data.write_aqi_csv(self.aqi_csv, synthetic_data.generate_aqi_rows(self.scale["aqi_days"], missing_ratio=0))
+        synthetic_data.generate_camera_catalog(self.catalog_csv, self.scale["catalog_rows"])
+        synthetic_data.generate_contrail_timeline(self.contrail_csv, self.scale["contrail_days"])
+        results.append({"name": "generate_tabular_data", "status": "ok", "runs": 1,
+                        "median": time.perf_counter() - start, "rows": len(self.aqi_rows)})
+
+        if need_images:
+            start = time.perf_counter()
+            synthetic_data.generate_livecam_images(self.image_dir, self.scale["images"])
+            results.append({"name": "generate_livecam_images", "status": "ok", "runs": 1,
+                            "median": time.perf_counter() - start, "images": self.scale["images"]})
+        return results
+
+    # ------------------------- 計測対象 -------------------------
+
+    def bench_save_to_csv(self):
+        """既存CSVに1行追記する（save_to_csvは毎回全件を読み書きする）"""
+        from _aqi_deta_getter_waqi import save_to_csv
+
+        target = os.path.join(self.work_dir, "save_to_csv.csv")
+        last_time = datetime.strptime(self.aqi_rows[-1]["取得時間"], "%Y-%m-%d %H:%M:%S")
+        counter = {"n": 0}
+
+        def setup():
+            shutil.copyfile(self.waqi_csv, target)
+            counter["n"] += 1
+            row = dict(self.aqi_rows[-1])
+            row["取得時間"] = (last_time + timedelta(hours=counter["n"])).strftime("%Y-%m-%d %H:%M:%S")
+            return row
+
+        def run(row):
+            if not save_to_csv(row, target):
+                raise RuntimeError("save_to_csv が失敗しました")
+
+        return time_call("save_to_csv", run, self.repeat, setup, rows=len(self.aqi_rows))
+
+    def bench_preprocess_aqi_data(self):
+        """CSVを読み込んで前処理する"""
+        import pandas as pd
+        from _aqi_deta_getter_waqi import preprocess_aqi_data
+
+        def run(_):
+            df = pd.read_csv(self.waqi_csv, encoding="utf-8-sig")
+            processed, _columns = preprocess_aqi_data(df)
+            if processed is None:
+                raise RuntimeError("preprocess_aqi_data が失敗しました")
+
+        return time_call("preprocess_aqi_data", run, self.repeat, rows=len(self.aqi_rows))
+
+    def bench_create_aqi_visualization(self):
+        """全期間と直近5日間のグラフを作成する"""
+        import matplotlib
+        matplotlib.use("Agg")
+        from _aqi_graph_generator import create_aqi_visualization
+
+        results = []
+        for label, days in [("all", None), ("recent5", 5)]:
+            output_path = os.path.join(self.work_dir, f"aqi_graph_{label}.png")
+
+            def run(_, days=days, output_path=output_path):
+                if create_aqi_visualization(self.aqi_csv, output_path, days=days) is False:
+                    raise RuntimeError("create_aqi_visualization が失敗しました")
+
+            results.append(time_call(f"create_aqi_visualization[{label}]", run, 1, rows=len(self.aqi_rows)))
+        return results
+
+    def bench_generate_movie(self):
+        """合成したライブカメラ画像から動画を作成する"""
+        import _movie_generator
+
+        output_dir = os.path.join(self.work_dir, "movies")
+
+        def run(_):
+            if _movie_generator.generate_movie(self.image_dir, output_dir, "bench_movie", None, True) is None:
+                raise RuntimeError("generate_movie が失敗しました")
+
+        return time_call("generate_movie", run, 1, images=self.scale["images"])
+
+    def bench_find_nearest_points(self):
+        """3000件規模のカタログから最寄りのカメラを探す（ジオコーディングは固定座標に置き換える）"""
+        sys.path.insert(0, os.path.join(PROJECT_ROOT, "area_urls"))
+        try:
+            from area_urls import find_nearest_points as module
+        except ImportError as e:
+            return skipped("find_nearest_points", f"importできません: {e}")
+
+        # 外部APIを呼ばないよう、住所の変換結果は須磨区の座標に固定する
+        module.geocode = lambda address: (34.6417834, 135.1147244)
+
+        def run(_):
+            module.find_nearest_points("神戸市須磨区", self.catalog_csv, top_n=5, verbose=False)
+
+        return time_call("find_nearest_points", run, self.repeat, catalog_rows=self.scale["catalog_rows"])
+
+    def bench_analysis_script(self, name):
+        """
+        分析スクリプトを合成データのサンドボックスで実行する
+        config.pyとスクリプトがimportするモジュールをサンドボックスにコピーするため、DATA_DIR・LOG_DIRなどは
+        サンドボックス内を指す
+        """
+        spec = ANALYSIS_SCRIPTS[name]
+        sandbox = os.path.join(self.work_dir, "sandbox", name)
+        shutil.rmtree(sandbox, ignore_errors=True)
+        os.makedirs(os.path.join(sandbox, "data", "image_analysis", "suma"), exist_ok=True)
+        for output in spec["outputs"]:
+            os.makedirs(os.path.join(sandbox, output), exist_ok=True)
+        for script in sorted({spec["script"], "config.py"} | set(local_imports(spec["script"]))):
+            shutil.copyfile(os.path.join(PROJECT_ROOT, script), os.path.join(sandbox, script))
+        shutil.copyfile(self.aqi_csv, os.path.join(sandbox, "data", "kobe_aqi_data.csv"))
+        shutil.copyfile(self.contrail_csv, os.path.join(sandbox, "data", "image_analysis", "suma", "contrail_timeline_by_qwen.csv"))
+
+        # サンドボックスのモジュールを優先し、呼び出し元のPYTHONPATHも引き継ぐ
+        python_path = os.pathsep.join(p for p in [sandbox, os.environ.get("PYTHONPATH", "")] if p)
+        env = dict(os.environ, MPLBACKEND="Agg", PYTHONPATH=python_path)
+
+        def run(_):
+            proc = subprocess.run([sys.executable, spec["script"]], cwd=sandbox, env=env,
+                                  capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "終了コードが0ではありません")
+
+        # プロセス起動とimportを含む壁時計時間
+        return time_call(f"analysis:{name}", run, 1, rows=len(self.aqi_rows))
+
+    # ------------------------- 実行 -------------------------
+
+    def run(self, only=None):
+        """
+        ベンチマークを実行する
+
+        Args:
+            only (list, optional): 実行するベンチマーク名（Noneの場合は全て）
+
+        Returns:
+            list: 計測結果
+        """
+        benches = {
+            "save_to_csv": self.bench_save_to_csv,
+            "preprocess_aqi_data": self.bench_preprocess_aqi_data,
+            "create_aqi_visualization": self.bench_create_aqi_visualization,
+            "generate_movie": self.bench_generate_movie,
+            "find_nearest_points": self.bench_find_nearest_points,
+        }
+        for name in ANALYSIS_SCRIPTS:
+            benches[f"analysis:{name}"] = lambda name=name: self.bench_analysis_script(name)
+
+        selected = [name for name in benches if not only or name in only or name.split(":")[0] in only]
+        results = self.generate(need_images="generate_movie" in selected)
+        for name in selected:
+            result = benches[name]()
+            results.extend(result if isinstance(result, list) else [result])
+        return results
+
+
+def compare_results(base_path, new_path, threshold=1.2):
+    """
+    2つの結果ファイルを比較し、medianがthreshold倍を超えて遅くなったベンチマークを表示
+
+    Args:
+        base_path (str): 比較元の結果ファイル
+        new_path (str): 比較先の結果ファイル
+        threshold (float): 劣化とみなす倍率
+
+    Returns:
+        bool: 劣化がなければTrue
+    """
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+
+    base_by_name = {r["name"]: r for r in base["results"] if r.get("status") == "ok"}
+    print(f"比較: {base['meta'].get('commit')} ({base['meta'].get('scale_name')}) -> "
+          f"{new['meta'].get('commit')} ({new['meta'].get('scale_name')})")
+
+    ok = True
+    for result in new["results"]:
+        old = base_by_name.get(result["name"])
+        if result.get("status") != "ok" or old is None:
+            continue
+        ratio = result["median"] / old["median"] if old["median"] > 0 else float("inf")
+        mark = "劣化" if ratio > threshold else ("改善" if ratio < 1 / threshold else "")
+        ok = ok and ratio <= threshold
+        print(f"  {result['name']:45s} {old['median']:9.3f} s -> {result['median']:9.3f} s  x{ratio:5.2f} {mark}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="合成データによる処理時間のベンチマーク")
+    parser.add_argument("--scale", choices=SCALES, default="small", help="合成データの規模")
+    parser.add_argument("--aqi-days", type=int, help="AQIデータの日数（規模の値を上書き）")
+    parser.add_argument("--images", type=int, help="ライブカメラ画像の枚数（規模の値を上書き）")
+    parser.add_argument("--catalog-rows", type=int, help="カメラカタログの行数（規模の値を上書き）")
+    parser.add_argument("--repeat", type=int, default=3, help="軽い処理の実行回数")
+    parser.add_argument("--only", nargs="*", help="実行するベンチマーク名")
+    parser.add_argument("--output", help="結果JSONの保存先（省略時は logs/benchmarks/ に保存）")
+    parser.add_argument("--work-dir", help="合成データの作業ディレクトリ（省略時は一時ディレクトリを作成して削除）")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="2つの結果ファイルを比較する")
+    parser.add_argument("--threshold", type=float, default=1.2, help="比較時に劣化とみなす倍率")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare_results(*args.compare, threshold=args.threshold) else 1)
+
+    scale = dict(SCALES[args.scale])
+    for key in ("aqi_days", "images", "catalog_rows"):
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+
+    # 計測中は各処理の詳細なINFOログを抑える
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.WARNING)
+    logging.getLogger("matplotlib.font_manager").setLevel(logging.ERROR)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="aqi_bench_")
+    log_handler = redirect_outputs(work_dir)
+    try:
+        print(f"合成データを生成して計測します（{args.scale}: {scale}）", file=sys.stderr)
+        results = BenchmarkSuite(work_dir, scale, args.repeat).run(args.only)
+    finally:
+        # 作業ディレクトリを削除する前に書き出す（終了時の書き出しで作業ディレクトリが作り直されないように）
+        metrics.flush()
+        logging.getLogger().removeHandler(log_handler)
+        log_handler.close()
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scale_name": args.scale,
+            "scale": scale,
+        },
+        "results": results,
+    }
+
+    output_path = args.output
+    if not output_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, f"bench_{commit or 'nogit'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を {output_path} に保存しました")
+
+    failed = [r["name"] for r in results if r.get("status") == "error"]
+    if failed:
+        print(f"エラーになったベンチマーク: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
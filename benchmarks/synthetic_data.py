@@ -0,0 +1,207 @@
+import os
+import csv
+import math
+import random
+from datetime import datetime, timedelta
+
+# ベンチマーク用の合成データ生成
+# 実データと同じ列構成・ファイル名規則で、規模を指定して生成する（乱数シードを固定して再現可能にする）
+
+AQI_COLUMNS = [
+    "地点", "取得時間", "AQI値", "大気質ステータス", "主要汚染物質",
+    "PM2.5", "PM10", "O3", "NO2",
+    "温度", "湿度", "気圧", "風速", "降水量"
+]
+
+CATALOG_COLUMNS = ["region", "division", "area", "area_url", "image_url", "latitude", "longitude", "matched_address"]
+
+REGIONS = {
+    "hokkaido": ["hokkaido"],
+    "tohoku": ["aomori", "iwate", "miyagi", "fukushima"],
+    "kanto": ["tokyo", "kanagawa", "chiba", "saitama"],
+    "chubu": ["aichi", "shizuoka", "niigata", "nagano"],
+    "kinki": ["osaka", "hyogo", "kyoto", "nara"],
+    "chugoku": ["hiroshima", "okayama"],
+    "shikoku": ["ehime", "kagawa"],
+    "kyushu": ["fukuoka", "kumamoto", "kagoshima", "okinawa"],
+}
+
+
+def aqi_status(aqi):
+    """AQI値から大気質ステータスを返す（_aqi_deta_getter_waqi.get_aqi_statusと同じ区分）"""
+    for limit, status in [(50, "良好"), (100, "普通"), (150, "敏感な人に有害"), (200, "健康に良くない"), (300, "非常に健康に良くない")]:
+        if aqi <= limit:
+            return status
+    return "危険"
+
+
+def generate_aqi_rows(days, interval_minutes=60, start=None, seed=0, missing_ratio=0.01):
+    """
+    aqi_data.csv / kobe_aqi_data.csv 形式の行を生成
+
+    Args:
+        days (int): 生成する日数
+        interval_minutes (int): 取得間隔（分）
+        start (datetime, optional): 開始時刻（Noneの場合は現在からdays日前）
+        seed (int): 乱数シード
+        missing_ratio (float): 欠測（"non"）にする割合
+
+    Returns:
+        list: 1行ずつの辞書のリスト
+    """
+    rng = random.Random(seed)
+    start = start or (datetime.now() - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+    count = int(days * 24 * 60 / interval_minutes)
+    rows = []
+    for i in range(count):
+        t = start + timedelta(minutes=i * interval_minutes)
+        hour_phase = 2 * math.pi * (t.hour + t.minute / 60) / 24
+        year_phase = 2 * math.pi * t.timetuple().tm_yday / 365
+        # O3は昼にピーク、PM2.5は朝夕に高くなる日周変動と季節変動を与える
+        o3 = max(0.0, 30 + 20 * math.sin(hour_phase - math.pi / 2) + 10 * math.sin(year_phase) + rng.gauss(0, 5))
+        pm25 = max(0.0, 25 + 10 * math.cos(2 * hour_phase) + 8 * math.cos(year_phase) + rng.gauss(0, 6))
+        aqi = int(max(o3, pm25 * 1.5))
+        row = {
+            "地点": "神戸市 須磨区",
+            "取得時間": t.strftime("%Y-%m-%d %H:%M:%S"),
+            "AQI値": float(aqi),
+            "大気質ステータス": aqi_status(aqi),
+            "主要汚染物質": "o3" if o3 > pm25 * 1.5 else "pm25",
+            "PM2.5": round(pm25, 1),
+            "PM10": round(pm25 * 0.6 + rng.gauss(0, 2), 1),
+            "O3": round(o3, 1),
+            "NO2": round(max(0.0, 12 + 6 * math.cos(hour_phase) + rng.gauss(0, 3)), 1),
+            "温度": round(16 + 10 * math.sin(year_phase - math.pi / 2) + 4 * math.sin(hour_phase - math.pi / 2), 1),
+            "湿度": round(min(100.0, max(10.0, 65 + rng.gauss(0, 12))), 1),
+            "気圧": round(1013 + rng.gauss(0, 6), 1),
+            "風速": round(abs(rng.gauss(3, 1.5)), 1),
+            "降水量": round(max(0.0, rng.gauss(-1, 2)), 1),
+        }
+        if rng.random() < missing_ratio:
+            row[rng.choice(["PM2.5", "O3", "NO2"])] = "non"
+        rows.append(row)
+    return rows
+
+
+def write_aqi_csv(path, rows):
+    """
+    行をCSV（utf-8-sig）として書き出す
+
+    Args:
+        path (str): 出力先
+        rows (list): generate_aqi_rowsの戻り値
+
+    Returns:
+        str: 出力先のパス
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=AQI_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def generate_livecam_images(output_dir, count, size=(640, 360), interval_minutes=1, start=None, seed=0):
+    """
+    ライブカメラ画像（YYYYMMDDHHMMSS.jpg）を生成
+
+    Args:
+        output_dir (str): 出力ディレクトリ
+        count (int): 生成する枚数
+        size (tuple): 画像サイズ（幅, 高さ）
+        interval_minutes (int): 撮影間隔（分）
+        start (datetime, optional): 最初の撮影時刻（Noneの場合は現在から逆算）
+        seed (int): 乱数シード
+
+    Returns:
+        list: 生成した画像のパス
+    """
+    import numpy as np
+    from PIL import Image
+
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    width, height = size
+    start = start or (datetime.now() - timedelta(minutes=count * interval_minutes)).replace(second=0, microsecond=0)
+
+    # 空のグラデーションと地上部分を持つ基本画像を1枚作り、明るさとノイズを変えて使い回す
+    sky = np.linspace([90, 150, 230], [200, 220, 245], int(height * 0.7)).astype(np.float32)
+    ground = np.full((height - len(sky), 3), [70, 80, 60], dtype=np.float32)
+    base = np.repeat(np.concatenate([sky, ground])[:, None, :], width, axis=1)
+
+    paths = []
+    for i in range(count):
+        t = start + timedelta(minutes=i * interval_minutes)
+        brightness = 0.35 + 0.65 * max(0.0, math.sin(math.pi * (t.hour + t.minute / 60 - 5) / 14))
+        noise = rng.normal(0, 6, (height, width, 1)).astype(np.float32)
+        frame = np.clip(base * brightness + noise, 0, 255).astype(np.uint8)
+        path = os.path.join(output_dir, t.strftime("%Y%m%d%H%M") + "00.jpg")
+        Image.fromarray(frame).save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def generate_camera_catalog(path, rows=3000, seed=0):
+    """
+    livecam_links_with_lat_lon.csv 形式のカメラカタログを生成
+
+    Args:
+        path (str): 出力先
+        rows (int): 行数
+        seed (int): 乱数シード
+
+    Returns:
+        str: 出力先のパス
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    regions = [(region, division) for region, divisions in REGIONS.items() for division in divisions]
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CATALOG_COLUMNS)
+        writer.writeheader()
+        for i in range(rows):
+            region, division = rng.choice(regions)
+            camera_id = f"{rng.getrandbits(48):012X}"
+            area_url = f"https://weathernews.jp/onebox/livecam/{region}/{division}/{camera_id}/"
+            # 一部の行は緯度経度の取得に失敗した状態（空欄）にする
+            missing = rng.random() < 0.02
+            writer.writerow({
+                "region": region,
+                "division": division,
+                "area": f"{division}市{i}",
+                "area_url": area_url,
+                "image_url": f"https://gvs.weathernews.jp/livecam/{camera_id}/640/",
+                "latitude": "" if missing else round(rng.uniform(26.0, 45.0), 7),
+                "longitude": "" if missing else round(rng.uniform(127.0, 145.0), 7),
+                "matched_address": "",
+            })
+    return path
+
+
+def generate_contrail_timeline(path, days, interval_minutes=10, start=None, seed=0):
+    """
+    contrail_timeline_by_qwen.csv 形式（date, contrail_count, image_path）の検出結果を生成
+
+    Args:
+        path (str): 出力先
+        days (int): 生成する日数
+        interval_minutes (int): 検出間隔（分）
+        start (datetime, optional): 開始時刻
+        seed (int): 乱数シード
+
+    Returns:
+        str: 出力先のパス
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    start = start or (datetime.now() - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "contrail_count", "image_path"])
+        for i in range(int(days * 24 * 60 / interval_minutes)):
+            t = start + timedelta(minutes=i * interval_minutes)
+            daylight = 6 <= t.hour < 18
+            date = t.strftime("%Y%m%d%H%M%S")
+            writer.writerow([date, rng.choice([0, 0, 0, 1, 2]) if daylight else 0, f"input_image/{date}.jpg"])
+    return path
@@ -13,12 +13,17 @@ MOVIE_DIR = os.path.join(DATA_DIR, "movies")
 IMAGE_WEB_URL_DIR = os.path.join(DATA_DIR, "image_web_urls")
 
 # ディレクトリの作成
-os.makedirs(STATIC_DIR, exist_ok=True)
-os.makedirs(LOG_DIR, exist_ok=True)
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(IMAGE_ANALYSIS_DIR, exist_ok=True)
-os.makedirs(MOVIE_DIR, exist_ok=True)
-os.makedirs(IMAGE_WEB_URL_DIR, exist_ok=True)
+# importのたびにディスクへアクセスしないよう、書き込みを行うエントリポイントから ensure_directories() を呼ぶ
+_directories_created = False
+
+def ensure_directories():
+    """出力先のディレクトリを作成する（プロセス内で1回だけ実行）"""
+    global _directories_created
+    if _directories_created:
+        return
+    for directory in [STATIC_DIR, LOG_DIR, DATA_DIR, IMAGE_ANALYSIS_DIR, MOVIE_DIR, IMAGE_WEB_URL_DIR]:
+        os.makedirs(directory, exist_ok=True)
+    _directories_created = True
 
 # ファイルパス
 CSV_FILE_NAME = 'aqi_data.csv'
@@ -29,13 +34,20 @@ LOG_FILE_PATH = os.path.join(LOG_DIR, "app.log")
 SUMA_LAT_LON =[34.64178340622669, 135.11472440241536]
 
 # ロギング設定
+class _LazyFileHandler(logging.FileHandler):
+    """最初のログ出力時にログディレクトリを作成してファイルを開くFileHandler"""
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
 def setup_logging():
     """アプリケーションのロギングを設定する"""
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         handlers=[
-            logging.FileHandler(LOG_FILE_PATH),
+            _LazyFileHandler(LOG_FILE_PATH, delay=True),
             logging.StreamHandler()
         ]
     )
@@ -113,4 +125,16 @@ QWEN_MODEL_PRICING = {
         "出力料金（100万トークンあたり）": "未公開",
         "特徴": "軽量でありながら高性能な視覚理解を提供するモデル"
     }
-}
\ No newline at end of file
+}
+
+# qwen model pricing（コスト計算用、1Mトークンあたりの価格、単位: USD）
+# QWEN_MODEL_PRICINGは説明用のため、計算にはこちらを使用する（最新価格に更新が必要）
+# cached_input_ratio: キャッシュヒットした入力トークンの単価倍率
+QWEN_PRICING = {
+    "qwen-vl-max": {"input": 0.8, "output": 3.2, "cached_input_ratio": 0.4},
+    "qwen-vl-plus": {"input": 0.21, "output": 0.63, "cached_input_ratio": 0.4},
+    "qwen2.5-vl-72b-instruct": {"input": 2.8, "output": 8.4, "cached_input_ratio": 1.0},
+    "qwen2.5-vl-32b-instruct": {"input": 1.4, "output": 4.2, "cached_input_ratio": 1.0},
+    "qwen2.5-vl-7b-instruct": {"input": 0.35, "output": 1.05, "cached_input_ratio": 1.0},
+    "qwen2.5-vl-3b-instruct": {"input": 0.21, "output": 0.63, "cached_input_ratio": 1.0},
+}
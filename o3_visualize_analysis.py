@@ -4,6 +4,9 @@ import matplotlib.dates as mdates
 import japanize_matplotlib  # 日本語フォント対応
 import numpy as np
 from config import *
+from _report_renderer import FigureTask, render_figures
+from _render_cache import RenderCache
+from _quantile_sketch import SketchStore
 
 input_path = os.path.join(DATA_DIR, 'kobe_aqi_data.csv')
 output_path = os.path.join(DATA_DIR, 'o3_visualize_analysis')
@@ -12,138 +15,206 @@ output_path = os.path.join(DATA_DIR, 'o3_visualize_analysis')
 plt.style.use('default')
 plt.rcParams['figure.figsize'] = (14, 8)
 plt.rcParams['font.family'] = 'IPAexGothic'
-    
+
     # matplotlibのグローバル設定
 plt.rcParams['axes.unicode_minus'] = False
-# CSVデータを読み込み
-df = pd.read_csv(input_path)
-
-# 取得時間を日付型に変換
-df['取得時間'] = pd.to_datetime(df['取得時間'])
-df['日付'] = df['取得時間'].dt.date
-
-# 日ごとのO3最大値を計算
-daily_o3_max = df.groupby('日付')['O3'].max().reset_index()
-daily_o3_max['日付'] = pd.to_datetime(daily_o3_max['日付'])
-
-# 図1: O3濃度の時系列推移
-plt.figure(figsize=(15, 8))
-plt.plot(daily_o3_max['日付'], daily_o3_max['O3'], marker='o', markersize=6, 
-         linestyle='-', linewidth=1, alpha=0.8, color='navy', label='日最高O3濃度')
-plt.axhline(y=30, color='orange', linestyle='--', linewidth=2, label='閾値: 30')
-plt.axhline(y=50, color='red', linestyle='--', linewidth=2, label='閾値: 50')
-plt.fill_between(daily_o3_max['日付'], 0, 30, alpha=0.3, color='green', label='正常範囲 (0-30)')
-plt.fill_between(daily_o3_max['日付'], 30, 50, alpha=0.3, color='yellow', label='要注意範囲 (30-50)')
-plt.fill_between(daily_o3_max['日付'], 50, daily_o3_max['O3'].max(), 
-                 where=(daily_o3_max['O3'] > 50), alpha=0.3, color='red', label='警戒範囲 (50+)')
-plt.title('日最高O3濃度の時系列推移 (2025年4月〜5月)', fontsize=16, pad=20)
-plt.xlabel('日付', fontsize=14)
-plt.ylabel('O3濃度', fontsize=14)
-plt.legend(fontsize=12)
-plt.grid(True, alpha=0.3)
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig(os.path.join(output_path, 'o3_v_日最高O3濃度の時系列推移.png'))
-
-# 図2: O3濃度の分布ヒストグラム
-plt.figure(figsize=(14, 8))
-bins = np.arange(0, 80, 5)
-plt.hist(daily_o3_max['O3'], bins=bins, alpha=0.7, color='skyblue', edgecolor='darkblue')
-plt.axvline(x=30, color='orange', linestyle='--', linewidth=3, label='閾値: 30')
-plt.axvline(x=50, color='red', linestyle='--', linewidth=3, label='閾値: 50')
-plt.title('日最高O3濃度の分布', fontsize=16, pad=20)
-plt.xlabel('O3濃度', fontsize=14)
-plt.ylabel('日数', fontsize=14)
-plt.legend(fontsize=12)
-plt.grid(True, axis='y', alpha=0.3)
-plt.xticks(bins)
-plt.tight_layout()
-plt.savefig(os.path.join(output_path, 'o3_v_日最高O3濃度の分布.png'))
-
-# 図3: 月ごとの超過状況（円グラフと棒グラフの組み合わせ）
-df['月'] = df['取得時間'].dt.month
-monthly_days = df.groupby(['月', '日付'])['O3'].max().reset_index()
-
-# 月ごとの集計
-monthly_summary = monthly_days.groupby('月').agg({
-    'O3': ['count', 'max', 'mean']
-}).reset_index()
-
-# 超過日数の計算
-over_30_by_month = monthly_days[monthly_days['O3'] > 30].groupby('月').size()
-over_50_by_month = monthly_days[monthly_days['O3'] > 50].groupby('月').size()
-total_days_by_month = monthly_days.groupby('月').size()
-
-# 図3a: 月ごとの超過状況（棒グラフ）
-fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
-
-months = [4, 5]
-total_counts = [total_days_by_month.get(m, 0) for m in months]
-over_30_counts = [over_30_by_month.get(m, 0) for m in months]
-over_50_counts = [over_50_by_month.get(m, 0) for m in months]
-normal_counts = [t - o30 for t, o30 in zip(total_counts, over_30_counts)]
-
-x = np.arange(len(months))
-width = 0.3
-
-ax1.bar(x - width/2, normal_counts, width, label='正常 (0-30)', color='green', alpha=0.7)
-ax1.bar(x - width/2, [o30 - o50 for o30, o50 in zip(over_30_counts, over_50_counts)], 
-        width, bottom=normal_counts, label='要注意 (30-50)', color='yellow', alpha=0.7)
-ax1.bar(x - width/2, over_50_counts, 
-        width, bottom=[n + (o30-o50) for n, o30, o50 in zip(normal_counts, over_30_counts, over_50_counts)], 
-        label='警戒 (50+)', color='red', alpha=0.7)
-
-ax1.set_ylabel('日数', fontsize=12)
-ax1.set_xticks(x)
-ax1.set_xticklabels([f'{m}月' for m in months])
-ax1.set_title('月ごとの大気質分布', fontsize=14)
-ax1.legend()
-
-# 図3b: 全体の超過状況（円グラフ）
-total_days = len(daily_o3_max)
-days_normal = len(daily_o3_max[daily_o3_max['O3'] <= 30])
-days_caution = len(daily_o3_max[(daily_o3_max['O3'] > 30) & (daily_o3_max['O3'] <= 50)])
-days_warning = len(daily_o3_max[daily_o3_max['O3'] > 50])
-
-sizes = [days_normal, days_caution, days_warning]
-colors = ['green', 'yellow', 'red']
-labels = [f'正常\n{days_normal}日 ({days_normal/total_days*100:.1f}%)', 
-          f'要注意\n{days_caution}日 ({days_caution/total_days*100:.1f}%)', 
-          f'警戒\n{days_warning}日 ({days_warning/total_days*100:.1f}%)']
-
-ax2.pie(sizes, labels=labels, colors=colors, autopct='', startangle=90, 
-        wedgeprops={'alpha': 0.7, 'edgecolor': 'black'})
-ax2.set_title('O3濃度レベル別の日数分布', fontsize=14)
-
-plt.tight_layout()
-plt.savefig(os.path.join(output_path, 'o3_v_O3濃度レベル別の日数分布.png'))
-
-# 図4: 箱ひげ図（月ごとのO3濃度分布）
-plt.figure(figsize=(12, 8))
-box_data = [monthly_days[monthly_days['月'] == m]['O3'].values for m in [4, 5]]
-plt.boxplot(box_data, labels=['4月', '5月'], widths=0.6, 
-            boxprops={'color': 'navy', 'linewidth': 2},
-            whiskerprops={'color': 'navy', 'linewidth': 2},
-            capprops={'color': 'navy', 'linewidth': 2},
-            medianprops={'color': 'red', 'linewidth': 2})
-plt.axhline(y=30, color='orange', linestyle='--', linewidth=2, label='閾値: 30')
-plt.axhline(y=50, color='red', linestyle='--', linewidth=2, label='閾値: 50')
-plt.ylabel('O3濃度', fontsize=14)
-plt.title('月ごとのO3濃度分布（箱ひげ図）', fontsize=16, pad=20)
-plt.legend(fontsize=12)
-plt.grid(True, axis='y', alpha=0.3)
-plt.tight_layout()
-plt.savefig(os.path.join(output_path, 'o3_v_月ごとのO3濃度分布.png'))
-
-# 数値サマリーの再表示（参考用）
-print("=== 分析結果サマリー ===")
-print(f"全日数: {total_days}日")
-print(f"O3が30を超えた日数: {len(daily_o3_max[daily_o3_max['O3'] > 30])}日 ({len(daily_o3_max[daily_o3_max['O3'] > 30])/total_days*100:.1f}%)")
-print(f"O3が50を超えた日数: {len(daily_o3_max[daily_o3_max['O3'] > 50])}日 ({len(daily_o3_max[daily_o3_max['O3'] > 50])/total_days*100:.1f}%)")
+
+
+def load_data():
+    """
+    CSVを読み込み、全ての図で共有するデータを作成
+
+    Returns:
+        dict: daily_o3_max（日ごとのO3最大値）, monthly_days（月・日ごとのO3最大値）,
+            hourly_percentiles（時間帯ごとのO3の分位点）
+    """
+    df = pd.read_csv(input_path)
+
+    # 時間帯ごとの分位点は分位点スケッチから求める
+    # 保存済みのスケッチの更新はデータ取得側の役目のため、ここではファイルに保存しない一時的なスケッチを作る
+    sketches = SketchStore("kobe_aqi", sketch_dir=None, columns=['O3'])
+    sketches.ingest(df)
+    hourly_percentiles = sketches.percentiles('O3', qs=(0.1, 0.25, 0.5, 0.75, 0.9), by='hour')
+
+    # 取得時間を日付型に変換
+    df['取得時間'] = pd.to_datetime(df['取得時間'])
+    df['日付'] = df['取得時間'].dt.date
+
+    # 日ごとのO3最大値を計算
+    daily_o3_max = df.groupby('日付')['O3'].max().reset_index()
+    daily_o3_max['日付'] = pd.to_datetime(daily_o3_max['日付'])
+
+    # 月ごとの集計に使う日ごとの最大値
+    df['月'] = df['取得時間'].dt.month
+    monthly_days = df.groupby(['月', '日付'])['O3'].max().reset_index()
+
+    return {'daily_o3_max': daily_o3_max, 'monthly_days': monthly_days, 'hourly_percentiles': hourly_percentiles}
+
+
+def draw_time_series(data):
+    """図1: O3濃度の時系列推移"""
+    daily_o3_max = data['daily_o3_max']
+    fig = plt.figure(figsize=(15, 8))
+    plt.plot(daily_o3_max['日付'], daily_o3_max['O3'], marker='o', markersize=6,
+             linestyle='-', linewidth=1, alpha=0.8, color='navy', label='日最高O3濃度')
+    plt.axhline(y=30, color='orange', linestyle='--', linewidth=2, label='閾値: 30')
+    plt.axhline(y=50, color='red', linestyle='--', linewidth=2, label='閾値: 50')
+    plt.fill_between(daily_o3_max['日付'], 0, 30, alpha=0.3, color='green', label='正常範囲 (0-30)')
+    plt.fill_between(daily_o3_max['日付'], 30, 50, alpha=0.3, color='yellow', label='要注意範囲 (30-50)')
+    plt.fill_between(daily_o3_max['日付'], 50, daily_o3_max['O3'].max(),
+                     where=(daily_o3_max['O3'] > 50), alpha=0.3, color='red', label='警戒範囲 (50+)')
+    plt.title('日最高O3濃度の時系列推移 (2025年4月〜5月)', fontsize=16, pad=20)
+    plt.xlabel('日付', fontsize=14)
+    plt.ylabel('O3濃度', fontsize=14)
+    plt.legend(fontsize=12)
+    plt.grid(True, alpha=0.3)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    return fig
+
+
+def draw_histogram(data):
+    """図2: O3濃度の分布ヒストグラム"""
+    daily_o3_max = data['daily_o3_max']
+    fig = plt.figure(figsize=(14, 8))
+    bins = np.arange(0, 80, 5)
+    plt.hist(daily_o3_max['O3'], bins=bins, alpha=0.7, color='skyblue', edgecolor='darkblue')
+    plt.axvline(x=30, color='orange', linestyle='--', linewidth=3, label='閾値: 30')
+    plt.axvline(x=50, color='red', linestyle='--', linewidth=3, label='閾値: 50')
+    plt.title('日最高O3濃度の分布', fontsize=16, pad=20)
+    plt.xlabel('O3濃度', fontsize=14)
+    plt.ylabel('日数', fontsize=14)
+    plt.legend(fontsize=12)
+    plt.grid(True, axis='y', alpha=0.3)
+    plt.xticks(bins)
+    plt.tight_layout()
+    return fig
+
+
+def draw_level_distribution(data):
+    """図3: 月ごとの超過状況（円グラフと棒グラフの組み合わせ）"""
+    daily_o3_max = data['daily_o3_max']
+    monthly_days = data['monthly_days']
+
+    # 超過日数の計算
+    over_30_by_month = monthly_days[monthly_days['O3'] > 30].groupby('月').size()
+    over_50_by_month = monthly_days[monthly_days['O3'] > 50].groupby('月').size()
+    total_days_by_month = monthly_days.groupby('月').size()
+
+    # 図3a: 月ごとの超過状況（棒グラフ）
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
+
+    months = [4, 5]
+    total_counts = [total_days_by_month.get(m, 0) for m in months]
+    over_30_counts = [over_30_by_month.get(m, 0) for m in months]
+    over_50_counts = [over_50_by_month.get(m, 0) for m in months]
+    normal_counts = [t - o30 for t, o30 in zip(total_counts, over_30_counts)]
+
+    x = np.arange(len(months))
+    width = 0.3
+
+    ax1.bar(x - width/2, normal_counts, width, label='正常 (0-30)', color='green', alpha=0.7)
+    ax1.bar(x - width/2, [o30 - o50 for o30, o50 in zip(over_30_counts, over_50_counts)],
+            width, bottom=normal_counts, label='要注意 (30-50)', color='yellow', alpha=0.7)
+    ax1.bar(x - width/2, over_50_counts,
+            width, bottom=[n + (o30-o50) for n, o30, o50 in zip(normal_counts, over_30_counts, over_50_counts)],
+            label='警戒 (50+)', color='red', alpha=0.7)
+
+    ax1.set_ylabel('日数', fontsize=12)
+    ax1.set_xticks(x)
+    ax1.set_xticklabels([f'{m}月' for m in months])
+    ax1.set_title('月ごとの大気質分布', fontsize=14)
+    ax1.legend()
+
+    # 図3b: 全体の超過状況（円グラフ）
+    total_days = len(daily_o3_max)
+    days_normal = len(daily_o3_max[daily_o3_max['O3'] <= 30])
+    days_caution = len(daily_o3_max[(daily_o3_max['O3'] > 30) & (daily_o3_max['O3'] <= 50)])
+    days_warning = len(daily_o3_max[daily_o3_max['O3'] > 50])
+
+    sizes = [days_normal, days_caution, days_warning]
+    colors = ['green', 'yellow', 'red']
+    labels = [f'正常\n{days_normal}日 ({days_normal/total_days*100:.1f}%)',
+              f'要注意\n{days_caution}日 ({days_caution/total_days*100:.1f}%)',
+              f'警戒\n{days_warning}日 ({days_warning/total_days*100:.1f}%)']
+
+    ax2.pie(sizes, labels=labels, colors=colors, autopct='', startangle=90,
+            wedgeprops={'alpha': 0.7, 'edgecolor': 'black'})
+    ax2.set_title('O3濃度レベル別の日数分布', fontsize=14)
+
+    plt.tight_layout()
+    return fig
+
+
+def draw_monthly_boxplot(data):
+    """図4: 箱ひげ図（月ごとのO3濃度分布）"""
+    monthly_days = data['monthly_days']
+    fig = plt.figure(figsize=(12, 8))
+    box_data = [monthly_days[monthly_days['月'] == m]['O3'].values for m in [4, 5]]
+    # boxplotのlabels引数はmatplotlibのバージョンで名前が変わったため、目盛りのラベルとして設定する
+    plt.boxplot(box_data, widths=0.6,
+                boxprops={'color': 'navy', 'linewidth': 2},
+                whiskerprops={'color': 'navy', 'linewidth': 2},
+                capprops={'color': 'navy', 'linewidth': 2},
+                medianprops={'color': 'red', 'linewidth': 2})
+    plt.xticks([1, 2], ['4月', '5月'])
+    plt.axhline(y=30, color='orange', linestyle='--', linewidth=2, label='閾値: 30')
+    plt.axhline(y=50, color='red', linestyle='--', linewidth=2, label='閾値: 50')
+    plt.ylabel('O3濃度', fontsize=14)
+    plt.title('月ごとのO3濃度分布（箱ひげ図）', fontsize=16, pad=20)
+    plt.legend(fontsize=12)
+    plt.grid(True, axis='y', alpha=0.3)
+    plt.tight_layout()
+    return fig
+
+
+def draw_hourly_percentiles(data):
+    """図5: 時間帯ごとのO3濃度の分位点（全期間）"""
+    table = data['hourly_percentiles']
+    fig = plt.figure(figsize=(14, 8))
+    plt.fill_between(table.index, table['p10'], table['p90'], alpha=0.2, color='navy', label='10〜90パーセンタイル')
+    plt.fill_between(table.index, table['p25'], table['p75'], alpha=0.4, color='navy', label='25〜75パーセンタイル')
+    plt.plot(table.index, table['p50'], marker='o', color='navy', linewidth=2, label='中央値')
+    plt.axhline(y=30, color='orange', linestyle='--', linewidth=2, label='閾値: 30')
+    plt.axhline(y=50, color='red', linestyle='--', linewidth=2, label='閾値: 50')
+    plt.title('時間帯別のO3濃度の分布（全期間）', fontsize=16, pad=20)
+    plt.xlabel('時間帯', fontsize=14)
+    plt.ylabel('O3濃度', fontsize=14)
+    plt.xticks(range(0, 24))
+    plt.legend(fontsize=12)
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    return fig
+
+
+def main():
+    data = load_data()
+
+    # 図1〜4は独立したタスクとして並列に描画する
+    render_figures([
+        FigureTask('time_series', draw_time_series, os.path.join(output_path, 'o3_v_日最高O3濃度の時系列推移.png')),
+        FigureTask('histogram', draw_histogram, os.path.join(output_path, 'o3_v_日最高O3濃度の分布.png')),
+        FigureTask('level_distribution', draw_level_distribution, os.path.join(output_path, 'o3_v_O3濃度レベル別の日数分布.png')),
+        FigureTask('monthly_boxplot', draw_monthly_boxplot, os.path.join(output_path, 'o3_v_月ごとのO3濃度分布.png')),
+        FigureTask('hourly_percentiles', draw_hourly_percentiles, os.path.join(output_path, 'o3_v_時間帯別のO3濃度の分布.png')),
+    ], data, cache=RenderCache(), inputs=[input_path, __file__])
+
+    # 数値サマリーの再表示（参考用）
+    daily_o3_max = data['daily_o3_max']
+    total_days = len(daily_o3_max)
+    print("=== 分析結果サマリー ===")
+    print(f"全日数: {total_days}日")
+    print(f"O3が30を超えた日数: {len(daily_o3_max[daily_o3_max['O3'] > 30])}日 ({len(daily_o3_max[daily_o3_max['O3'] > 30])/total_days*100:.1f}%)")
+    print(f"O3が50を超えた日数: {len(daily_o3_max[daily_o3_max['O3'] > 50])}日 ({len(daily_o3_max[daily_o3_max['O3'] > 50])/total_days*100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
 
 
 
 # o3_v_日最高O3濃度の時系列推移
 # o3_v_月ごとのO3濃度分布
 # o3_v_日最高O3濃度の分布
-# o3_v_O3濃度レベル別の日数分布
\ No newline at end of file
+# o3_v_O3濃度レベル別の日数分布
+# o3_v_時間帯別のO3濃度の分布
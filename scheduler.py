@@ -0,0 +1,377 @@
+import os
+import sys
+import json
+import time
+import fcntl
+import runpy
+import signal
+import importlib
+import threading
+import traceback
+from datetime import datetime, timedelta
+from config import LOG_DIR, PROJECT_ROOT, ensure_directories, logger
+from _stage_metrics import metrics
+
+# cronで毎回Pythonを起動する代わりに、1つの常駐プロセスで各ジョブを周期実行するスケジューラ
+# pandas / matplotlib / cv2 などの重いモジュールとHTTPセッションはプロセス内で再利用される
+
+LOCK_FILE_PATH = os.path.join(LOG_DIR, "scheduler.lock")
+STATUS_FILE_PATH = os.path.join(LOG_DIR, "scheduler_status.json")
+BACKUP_SCRIPT_PATH = os.path.join(PROJECT_ROOT, "utilities", "backup_data.py")
+
+# 飛行機雲の検出は、前回以降に取得した空の画像（1分ごと）をQwen（DashScope、従量課金）に送る
+# 10分ごとに約10枚、日中だけでも1日数百回の有料のAPI呼び出しになるため、環境変数 AQI_CONTRAIL_DETECTION=1 の場合だけ実行する
+# 夜間の画像では飛行機雲を判定できないため、実行するのは CONTRAIL_DETECTION_HOURS の時間帯（開始時〜終了時の前）だけ
+CONTRAIL_DETECTION_HOURS = (6, 19)
+
+
+def contrail_detection_enabled():
+    """飛行機雲の検出ジョブを実行するかどうか（AQI_CONTRAIL_DETECTION=1 の場合のみ）"""
+    return os.getenv("AQI_CONTRAIL_DETECTION") == "1"
+
+
+def next_aligned_time(now, interval, offset=0):
+    """
+    ローカル時刻の0時を起点に、intervalの倍数（offset秒ずらした時刻）となる次の実行時刻を返す
+    （interval=3600なら毎時00分、interval=86400, offset=1800なら毎日0時30分）
+
+    Args:
+        now (datetime): 現在時刻
+        interval (int): 実行間隔（秒）。86400の約数を想定
+        offset (int): 0時からずらす秒数（intervalより小さくする）
+
+    Returns:
+        datetime: 次の実行時刻
+    """
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed = (now - midnight).total_seconds() - offset
+    slots = int(elapsed // interval) + 1
+    return midnight + timedelta(seconds=offset + slots * interval)
+
+
+class Job:
+    """周期実行するジョブと実行統計"""
+
+    def __init__(self, name, func, interval, timeout=None, offset=0):
+        """
+        初期化
+
+        Args:
+            name (str): ジョブ名
+            func (callable): 実行する関数（引数なし）
+            interval (int): 実行間隔（秒）
+            timeout (int, optional): この秒数を超えて実行中の場合に警告を出す
+            offset (int, optional): 実行時刻を周期の境目からずらす秒数（同時刻に実行される他のジョブを避けるため）
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.timeout = timeout
+        self.offset = offset
+
+        self.next_run = next_aligned_time(datetime.now(), interval, offset)
+        self.running = False
+        self.started_at = None
+        self.timeout_warned = False
+
+        # 実行統計
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_duration = None
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_finished = None
+
+    def status(self):
+        """
+        ジョブの状態を辞書で返す
+
+        Returns:
+            dict: 実行統計
+        """
+        return {
+            "interval": self.interval,
+            "running": self.running,
+            "next_run": self.next_run.isoformat(),
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_duration": self.last_duration,
+            "mean_duration": self.total_duration / self.runs if self.runs else None,
+            "max_duration": self.max_duration,
+            "last_finished": self.last_finished.isoformat() if self.last_finished else None,
+        }
+
+
+class Scheduler:
+    """ジョブを周期実行する常駐スケジューラ"""
+
+    def __init__(self, jobs, status_path=STATUS_FILE_PATH, tick=1.0):
+        """
+        初期化
+
+        Args:
+            jobs (list): Jobのリスト
+            status_path (str): 実行統計を書き出すJSONファイルのパス（Noneの場合は書き出さない）
+            tick (float): スケジュールを確認する間隔（秒）
+        """
+        self.jobs = jobs
+        self.status_path = status_path
+        self.tick = tick
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def run_forever(self):
+        """停止シグナルを受けるまでジョブを実行し続ける"""
+        logger.info("==== スケジューラを開始します ====")
+        for job in self.jobs:
+            logger.info(f"ジョブ {job.name}: {job.interval}秒ごと（次回 {job.next_run.strftime('%Y-%m-%d %H:%M:%S')}）")
+
+        while not self._stop_event.is_set():
+            now = datetime.now()
+            for job in self.jobs:
+                if now >= job.next_run:
+                    self._launch(job)
+                    job.next_run = next_aligned_time(now, job.interval, job.offset)
+                self._check_timeout(job, now)
+
+            self._threads = [t for t in self._threads if t.is_alive()]
+            self._stop_event.wait(self.tick)
+
+        logger.info("実行中のジョブの終了を待っています...")
+        for thread in self._threads:
+            thread.join()
+        self.write_status()
+        logger.info("==== スケジューラを終了します ====")
+
+    def stop(self, *args):
+        """スケジューラを停止する（シグナルハンドラとしても使用）"""
+        logger.info("停止シグナルを受信しました")
+        self._stop_event.set()
+
+    def run_job(self, job):
+        """
+        ジョブを1回実行し、所要時間を記録する
+
+        Args:
+            job (Job): 実行するジョブ
+        """
+        start = time.perf_counter()
+        success = True
+        logger.info(f"ジョブ {job.name} を開始します")
+        try:
+            job.func()
+        except Exception as e:
+            success = False
+            logger.error(f"ジョブ {job.name} でエラーが発生しました: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                job.running = False
+                job.runs += 1
+                job.failures += 0 if success else 1
+                job.last_duration = duration
+                job.max_duration = max(job.max_duration, duration)
+                job.total_duration += duration
+                job.last_finished = datetime.now()
+            logger.info(f"ジョブ {job.name} が終了しました（実行時間: {duration:.2f} 秒）")
+            self.write_status()
+            # ジョブ内の各段階（fetch, render, encode など）のメトリクスを書き出す
+            metrics.flush()
+
+    def write_status(self):
+        """全ジョブの実行統計をJSONファイルに書き出す（status_pathがNoneの場合は何もしない）"""
+        if self.status_path is None:
+            return
+        with self._lock:
+            status = {
+                "updated": datetime.now().isoformat(),
+                "pid": os.getpid(),
+                "jobs": {job.name: job.status() for job in self.jobs},
+            }
+        try:
+            tmp_path = self.status_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(status, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.status_path)
+        except Exception as e:
+            logger.error(f"スケジューラの状態の書き込み中にエラーが発生しました: {e}")
+
+    def _launch(self, job):
+        """
+        ジョブを別スレッドで開始する（前回の実行が終わっていない場合はスキップ）
+
+        Args:
+            job (Job): 実行するジョブ
+        """
+        with self._lock:
+            if job.running:
+                job.skipped += 1
+                logger.warning(f"ジョブ {job.name} は前回の実行が終わっていないためスキップします")
+                return
+            job.running = True
+            job.started_at = datetime.now()
+            job.timeout_warned = False
+
+        thread = threading.Thread(target=self.run_job, args=(job,), name=job.name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _check_timeout(self, job, now):
+        """
+        実行時間がtimeoutを超えたジョブを警告する（スレッドは強制終了できないため警告のみ）
+
+        Args:
+            job (Job): 確認するジョブ
+            now (datetime): 現在時刻
+        """
+        if not job.running or job.timeout is None or job.timeout_warned:
+            return
+        elapsed = (now - job.started_at).total_seconds()
+        if elapsed > job.timeout:
+            job.timeout_warned = True
+            logger.warning(f"ジョブ {job.name} が {elapsed:.0f} 秒経過しても終了していません（timeout: {job.timeout} 秒）")
+
+
+# ------------------------- ジョブ -------------------------
+# 各ジョブのモジュールは初回実行時（preload時は起動時）にインポートされ、以降はプロセス内に保持される
+
+def run_crawler():
+    """空の画像を取得（suma_recent_image_crawler.py）"""
+    importlib.import_module("suma_recent_image_crawler").main()
+
+
+def run_aqi_graph():
+    """AQIデータの取得とグラフ作成（suma_aqi_&_graph.py）"""
+    importlib.import_module("suma_aqi_&_graph").main()
+
+
+def run_movie_1day():
+    """直近1日のタイムラプス動画を作成（suma_generate_movie_1day.py）"""
+    importlib.import_module("suma_generate_movie_1day").main()
+
+
+def run_movie_7days():
+    """直近7日のタイムラプス動画を作成（suma_generate_movie_7days.py）"""
+    importlib.import_module("suma_generate_movie_7days").main()
+
+
+def run_contrail_detection():
+    """飛行機雲の検出（_contrail_timeline_image_detector_qwen.py）。CONTRAIL_DETECTION_HOURS の時間帯以外は何もしない"""
+    start_hour, end_hour = CONTRAIL_DETECTION_HOURS
+    if not start_hour <= datetime.now().hour < end_hour:
+        logger.debug("飛行機雲の検出は日中だけ実行するため、スキップします")
+        return
+    importlib.import_module("_contrail_timeline_image_detector_qwen").main()
+
+
+def run_aqi_backfill():
+    """保存済みAQIデータの欠測時間をGoogleの履歴で補完（_aqi_gap_backfill.py）"""
+    importlib.import_module("_aqi_gap_backfill").backfill_gaps()
+
+
+def run_backup():
+    """データのバックアップ（utilities/backup_data.py が存在する場合のみ）"""
+    if not os.path.exists(BACKUP_SCRIPT_PATH):
+        logger.warning(f"バックアップスクリプトが見つかりません: {BACKUP_SCRIPT_PATH}")
+        return
+    runpy.run_path(BACKUP_SCRIPT_PATH, run_name="__main__")
+
+
+def build_jobs():
+    """
+    スケジュールするジョブのリストを作成（旧cron_setup.txtと同じ周期）
+    飛行機雲の検出は有料のAPIを呼び出すため、AQI_CONTRAIL_DETECTION=1 の場合だけ加える
+
+    Returns:
+        list: Jobのリスト
+    """
+    jobs = [
+        Job("crawler", run_crawler, 60, timeout=50),                       # 1分ごと
+        Job("aqi_graph", run_aqi_graph, 3600, timeout=600),                # 毎時00分
+        Job("movie_1day", run_movie_1day, 600, timeout=540),               # 10分ごと
+        Job("movie_7days", run_movie_7days, 86400, timeout=3600),          # 毎日0時
+        Job("backup", run_backup, 600, timeout=540),                       # 10分ごと
+        # 毎時00分のAQI取得と同じCSVに書き込むため、時刻をずらして実行する
+        Job("aqi_backfill", run_aqi_backfill, 86400, timeout=1800, offset=1800),  # 毎日0時30分
+    ]
+    if contrail_detection_enabled():
+        jobs.append(Job("contrail_detection", run_contrail_detection, 600, timeout=540))  # 日中の10分ごと
+    return jobs
+
+
+def preload_modules():
+    """重いモジュールを起動時にまとめてインポートしておく"""
+    module_names = ["suma_recent_image_crawler", "suma_aqi_&_graph", "suma_generate_movie_1day", "suma_generate_movie_7days"]
+    if contrail_detection_enabled():
+        module_names.append("_contrail_timeline_image_detector_qwen")
+    for module_name in module_names:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+            logger.info(f"{module_name} を読み込みました（{time.perf_counter() - start:.2f} 秒）")
+        except Exception as e:
+            logger.error(f"{module_name} の読み込みに失敗しました: {e}")
+
+
+def acquire_lock(lock_path=LOCK_FILE_PATH):
+    """
+    多重起動を防ぐためのロックを取得
+
+    Args:
+        lock_path (str): ロックファイルのパス
+
+    Returns:
+        file: ロックを保持しているファイルオブジェクト。既に起動中の場合はNone
+    """
+    # "w" で開くとロックの取得前に起動中のプロセスのPIDを消してしまうため、追記モードで開いてロック後に書き換える
+    lock_file = open(lock_path, "a+")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    return lock_file
+
+
+def main():
+    """
+    スケジューラを起動する
+    引数にジョブ名を指定した場合は、そのジョブを1回だけ実行して終了する
+    （例: python scheduler.py aqi_graph）
+    """
+    ensure_directories()
+    jobs = build_jobs()
+
+    if len(sys.argv) > 1:
+        jobs_by_name = {job.name: job for job in jobs}
+        job = jobs_by_name.get(sys.argv[1])
+        if job is None:
+            print(f"不明なジョブです: {sys.argv[1]}（利用可能: {', '.join(jobs_by_name)}）")
+            sys.exit(1)
+        Scheduler([job], status_path=None).run_job(job)
+        return
+
+    lock_file = acquire_lock()
+    if lock_file is None:
+        print("スケジューラは既に起動しています")
+        return
+
+    scheduler = Scheduler(jobs)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    signal.signal(signal.SIGTERM, scheduler.stop)
+
+    preload_modules()
+    scheduler.run_forever()
+    lock_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -53,6 +53,7 @@ setup(
         
         # 地理データ処理
         "geopy>=2.4.0",
+        "folium>=0.14.0",  # ライブカメラ地図（_livecam_map.py）
         
         # 進捗表示
         "tqdm>=4.66.0",
@@ -88,6 +89,9 @@ setup(
         "console_scripts": [
             # 基本コマンド
             "aqi-scheduler=scheduler:main",
+            "aqi-api=api_server:main",
+            "aqi-backfill=_aqi_gap_backfill:main",
+            "aqi-pipeline=_analysis_pipeline:main",
             "aqi-crawler=suma_crawler:main",
             "aqi-movie=movie_generator:main",
             
@@ -103,6 +107,7 @@ setup(
             # 位置情報関連
             "aqi-find-nearest=area_urls.find_nearest_points:find_nearest_points",
             "aqi-geocode=area_urls.google_geocording_module:geocode",
+            "aqi-livecam-map=_livecam_map:main",
         ],
     },
     package_data={
@@ -110,7 +115,6 @@ setup(
             # データファイル
             "data/*.csv",
             "data/forecast/*.json",
-            "data/debug/*.json",
             "data/image_web_urls/*.csv",
             
             # 画像関連
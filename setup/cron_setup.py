@@ -1,7 +1,11 @@
+import os
 import subprocess
 
+# 常駐スケジューラ（scheduler.py）だけをcrontabに登録する
+CRON_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cron_setup.txt")
+
 # シェルコマンドを実行
-command = "crontab /home/sw/aqi_monitoring/setup/cron_setup.txt && crontab -l"
+command = f"crontab {CRON_FILE_PATH} && crontab -l"
 result = subprocess.run(command, shell=True, capture_output=True, text=True)
 
 if result.returncode != 0:
@@ -14,4 +18,4 @@ else:
 # 実行結果を表示
 print("標準出力:", result.stdout)
 print("標準エラー:", result.stderr)
-print("終了コード:", result.returncode)
\ No newline at end of file
+print("終了コード:", result.returncode)
@@ -2,7 +2,6 @@ import sys
 import os
 import traceback
 from datetime import datetime
-from _aqi_graph_generator import create_aqi_visualization
 from config import *
 import _aqi_deta_getter_waqi 
 import logging
@@ -17,6 +16,7 @@ def main():
 
     # 開始時間の記録
     start_time = datetime.now()
+    ensure_directories()
     logger.info("==== スケジューラによるデータ更新を開始します ====")
     logger.info(f"開始時間: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
     
@@ -40,6 +40,9 @@ def get_aqi_data():
         return
 
 def draw_graph():
+    # pandas / matplotlib はグラフ作成時のみ読み込む（データ取得だけなら不要）
+    from _aqi_graph_generator import create_aqi_visualization
+
     # グラフの更新
     logger.info("グラフを更新しています...")
     csv_file_path = os.path.join(DATA_DIR, 'kobe_aqi_data.csv')
@@ -4,11 +4,14 @@ import _movie_generator
 file_name = 'timelasp_movie_suma'
 input_dir = os.path.join(IMAGE_ANALYSIS_DIR, 'suma/input_image')
 output_dir = MOVIE_DIR
-_movie_generator.set_FPS(10)
-mp4_output = _movie_generator.generate_movie(input_dir, output_dir, file_name, 1, True)
-
-if mp4_output:
-    # MP4が生成できたらWebMに変換
-    webm_output = _movie_generator.convert_to_webm(mp4_output)
-    if webm_output:
-        print(f"最終出力（WebM形式）: {webm_output}")
\ No newline at end of file
+
+def main():
+    ensure_directories()
+    # MP4とWebMを1回のエンコードで生成（1日分と7日分の動画は並行して作成されるため、FPSは引数で渡す）
+    outputs = _movie_generator.generate_movie_single_pass(input_dir, output_dir, file_name, 1, True, fps=10)
+
+    if outputs and 'webm' in outputs:
+        print(f"最終出力（WebM形式）: {outputs['webm']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# 欠測の補完で追加した行（取得元 google_backfill）の気象データが、その後のWAQIの保存で0に書き換えられないことを確認する
+# python test/test_aqi_backfill_save.py
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from _aqi_deta_getter_waqi import save_to_csv
+from _aqi_gap_backfill import CSV_HEADERS, SOURCE_BACKFILL
+
+WEATHER_COLUMNS = ["温度", "湿度", "気圧", "風速", "降水量"]
+
+
+def test_backfilled_weather_stays_empty():
+    with tempfile.TemporaryDirectory() as work_dir:
+        csv_path = os.path.join(work_dir, "aqi_data.csv")
+        backfilled = {column: "" for column in CSV_HEADERS}
+        backfilled.update({"地点": "神戸市 須磨区", "取得時間": "2024-01-01 01:00:00", "AQI値": 40, "O3": 20.0,
+                           "取得元": SOURCE_BACKFILL})
+        pd.DataFrame([backfilled]).to_csv(csv_path, index=False, encoding="utf-8-sig")
+
+        # 気象データのない新しい行は0で埋める（従来どおり）
+        assert save_to_csv({"地点": "須磨", "取得時間": "2024-01-01 02:00:00", "AQI値": 42, "O3": 21.0}, csv_path)
+
+        df = pd.read_csv(csv_path, encoding="utf-8-sig").set_index("取得時間")
+        assert df.loc["2024-01-01 01:00:00", WEATHER_COLUMNS].isna().all(), "補完した行の気象データが埋められています"
+        assert (df.loc["2024-01-01 02:00:00", WEATHER_COLUMNS] == 0.0).all()
+        assert df.loc["2024-01-01 02:00:00", "取得元"] == "waqi"
+
+
+if __name__ == "__main__":
+    test_backfilled_weather_stays_empty()
+    print("OK")
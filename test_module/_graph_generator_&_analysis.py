@@ -1,13 +1,12 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy import fftpack
 import matplotlib.dates as mdates
 from datetime import datetime
 import matplotlib.font_manager as fm
 import os
 from sklearn.preprocessing import StandardScaler
-from scipy.signal import find_peaks
+import _spectral_engine as spectral
 
 def setup_japanese_font():
     plt.rcParams['font.family'] = 'IPAexGothic'
@@ -21,11 +20,8 @@ def load_and_preprocess_data(file_path):
     for col in numeric_columns:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col].replace('non', pd.NA), errors='coerce')
-    df_numeric = df[['取得時間'] + [col for col in numeric_columns if col in df.columns]]
-    df_numeric = df_numeric.set_index('取得時間')
-    df_resampled = df_numeric.resample('h').mean()
-    df_resampled = df_resampled.interpolate(method='linear')
-    return df_resampled
+    # 重複した取得時刻をまとめて1時間グリッドに揃え、6時間以下の欠測のみ補間する（長い欠測はNaNのまま）
+    return spectral.build_grid(df, numeric_columns, freq='h', time_column='取得時間', max_gap=6)
 
 def fourier_transform(data, sampling_freq=1.0):
     if isinstance(data, pd.Series):
@@ -33,12 +29,8 @@ def fourier_transform(data, sampling_freq=1.0):
     n = len(data)
     if n < 4:
         return np.array([]), np.array([]), np.array([])
-    data_normalized = data - np.mean(data)
-    fft_result = fftpack.fft(data_normalized)
-    freqs = fftpack.fftfreq(n, d=1/sampling_freq)[:n//2]
-    amplitudes = 2.0/n * np.abs(fft_result)[:n//2]
-    phases = np.angle(fft_result)[:n//2]
-    return freqs, amplitudes, phases
+    result = spectral.batch_rfft(np.asarray(data)[None, :], sampling_freq)
+    return result["freqs"][:n//2], result["amplitudes"][0, :n//2], result["phases"][0, :n//2]
 
 def find_dominant_frequencies(freqs, amplitudes, n_peaks=5, min_dist=1):
     """
@@ -57,34 +49,10 @@ def find_dominant_frequencies(freqs, amplitudes, n_peaks=5, min_dist=1):
     if len(freqs) == 0 or len(amplitudes) == 0:
         return np.array([]), np.array([])
     
-    # 直流成分（ゼロ周波数）を除外
-    start_idx = 1 if len(freqs) > 0 and freqs[0] < 1e-10 else 0
-    
-    # ピークを検出するのに十分なデータがあることを確認
-    if len(amplitudes[start_idx:]) < min_dist + 1:
-        return np.array([]), np.array([])
-    
-    # ピーク検出
-    peaks, _ = find_peaks(amplitudes[start_idx:], distance=min_dist)
-    
-    # ピークが見つからない場合は空の配列を返す
-    if len(peaks) == 0:
-        return np.array([]), np.array([])
-    
-    # ピークのインデックスを振幅でソート
-    sorted_peak_indices = sorted(peaks, key=lambda i: amplitudes[i+start_idx], reverse=True)
-    
-    # 上位n_peaksのピークを選択
-    top_indices = sorted_peak_indices[:min(n_peaks, len(sorted_peak_indices))]
-    
-    # インデックスを適切に調整
-    top_indices = [i + start_idx for i in top_indices]
-    
-    # 周波数と振幅を抽出
-    dominant_freqs = freqs[top_indices]
-    dominant_amps = amplitudes[top_indices]
-    
-    return dominant_freqs, dominant_amps
+    # 直流成分を除いてピークを検出し、振幅の大きい順に上位n_peaksを選択
+    dom_freqs, dom_amps = spectral.find_dominant_frequencies_batch(freqs, np.asarray(amplitudes)[None, :], n_peaks, min_dist)
+    found = ~np.isnan(dom_freqs[0])
+    return dom_freqs[0][found], dom_amps[0][found]
 
 def reconstruct_signal(data, dominant_freqs, sampling_freq=1.0, n_points=None):
     """
@@ -111,44 +79,15 @@ def reconstruct_signal(data, dominant_freqs, sampling_freq=1.0, n_points=None):
         else:
             n_points = len(data)
     
-    # 平均を引いてトレンドを削除
     if isinstance(data, pd.Series):
-        data_clean = data.dropna().values
-        if len(data_clean) == 0:
-            return np.zeros(n_points)
-        data_normalized = data_clean - np.mean(data_clean)
-    else:
-        if len(data) == 0:
-            return np.zeros(n_points)
-        data_normalized = data - np.mean(data)
-    
-    # FFTの実行
-    fft_result = fftpack.fft(data_normalized)
-    
-    # 周波数軸
-    freqs = fftpack.fftfreq(len(data_normalized), d=1/sampling_freq)
-    
-    # 0に初期化した新しいFFT結果
-    filtered_fft = np.zeros_like(fft_result, dtype=complex)
-    
-    # 主要周波数のみを保持
-    for freq in dominant_freqs:
-        # 最も近い周波数インデックスを見つける
-        idx = np.argmin(np.abs(freqs - freq))
-        neg_idx = np.argmin(np.abs(freqs + freq))  # 負の周波数も保持
-        
-        # その周波数成分を保持
-        filtered_fft[idx] = fft_result[idx]
-        filtered_fft[neg_idx] = fft_result[neg_idx]
-    
-    # 逆FFTで信号を再構成
-    reconstructed = fftpack.ifft(filtered_fft)
+        data = data.dropna().values
+    if len(data) == 0:
+        return np.zeros(n_points)
     
-    # 実部のみを取り出し、元の平均値を加算
-    if isinstance(data, pd.Series):
-        return np.real(reconstructed) + np.mean(data_clean)
-    else:
-        return np.real(reconstructed) + np.mean(data)
+    # 主要周波数の成分だけを残して逆変換
+    result = spectral.batch_rfft(np.asarray(data)[None, :], sampling_freq)
+    return spectral.reconstruct_batch(result["spectrum"], result["freqs"], np.asarray(dominant_freqs)[None, :],
+                                      result["means"], len(data))[0]
 
 def hours_to_period_label(hours):
     """
@@ -170,13 +109,14 @@ def hours_to_period_label(hours):
     else:
         return f"{hours:.1f}時間"
 
-def create_fourier_analysis_visualization(df, output_path='fourier_analysis.png'):
+def create_fourier_analysis_visualization(df, output_path='fourier_analysis.png', method='auto'):
     """
     フーリエ解析を行い、結果を可視化する関数
     
     Args:
-        df (pd.DataFrame): 前処理されたデータフレーム
+        df (pd.DataFrame): 前処理されたデータフレーム（1時間グリッド、長い欠測はNaN）
         output_path (str): 出力画像のパス
+        method (str): 周波数解析の方法（"auto"、"fft"、"lombscargle"）
     """
     # 日本語フォントの設定
     japanese_font = setup_japanese_font()
@@ -204,7 +144,15 @@ def create_fourier_analysis_visualization(df, output_path='fourier_analysis.png'
         'NO2': '#3498DB',
     }
     
-    # 各パラメータに対してフーリエ解析を行う
+    # 全パラメータを一括で周波数解析（欠測が多い場合は自動でLomb-Scargleを使用）
+    analysis = spectral.analyze_frame(df, parameters, method=method, n_peaks=5, min_dist=2)
+    freqs = analysis['freqs']
+    positive = freqs > 0
+    # 周波数を周期（時間）に変換（直流成分は除く）
+    periods = 1.0 / freqs[positive]
+    print(f"周波数解析の方法: {analysis['method']}")
+    
+    # 各パラメータの結果を可視化する
     fig = plt.figure(figsize=(18, 5 * len(parameters)), dpi=300)
     
     # グリッド設定
@@ -234,19 +182,10 @@ def create_fourier_analysis_visualization(df, output_path='fourier_analysis.png'
             ax1.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
             ax1.grid(True, linestyle='--', linewidth=0.5, color='gray', alpha=0.5)
             
-            # 2. フーリエ変換
-            freqs, amplitudes, phases = fourier_transform(data)
-            
-            # データが不足している場合はスキップ
-            if len(freqs) == 0 or len(amplitudes) == 0:
-                print(f"{param}のフーリエ変換に失敗しました。")
-                continue
-            
-            # 周波数を周期（時間）に変換
-            periods = 1.0 / freqs
-            
-            # 主要周波数の検出
-            dom_freqs, dom_amps = find_dominant_frequencies(freqs, amplitudes, n_peaks=5, min_dist=2)
+            # 2. 一括解析の結果を取り出す
+            result = analysis['parameters'][param]
+            amplitudes = result['amplitudes'][positive]
+            dom_freqs, dom_amps = result['dominant_freqs'], result['dominant_amps']
             
             # 主要周波数が見つからない場合の処理
             if len(dom_freqs) == 0:
@@ -305,12 +244,8 @@ def create_fourier_analysis_visualization(df, output_path='fourier_analysis.png'
             max_period = min(len(data)/2, periods.max() if len(periods) > 0 else 100)
             ax2.set_xlim(2, max_period)
             
-            # 3. 元データと主要周期による再構成
-            # 主要周期に対応する周波数
-            dominant_frequencies = 1.0 / dom_periods
-            
-            # 再構成
-            reconstructed_signal = reconstruct_signal(data, dominant_frequencies)
+            # 3. 元データと主要周期による再構成（一括解析で計算済み）
+            reconstructed_signal = result['reconstructed']
             
             # プロット
             ax3 = fig.add_subplot(gs[i, 2])
@@ -5,6 +5,58 @@ import matplotlib.pyplot as plt
 from config import *  # DATA_DIRを読み込むための設定ファイル
 import seaborn as sns
 from datetime import datetime
+from _report_renderer import FigureTask, render_figures
+from _render_cache import RenderCache
+
+
+def draw_daily_o3_max(data):
+    """日付ごとのO3最大値の時系列グラフ"""
+    daily_o3_max = data['daily_o3_max']
+    plt.rcParams['font.family'] = 'IPAexGothic'
+    fig = plt.figure(figsize=(12, 6))
+    plt.plot(daily_o3_max['日付'], daily_o3_max['o3_concentration'], marker='o', linestyle='-')
+    plt.axhline(y=30, color='r', linestyle='--', alpha=0.7, label='30 ppb 基準線')
+    plt.axhline(y=50, color='purple', linestyle='--', alpha=0.7, label='50 ppb 基準線')
+    plt.title('日ごとのO3最大濃度の推移')
+    plt.ylabel('O3濃度 (ppb)')
+    plt.xlabel('日付')
+    plt.grid(True, alpha=0.3)
+    plt.legend()
+    plt.tight_layout()
+    return fig
+
+
+def draw_hourly_o3_mean(data):
+    """時間帯別のO3平均濃度グラフ"""
+    hourly_o3 = data['hourly_o3']
+    plt.rcParams['font.family'] = 'IPAexGothic'
+    fig = plt.figure(figsize=(10, 6))
+    plt.bar(hourly_o3['時'], hourly_o3['mean'], alpha=0.7)
+    plt.title('時間帯別のO3平均濃度')
+    plt.ylabel('平均O3濃度 (ppb)')
+    plt.xlabel('時間帯')
+    plt.grid(True, alpha=0.3, axis='y')
+    plt.xticks(range(0, 24))
+    plt.tight_layout()
+    return fig
+
+
+def draw_o3_histogram(data):
+    """O3濃度のヒストグラム"""
+    df_cleaned = data['df_cleaned']
+    plt.rcParams['font.family'] = 'IPAexGothic'
+    fig = plt.figure(figsize=(10, 6))
+    plt.hist(df_cleaned['o3_concentration'], bins=20, alpha=0.7, color='skyblue', edgecolor='black')
+    plt.axvline(x=30, color='r', linestyle='--', alpha=0.7, label='30 ppb 基準線')
+    plt.axvline(x=50, color='purple', linestyle='--', alpha=0.7, label='50 ppb 基準線')
+    plt.title('O3濃度の分布')
+    plt.ylabel('頻度')
+    plt.xlabel('O3濃度 (ppb)')
+    plt.grid(True, alpha=0.3, axis='y')
+    plt.legend()
+    plt.tight_layout()
+    return fig
+
 
 def analyze_aqi_data():
     # データファイルのパス
@@ -235,55 +287,19 @@ def analyze_aqi_data():
     graphs_dir = os.path.join(DATA_DIR, "o3_google_api_1month", "graphs")
     os.makedirs(graphs_dir, exist_ok=True)
     
-    # 日付ごとのO3最大値の時系列グラフ
-    plt.rcParams['font.family'] = 'IPAexGothic'
-    plt.figure(figsize=(12, 6))
-    plt.plot(daily_o3_max['日付'], daily_o3_max['o3_concentration'], marker='o', linestyle='-')
-    plt.axhline(y=30, color='r', linestyle='--', alpha=0.7, label='30 ppb 基準線')
-    plt.axhline(y=50, color='purple', linestyle='--', alpha=0.7, label='50 ppb 基準線')
-    plt.title('日ごとのO3最大濃度の推移')
-    plt.ylabel('O3濃度 (ppb)')
-    plt.xlabel('日付')
-    plt.grid(True, alpha=0.3)
-    plt.legend()
-    plt.tight_layout()
-    
-    # グラフの保存
-    daily_graph_path = os.path.join(graphs_dir, f"daily_o3_max_{timestamp}.png")
-    plt.savefig(daily_graph_path)
-    print(f"日次グラフを保存しました: {daily_graph_path}")
-    
-    # 時間帯別のO3平均濃度グラフ
-    plt.figure(figsize=(10, 6))
-    plt.bar(hourly_o3['時'], hourly_o3['mean'], alpha=0.7)
-    plt.title('時間帯別のO3平均濃度')
-    plt.ylabel('平均O3濃度 (ppb)')
-    plt.xlabel('時間帯')
-    plt.grid(True, alpha=0.3, axis='y')
-    plt.xticks(range(0, 24))
-    plt.tight_layout()
-    
-    # グラフの保存
-    hourly_graph_path = os.path.join(graphs_dir, f"hourly_o3_mean_{timestamp}.png")
-    plt.savefig(hourly_graph_path)
-    print(f"時間帯別グラフを保存しました: {hourly_graph_path}")
-    
-    # O3濃度のヒストグラム
-    plt.figure(figsize=(10, 6))
-    plt.hist(df_cleaned['o3_concentration'], bins=20, alpha=0.7, color='skyblue', edgecolor='black')
-    plt.axvline(x=30, color='r', linestyle='--', alpha=0.7, label='30 ppb 基準線')
-    plt.axvline(x=50, color='purple', linestyle='--', alpha=0.7, label='50 ppb 基準線')
-    plt.title('O3濃度の分布')
-    plt.ylabel('頻度')
-    plt.xlabel('O3濃度 (ppb)')
-    plt.grid(True, alpha=0.3, axis='y')
-    plt.legend()
-    plt.tight_layout()
-    
-    # グラフの保存
-    hist_graph_path = os.path.join(graphs_dir, f"o3_histogram_{timestamp}.png")
-    plt.savefig(hist_graph_path)
-    print(f"ヒストグラムを保存しました: {hist_graph_path}")
+    # 入力ファイル（このスクリプト自体を含む）・描画関数・パラメータが前回と同じグラフは描き直さずに既存のファイルを使う
+    tasks = [
+        FigureTask('daily', draw_daily_o3_max, os.path.join(graphs_dir, f"daily_o3_max_{timestamp}.png")),
+        FigureTask('hourly', draw_hourly_o3_mean, os.path.join(graphs_dir, f"hourly_o3_mean_{timestamp}.png")),
+        FigureTask('histogram', draw_o3_histogram, os.path.join(graphs_dir, f"o3_histogram_{timestamp}.png")),
+    ]
+    shared_data = {'daily_o3_max': daily_o3_max, 'hourly_o3': hourly_o3,
+                   'df_cleaned': df_cleaned[['o3_concentration']]}
+    paths = render_figures(tasks, shared_data, cache=RenderCache(), inputs=[file_path, __file__])
+    messages = {'daily': "日次グラフ", 'hourly': "時間帯別グラフ", 'histogram': "ヒストグラム"}
+    for name, path in paths.items():
+        if path:
+            print(f"{messages[name]}を保存しました: {path}")
     
     print("\n分析が完了しました。")
 